@@ -16,11 +16,22 @@ app = marimo.App(width="full", app_title="Cloudflare Notebook")
 
 
 @app.cell(hide_code=True)
-def _():
+async def _():
     # Helper Stub - click to view code
     import json, marimo as mo, requests, warnings, moutils, urllib, sys  # noqa: E401
     from moutils.oauth import PKCEFlow
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
+
+    if sys.platform == "emscripten":
+        # The cfkit helpers are not among the files of the WASM build, they are installed from the wheel
+        # exported next to the notebooks (see `make export`)
+        import micropip
+        try:
+            await micropip.install(str(mo.notebook_location() / "cfkit-0.1.0-py3-none-any.whl"))
+        except Exception as e:
+            raise RuntimeError("The cfkit helpers, which the cells below rely on, could not be installed "
+                               "from the wheel exported next to this notebook") from e
+    from cfkit.http import urlopen  # pooled, keep-alive replacement for urllib's urlopen
 
     # Mark imports as used for linting (these are used by other notebook cells)
     _ = (requests, moutils, urllib)
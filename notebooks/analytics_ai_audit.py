@@ -18,11 +18,27 @@ app = marimo.App(width="full", app_title="Cloudflare Notebook", auto_download=["
 # Login Cells #
 ###############
 @app.cell(hide_code=True)
-def _():
+async def _():
     # Helper Stub - click to view code
     import json, marimo as mo, requests, warnings, moutils, urllib, sys  # noqa: E401
     from moutils.oauth import PKCEFlow
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
+
+    if sys.platform == "emscripten":
+        # The cfkit helpers are not among the files of the WASM build, they are installed from the wheel
+        # exported next to the notebooks (see `make export`)
+        import micropip
+        try:
+            await micropip.install(str(mo.notebook_location() / "cfkit-0.1.0-py3-none-any.whl"))
+        except Exception as e:
+            raise RuntimeError("The cfkit helpers, which the cells below rely on, could not be installed "
+                               "from the wheel exported next to this notebook") from e
+    from cfkit.http import urlopen  # pooled, keep-alive replacement for urllib's urlopen
+    try:
+        from cfkit.headless import batch_account_id, batch_login, headless  # headless runs, see cfkit.batch
+    except ImportError:
+        batch_account_id = batch_login = lambda: None  # noqa: E731
+        headless = lambda: False  # noqa: E731
 
     debug = False
     warnings.filterwarnings("ignore", category=UserWarning, module="pkg_resources")
@@ -46,13 +62,13 @@ def _():
             print("Token invalid - Please login using the button above")
             if debug: print("[DEBUG] Exception:", e)
             return []
-    return PKCEFlow, Request, debug, get_accounts, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
+    return PKCEFlow, Request, batch_account_id, batch_login, debug, get_accounts, headless, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
 
 
 @app.cell(hide_code=True)
-def _(PKCEFlow):
+def _(PKCEFlow, batch_login):
     # Login to Cloudflare - click to view code
-    df = PKCEFlow(provider="cloudflare", use_new_tab=True)
+    df = batch_login() or PKCEFlow(provider="cloudflare", use_new_tab=True)
     df
     return df
 
@@ -67,10 +83,13 @@ async def _(debug, df, get_accounts, mo):
 
 
 @app.cell(hide_code=True)
-def _(accounts, df, mo, radio):
+def _(accounts, batch_account_id, df, mo, radio):
     # Select Account Stub - click to view code
     account_name = radio.value if radio.value else None
     account_id = (next((a["id"] for a in accounts if a["name"] == account_name), None) if accounts else None)
+    if batch_account_id():
+        account_id = batch_account_id()
+        account_name = next((a["name"] for a in accounts if a["id"] == account_id), account_id)
     mo.hstack(
         [
             radio,
@@ -97,6 +116,10 @@ def _(account_id, mo, proxy, df):
     import altair as alt
     from datetime import datetime, timedelta
     import pandas as pd
+    from cfkit.frames import rows_frame
+    from cfkit.graphql import fetch_graphql_windowed, stream_graphql
+    from cfkit.sampling import sample_bounds
+    from cfkit.zones import zone_inventory
 
     # Process robots.txt content
     from urllib.robotparser import RobotFileParser
@@ -110,9 +133,14 @@ def _(account_id, mo, proxy, df):
         RobotFileParser,
         alt,
         datetime,
+        fetch_graphql_windowed,
         pd,
+        rows_frame,
+        sample_bounds,
+        stream_graphql,
         timedelta,
         unquote,
+        zone_inventory,
     )
 
 
@@ -153,7 +181,10 @@ def _(datetime, timedelta):
     curr_dt = datetime.now().replace(minute=0, second=0, microsecond=0)
     end_dt = curr_dt.strftime('%Y-%m-%dT%H:00:00Z')
     start_dt = (curr_dt - timedelta(days=14)).strftime('%Y-%m-%dT%H:00:00Z')
-    return end_dt, start_dt
+
+    # Time series are fetched in sub-intervals of this size, all at once
+    WINDOW_SIZE = timedelta(days=7)
+    return WINDOW_SIZE, end_dt, start_dt
 
 
 @app.cell
@@ -162,7 +193,7 @@ def _(mo):
         r"""
         ## Obtain and parse robots.txt rules
 
-        First, we will select the zone by its ID and fetch the associated hostname. On the GraphQL side, data is
+        First, we will select the zone by its name or ID, which gives the associated hostname. On the GraphQL side, data is
         obtained by filtering by both ID and host. The hostname is also important to obtain since we must fetch
         and process the given zone's `robots.txt` manually.
         """
@@ -171,56 +202,31 @@ def _(mo):
 
 
 @app.cell(hide_code=True)
-def _(CF_API_TOKEN, HOSTNAME, Request, account_id, json, pd, urllib, urlopen):
-    # Fetch a sample of the zones in the account
-    _zone_call = f"{HOSTNAME}/client/v4/zones"
-    _params = {"per_page": 50, "account.id": account_id}
-    _zone_call = _zone_call + '?' + urllib.parse.urlencode(_params)
-    _request = Request(_zone_call, headers={"Authorization": f"Bearer {CF_API_TOKEN}"})
-    _api_resp = urlopen(_request).read()
-    _res_raw = pd.DataFrame(json.loads(_api_resp)["result"])
-
-    # Clean columns
-    account_zones = _res_raw[
-        ["id", "name", "status", "paused", "plan", "modified_on"]
-    ].copy()
-    account_zones["plan_name"] = account_zones["plan"].apply(lambda x: x["name"])
-    account_zones = account_zones.drop(columns=["plan"])[
-        ["name", "id", "plan_name", "status", "paused", "modified_on"]
-    ]
-    account_zones = account_zones.sort_values("name")
-
-    print('Zone sample:')
-    account_zones
-    return
+def _(CF_API_TOKEN, HOSTNAME, account_id, zone_inventory):
+    # Every zone in the account, listed concurrently and kept for an hour
+    zones = zone_inventory(HOSTNAME, CF_API_TOKEN, account_id)
+
+    print(f'Zones ({len(zones)}):')
+    zones.frame()
+    return (zones,)
 
 
 @app.cell
 def _(mo):
-    zone_form = mo.ui.text(label="Selected zone ID:").form()
+    zone_form = mo.ui.text(label="Selected zone (name or ID):").form()
     zone_form
     return (zone_form,)
 
 
 @app.cell
-def _(CF_API_TOKEN, HOSTNAME, Request, json, mo, urlopen, zone_form):
-    # Zone Id of the zone to obtain data from
-    mo.stop(zone_form.value is None, 'Please submit a zone ID above first')
-    SELECTED_ZONE = zone_form.value
-
-    # Endpoint to get zone info
-    _main_call = f'{HOSTNAME}/client/v4/zones/{SELECTED_ZONE}'
-    _request = Request(_main_call, headers={'Authorization': 'Bearer {}'.format(CF_API_TOKEN)})
-    _api_resp = urlopen(_request)
-    _api_resp_json = json.load(_api_resp)
+def _(mo, zone_form, zones):
+    # Zone to obtain data from, by name or ID
+    mo.stop(zone_form.value is None, 'Please submit a zone name or ID above first')
+    _zone = zones.resolve(zone_form.value)
+    mo.stop(_zone is None, f'No zone named or with the ID {zone_form.value} in this account')
 
-    if not _api_resp_json['success']:
-        print(f'Failed to fetch zone info (status code {_api_resp.status_code}). Received the following errors:')
-        for _error in _api_resp_json['errors']:
-            print(f" - {_error['code']}: {_error['message']}")
-        _api_resp.raise_for_status()
-
-    ROBOTS_HOST = _api_resp_json['result']['name']
+    SELECTED_ZONE = _zone['id']
+    ROBOTS_HOST = _zone['name']
 
     print(f'Obtained the following zone: {SELECTED_ZONE} - {ROBOTS_HOST}')
     return ROBOTS_HOST, SELECTED_ZONE
@@ -308,13 +314,11 @@ def _(
     CF_API_TOKEN,
     HOSTNAME,
     ROBOTS_HOST,
-    Request,
     SELECTED_ZONE,
     end_dt,
     filters,
-    json,
     start_dt,
-    urlopen,
+    stream_graphql,
 ):
     _QUERY_STR = '''
     {
@@ -356,45 +360,35 @@ def _(
                                     {"OR": filters}]
                         }}
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_audit_data = json.loads(_resp_raw)
-    return (json_audit_data,)
+    # Up to 5000 paths, formatted into columns as the response is read
+    _document = {"query": _QUERY_STR, "variables": _QUERY_VARIABLES}
+    df_audit_paths = stream_graphql(HOSTNAME, CF_API_TOKEN, _document, {'topPaths': {
+        'dimensions.clientRequestHTTPHost': 'host',
+        'dimensions.metric': 'metric',
+        'dimensions.userAgent': 'user_agent',
+        'sum.visits': 'violations',
+        'avg.sampleInterval': 'sample_interval',
+    }})['topPaths']
+    return (df_audit_paths,)
 
 
 @app.cell
-def _(USER_AGENTS, json_audit_data, pd, warnings):
-    _all_rows = []
-
+def _(USER_AGENTS, df_audit_paths, sample_bounds, warnings):
     # Format response code data into a DataFrame with [host - metric - user agent - matched user agent - visits]
-    for _entry in json_audit_data['data']['viewer']['scope'][0]['topPaths']:
-        # Given that AI user agents are matched with a `%{ua}%` pattern, we check for matches using the "in" statement
-        # Just in case, we store as arrays, but ideally the lengths should be exactly 1
-        _curr_ua_matches = [el for el in USER_AGENTS if el in _entry['dimensions']['userAgent']]
+    # Visits are estimated from sampled requests, "violations_low" and "violations_high" bound each of them
+    df_ai_paths = sample_bounds(df_audit_paths, 'violations')
 
+    # Given that AI user agents are matched with a `%{ua}%` pattern, we check for matches using the "in" statement
+    # Just in case, we store as arrays, but ideally the lengths should be exactly 1
+    _ua_matches = {_ua: [el for el in USER_AGENTS if el in _ua] for _ua in df_ai_paths['user_agent'].unique()}
+    for _ua, _curr_ua_matches in _ua_matches.items():
         # Warn the user if any user agent matches multiple AI entries
         if len(_curr_ua_matches) > 1:
-            warnings.warn(f'''Pattern {_entry['dimensions']['userAgent']} matched {len(_curr_ua_matches)} entries''')
+            warnings.warn(f'''Pattern {_ua} matched {len(_curr_ua_matches)} entries''')
         elif len(_curr_ua_matches) == 0:
-            raise ValueError(f'''Pattern {_entry['dimensions']['userAgent']} matched no entries''')
-
-        _curr_row = dict(
-            host=_entry['dimensions']['clientRequestHTTPHost'],
-            metric=_entry['dimensions']['metric'],
-            user_agent=_entry['dimensions']['userAgent'],
-            ua_matches=_curr_ua_matches,
-            violations=_entry['sum']['visits']
-        )
-        _all_rows.append(_curr_row)
-
-    df_ai_paths = pd.DataFrame(_all_rows)
+            raise ValueError(f'''Pattern {_ua} matched no entries''')
+
+    df_ai_paths.insert(3, 'ua_matches', df_ai_paths['user_agent'].map(_ua_matches))
     return (df_ai_paths,)
 
 
@@ -420,13 +414,13 @@ def _(
     CF_API_TOKEN,
     HOSTNAME,
     ROBOTS_HOST,
-    Request,
     SELECTED_ZONE,
+    WINDOW_SIZE,
     end_dt,
+    fetch_graphql_windowed,
     filters,
-    json,
     start_dt,
-    urlopen,
+    timedelta,
 ):
     _QUERY_STR = '''
     {
@@ -454,60 +448,63 @@ def _(
       }
     '''
 
-    _QUERY_VARIABLES = {"zoneTag": SELECTED_ZONE,
-                        "filter": {
-                            "AND": [{"datetime_leq": end_dt,
-                                     "datetime_geq": start_dt},
-                                    {"requestSource": "eyeball"},
-                                    {"clientRequestPath_neq": "/robots.txt"},
-                                    {"clientRequestHTTPHost_like": f"{ROBOTS_HOST}%"},
-                                    {"OR": [{"edgeResponseStatus": 200},
-                                            {"edgeResponseStatus": 304}]},
-                                    {"OR": filters}]
-                        }}
-
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_audit_ts_data = json.loads(_resp_raw)
-    return (json_audit_ts_data,)
+    def _window_variables(since, until):
+        return {"zoneTag": SELECTED_ZONE,
+                "filter": {
+                    "AND": [{"datetime_lt": until,
+                             "datetime_geq": since},
+                            {"requestSource": "eyeball"},
+                            {"clientRequestPath_neq": "/robots.txt"},
+                            {"clientRequestHTTPHost_like": f"{ROBOTS_HOST}%"},
+                            {"OR": [{"edgeResponseStatus": 200},
+                                    {"edgeResponseStatus": 304}]},
+                            {"OR": filters}]
+                }}
+
+    # Sub-intervals are aligned on days (the `date` dimension), fetched concurrently, and split
+    # again if they reach the 5000 rows limit
+    audit_ts_rows = fetch_graphql_windowed(
+        HOSTNAME,
+        CF_API_TOKEN,
+        {"query": _QUERY_STR},
+        "topPaths",
+        start_dt,
+        end_dt,
+        _window_variables,
+        size=WINDOW_SIZE,
+        grain=timedelta(days=1),
+        limit=5000,
+    )
+    return (audit_ts_rows,)
 
 
 @app.cell
-def _(USER_AGENTS, json_audit_ts_data, pd):
-    _all_rows = []
-
+def _(USER_AGENTS, audit_ts_rows, pd, rows_frame):
     # Format response code data into a DataFrame with [time - user agent - matched user agent - visits]
-    for _entry in json_audit_ts_data['data']['viewer']['scope'][0]['topPaths']:
-        # Given that AI user agents are matched with a `%{ua}%` pattern, we check for matches using the "in" statement
-        # Just in case, we store as arrays, but ideally the lengths should be exactly 1
-        _curr_ua_matches = [el for el in USER_AGENTS if el in _entry['dimensions']['userAgent']]
+    df_ai_time = rows_frame(audit_ts_rows, {
+        'dimensions.ts': 'time',
+        'dimensions.userAgent': 'user_agent',
+        'sum.visits': 'violations',
+    })
+
+    # Given that AI user agents are matched with a `%{ua}%` pattern, we check for matches using the "in" statement
+    _ua_matches = {}
+    for _ua in df_ai_time['user_agent'].unique():
+        _curr_ua_matches = [el for el in USER_AGENTS if el in _ua]
 
         # For this trend, we are assuming each row corresponds to a single AI entry
         if len(_curr_ua_matches) != 1:
-            raise ValueError(f'''Pattern {_entry['dimensions']['userAgent']} matched {len(_curr_ua_matches)} entries''')
-
-        _curr_row = dict(
-            time=_entry['dimensions']['ts'],
-            user_agent=_entry['dimensions']['userAgent'],
-            ua_matches=_curr_ua_matches[0],
-            violations=_entry['sum']['visits']
-        )
-        _all_rows.append(_curr_row)
+            raise ValueError(f'''Pattern {_ua} matched {len(_curr_ua_matches)} entries''')
+        _ua_matches[_ua] = _curr_ua_matches[0]
 
-    df_ai_time = pd.DataFrame(_all_rows)
+    df_ai_time.insert(2, 'ua_matches', df_ai_time['user_agent'].map(_ua_matches))
     df_ai_time['time'] = pd.to_datetime(df_ai_time['time']).astype('datetime64[s]')
     return (df_ai_time,)
 
 
 @app.cell
-def _(alt, df_ai_time):
+def _(alt, df_ai_time, headless, mo):
+    mo.stop(headless())
     alt.Chart(df_ai_time).mark_line().encode(
         alt.X('time:T', title='Time'),
         alt.Y('violations:Q', title='Visits'),
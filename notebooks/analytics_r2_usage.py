@@ -18,11 +18,27 @@ app = marimo.App(width="full", app_title="Cloudflare Notebook", auto_download=["
 # Login Cells #
 ###############
 @app.cell(hide_code=True)
-def _():
+async def _():
     # Helper Stub - click to view code
     import json, marimo as mo, requests, warnings, moutils, urllib, sys  # noqa: E401
     from moutils.oauth import PKCEFlow
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
+
+    if sys.platform == "emscripten":
+        # The cfkit helpers are not among the files of the WASM build, they are installed from the wheel
+        # exported next to the notebooks (see `make export`)
+        import micropip
+        try:
+            await micropip.install(str(mo.notebook_location() / "cfkit-0.1.0-py3-none-any.whl"))
+        except Exception as e:
+            raise RuntimeError("The cfkit helpers, which the cells below rely on, could not be installed "
+                               "from the wheel exported next to this notebook") from e
+    from cfkit.http import urlopen  # pooled, keep-alive replacement for urllib's urlopen
+    try:
+        from cfkit.headless import batch_account_id, batch_login, headless  # headless runs, see cfkit.batch
+    except ImportError:
+        batch_account_id = batch_login = lambda: None  # noqa: E731
+        headless = lambda: False  # noqa: E731
 
     debug = False
     warnings.filterwarnings("ignore", category=UserWarning, module="pkg_resources")
@@ -46,13 +62,13 @@ def _():
             print("Token invalid - Please login using the button above")
             if debug: print("[DEBUG] Exception:", e)
             return []
-    return PKCEFlow, Request, debug, get_accounts, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
+    return PKCEFlow, Request, batch_account_id, batch_login, debug, get_accounts, headless, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
 
 
 @app.cell(hide_code=True)
-def _(PKCEFlow):
+def _(PKCEFlow, batch_login):
     # Login to Cloudflare - click to view code
-    df = PKCEFlow(provider="cloudflare", use_new_tab=True)
+    df = batch_login() or PKCEFlow(provider="cloudflare", use_new_tab=True)
     df
     return df
 
@@ -67,10 +83,13 @@ async def _(debug, df, get_accounts, mo):
 
 
 @app.cell(hide_code=True)
-def _(accounts, df, mo, radio):
+def _(accounts, batch_account_id, df, mo, radio):
     # Select Account Stub - click to view code
     account_name = radio.value if radio.value else None
     account_id = (next((a["id"] for a in accounts if a["name"] == account_name), None) if accounts else None)
+    if batch_account_id():
+        account_id = batch_account_id()
+        account_name = next((a["name"] for a in accounts if a["id"] == account_id), account_id)
     mo.hstack(
         [
             radio,
@@ -97,11 +116,29 @@ def _(account_id, mo, proxy, df):
     import altair as alt
     from datetime import datetime
     import pandas as pd
+    from cfkit.frames import json_frame, rows_frame
+    from cfkit.graphql import fetch_graphql_many, paginate_graphql
+    from cfkit.hourly import hourly_store
+    from cfkit.planner import QueryPlan, Selection
 
     CF_ACCOUNT_ID = account_id
     CF_API_TOKEN = df.access_token  # or a custom token from dash.cloudflare.com
     HOSTNAME = proxy
-    return CF_ACCOUNT_ID, CF_API_TOKEN, HOSTNAME, alt, datetime, pd
+    return (
+        CF_ACCOUNT_ID,
+        CF_API_TOKEN,
+        HOSTNAME,
+        QueryPlan,
+        Selection,
+        alt,
+        datetime,
+        fetch_graphql_many,
+        hourly_store,
+        json_frame,
+        paginate_graphql,
+        pd,
+        rows_frame,
+    )
 
 
 @app.cell
@@ -178,93 +215,83 @@ def _():
     return (TOP_N,)
 
 
-@app.cell
-def _(mo):
-    mo.md(r"""### Rank by number of objects""")
-    return
-
-
 @app.cell
 def _(
     CF_ACCOUNT_ID,
     CF_API_TOKEN,
     HOSTNAME,
-    Request,
-    TOP_N,
-    json,
-    start_dt,
-    urlopen,
+    QueryPlan,
+    fetch_graphql_many,
+    query_metric,
+    query_object_rank,
+    query_request_rank,
+    query_size_rank,
 ):
-    _QUERY_STR = """
-    query BucketLevelMetricsQuery($accountTag: string!, $limit: uint64!, $queryStart: Date) {
-      viewer {
-        accounts(filter: {accountTag: $accountTag}) {
-          standard: r2StorageAdaptiveGroups(orderBy: [max_objectCount_DESC],
-                                            limit: $limit,
-                                            filter: {storageClass: "Standard", datetime_geq: $queryStart}) {
-            max {
-              objectCount
-            }
-            dimensions {
-              bucketName
-            }
-          }
-          ia: r2StorageAdaptiveGroups(orderBy: [max_objectCount_DESC],
-                                      limit: $limit,
-                                      filter: {storageClass: "InfrequentAccess", datetime_geq: $queryStart}) {
-            max {
-              objectCount
-            }
-            dimensions {
-              bucketName
-            }
-          }
-        }
-      }
-    }
-    """
+    # Both bucket ranks read r2StorageAdaptiveGroups with the same filters, so they are planned as a
+    # single request: the storage is scanned once per storage class and each rank is computed locally
+    _rank_plan = QueryPlan(
+        "accounts",
+        {"accountTag": CF_ACCOUNT_ID},
+        {"objects": query_object_rank, "size": query_size_rank},
+    )
 
-    _QUERY_VARIABLES = {
-        "accountTag": CF_ACCOUNT_ID,
-        "limit": TOP_N,
-        "queryStart": start_dt,
-    }
+    # The queries defined in the cells below do not depend on each other, so they are all sent
+    # at once and the notebook only waits for the slowest one
+    _json_rank_data, json_request_rank_data, json_metric_data = fetch_graphql_many(
+        HOSTNAME,
+        CF_API_TOKEN,
+        [_rank_plan, query_request_rank, query_metric],
+    )
+    json_object_rank_data = _json_rank_data["objects"]
+    json_size_rank_data = _json_rank_data["size"]
+    return (
+        json_metric_data,
+        json_object_rank_data,
+        json_request_rank_data,
+        json_size_rank_data,
+    )
+
+
+@app.cell
+def _(mo):
+    mo.md(r"""### Rank by number of objects""")
+    return
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
 
-    json_object_rank_data = json.loads(_resp_raw)
-    return (json_object_rank_data,)
+@app.cell
+def _(Selection, TOP_N, start_dt):
+    # Buckets with the most objects, one selection per storage class
+    query_object_rank = [
+        Selection(
+            "standard",
+            "r2StorageAdaptiveGroups",
+            filter={"storageClass": "Standard", "datetime_geq": start_dt},
+            fields={"max": ["objectCount"], "dimensions": ["bucketName"]},
+            order_by=["max_objectCount_DESC"],
+            limit=TOP_N,
+        ),
+        Selection(
+            "ia",
+            "r2StorageAdaptiveGroups",
+            filter={"storageClass": "InfrequentAccess", "datetime_geq": start_dt},
+            fields={"max": ["objectCount"], "dimensions": ["bucketName"]},
+            order_by=["max_objectCount_DESC"],
+            limit=TOP_N,
+        ),
+    ]
+    return (query_object_rank,)
 
 
 @app.cell
-def _(json_object_rank_data, pd):
+def _(json_frame, json_object_rank_data):
     if json_object_rank_data["errors"] is None:
+        _columns = {"dimensions.bucketName": "bucket", "max.objectCount": "objects"}
+
         # Process results for standard buckets
-        _rows_standard = []
-        for _entry in json_object_rank_data["data"]["viewer"]["accounts"][0]["standard"]:
-            _curr_row = dict(
-                bucket=_entry["dimensions"]["bucketName"],
-                objects=_entry["max"]["objectCount"],
-            )
-            _rows_standard.append(_curr_row)
-        df_top_objects_standard = pd.DataFrame(_rows_standard)
+        df_top_objects_standard = json_frame(json_object_rank_data, "data.viewer.accounts.0.standard", _columns)
 
         # Process results for infrequent access buckets
-        _rows_ia = []
-        for _entry in json_object_rank_data["data"]["viewer"]["accounts"][0]["ia"]:
-            _curr_row = dict(
-                bucket=_entry["dimensions"]["bucketName"],
-                objects=_entry["max"]["objectCount"],
-            )
-            _rows_ia.append(_curr_row)
-        df_top_objects_ia = pd.DataFrame(_rows_ia)
+        df_top_objects_ia = json_frame(json_object_rank_data, "data.viewer.accounts.0.ia", _columns)
     else:
         _error_msg = "\n - ".join([el["message"] for el in json_object_rank_data["errors"]])
         print(f"Obtained the following errors:\n - {_error_msg}")
@@ -273,7 +300,8 @@ def _(json_object_rank_data, pd):
 
 
 @app.cell
-def _(alt, datetime, df_top_objects_standard, start_dt):
+def _(alt, datetime, df_top_objects_standard, headless, mo, start_dt):
+    mo.stop(headless())
     # This prevents us from using fig.display() which would require
     # installing ipython
     _fig = None
@@ -309,7 +337,8 @@ def _(alt, datetime, df_top_objects_standard, start_dt):
 
 
 @app.cell
-def _(alt, datetime, df_top_objects_ia, start_dt):
+def _(alt, datetime, df_top_objects_ia, headless, mo, start_dt):
+    mo.stop(headless())
     _fig = None
 
     if int(df_top_objects_ia["objects"].sum()) == 0:
@@ -349,88 +378,41 @@ def _(mo):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    TOP_N,
-    json,
-    start_dt,
-    urlopen,
-):
-    _QUERY_STR = """
-    query BucketLevelMetricsQuery($accountTag: string!, $limit: uint64!, $queryStart: Date) {
-      viewer {
-        accounts(filter: {accountTag: $accountTag}) {
-          standard: r2StorageAdaptiveGroups(orderBy: [max_payloadSize_DESC],
-                                            limit: $limit,
-                                            filter: {storageClass: "Standard", datetime_geq: $queryStart}) {
-            max {
-              payloadSize
-            }
-            dimensions {
-              bucketName
-            }
-          }
-          ia: r2StorageAdaptiveGroups(orderBy: [max_payloadSize_DESC],
-                                      limit: $limit,
-                                      filter: {storageClass: "InfrequentAccess", datetime_geq: $queryStart}) {
-            max {
-              payloadSize
-            }
-            dimensions {
-              bucketName
-            }
-          }
-        }
-      }
-    }
-    """
-
-    _QUERY_VARIABLES = {
-        "accountTag": CF_ACCOUNT_ID,
-        "limit": TOP_N,
-        "queryStart": start_dt,
-    }
-
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_size_rank_data = json.loads(_resp_raw)
-    return (json_size_rank_data,)
+def _(Selection, TOP_N, start_dt):
+    # Buckets with the most stored bytes, one selection per storage class
+    query_size_rank = [
+        Selection(
+            "standard",
+            "r2StorageAdaptiveGroups",
+            filter={"storageClass": "Standard", "datetime_geq": start_dt},
+            fields={"max": ["payloadSize"], "dimensions": ["bucketName"]},
+            order_by=["max_payloadSize_DESC"],
+            limit=TOP_N,
+        ),
+        Selection(
+            "ia",
+            "r2StorageAdaptiveGroups",
+            filter={"storageClass": "InfrequentAccess", "datetime_geq": start_dt},
+            fields={"max": ["payloadSize"], "dimensions": ["bucketName"]},
+            order_by=["max_payloadSize_DESC"],
+            limit=TOP_N,
+        ),
+    ]
+    return (query_size_rank,)
 
 
 @app.cell
-def _(json_size_rank_data, pd, readable_byte_vals):
+def _(json_frame, json_size_rank_data, readable_byte_vals):
     if json_size_rank_data["errors"] is None:
+        _columns = {"dimensions.bucketName": "bucket", "max.payloadSize": "size"}
+
         # Process results for standard buckets
-        _rows_standard = []
-        for _entry in json_size_rank_data["data"]["viewer"]["accounts"][0]["standard"]:
-            _curr_row = dict(
-                bucket=_entry["dimensions"]["bucketName"],
-                size=_entry["max"]["payloadSize"],
-            )
-            _rows_standard.append(_curr_row)
-        df_top_size_standard = pd.DataFrame(_rows_standard)
+        df_top_size_standard = json_frame(json_size_rank_data, "data.viewer.accounts.0.standard", _columns)
         df_top_size_standard["size_gb"] = df_top_size_standard["size"] / 1e9
         df_top_size_standard["size_readable"] = df_top_size_standard["size"].apply(lambda x: readable_byte_vals(x))
 
         # Process results for infrequent access buckets
-        _rows_ia = []
-        for _entry in json_size_rank_data["data"]["viewer"]["accounts"][0]["ia"]:
-            _curr_row = dict(
-                bucket=_entry["dimensions"]["bucketName"],
-                size=_entry["max"]["payloadSize"],
-            )
-            _rows_ia.append(_curr_row)
-        df_top_size_ia = pd.DataFrame(_rows_ia)
+        df_top_size_ia = json_frame(json_size_rank_data, "data.viewer.accounts.0.ia", _columns)
         df_top_size_ia["size_gb"] = df_top_size_ia["size"] / 1e9
         df_top_size_ia["size_readable"] = df_top_size_ia["size"].apply(
             lambda x: readable_byte_vals(x)
@@ -443,7 +425,8 @@ def _(json_size_rank_data, pd, readable_byte_vals):
 
 
 @app.cell
-def _(alt, datetime, df_top_size_standard, start_dt):
+def _(alt, datetime, df_top_size_standard, headless, mo, start_dt):
+    mo.stop(headless())
     _fig = None
 
     if int(df_top_size_standard["size"].sum()) == 0:
@@ -479,7 +462,8 @@ def _(alt, datetime, df_top_size_standard, start_dt):
 
 
 @app.cell
-def _(alt, datetime, df_top_size_ia, start_dt):
+def _(alt, datetime, df_top_size_ia, headless, mo, start_dt):
+    mo.stop(headless())
     _fig = None
 
     if int(df_top_size_ia["size"].sum()) == 0:
@@ -515,19 +499,10 @@ def _(alt, datetime, df_top_size_ia, start_dt):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    TOP_N,
-    json,
-    start_dt,
-    urlopen,
-):
+def _(CF_ACCOUNT_ID, TOP_N, start_dt):
     _QUERY_STR = """
     query getR2Requests($accountTag: string,
-                        $limit: $limit: uint64!,
+                        $limit: uint64!,
                         $classAOpsFilterStandard: AccountR2OperationsAdaptiveGroupsFilter_InputObject,
                         $classBOpsFilterStandard: AccountR2OperationsAdaptiveGroupsFilter_InputObject,
                         $classAOpsFilterIA: AccountR2OperationsAdaptiveGroupsFilter_InputObject,
@@ -644,66 +619,29 @@ def _(
         },
     }
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_request_rank_data = json.loads(_resp_raw)
-    return (json_request_rank_data,)
+    query_request_rank = {"query": _QUERY_STR, "variables": _QUERY_VARIABLES}
+    return (query_request_rank,)
 
 
 @app.cell
-def _(json_request_rank_data, pd, readable_numbers):
+def _(json_frame, json_request_rank_data, pd, readable_numbers):
     if json_request_rank_data["errors"] is None:
         # Store everything under the same dataframe, long format
-        _rows = []
-
-        # Operations A - standard
-        for _entry in json_request_rank_data["data"]["viewer"]["accounts"][0]["classAOpsStandard"]:
-            _curr_row = dict(
-                bucket=_entry["dimensions"]["bucketName"],
-                storage_class=_entry["dimensions"]["storageClass"],
-                operation_type="A",
-                requests=_entry["sum"]["requests"],
-            )
-            _rows.append(_curr_row)
-
-        # Operations A - infrequent access
-        for _entry in json_request_rank_data["data"]["viewer"]["accounts"][0]["classAOpsIA"]:
-            _curr_row = dict(
-                bucket=_entry["dimensions"]["bucketName"],
-                storage_class=_entry["dimensions"]["storageClass"],
-                operation_type="A",
-                requests=_entry["sum"]["requests"],
-            )
-            _rows.append(_curr_row)
-
-        # Operations B - standard
-        for _entry in json_request_rank_data["data"]["viewer"]["accounts"][0]["classBOpsStandard"]:
-            _curr_row = dict(
-                bucket=_entry["dimensions"]["bucketName"],
-                storage_class=_entry["dimensions"]["storageClass"],
-                operation_type="B",
-                requests=_entry["sum"]["requests"],
-            )
-            _rows.append(_curr_row)
-
-        # Operations B - infrequent access
-        for _entry in json_request_rank_data["data"]["viewer"]["accounts"][0]["classBOpsIA"]:
-            _curr_row = dict(
-                bucket=_entry["dimensions"]["bucketName"],
-                storage_class=_entry["dimensions"]["storageClass"],
-                operation_type="B",
-                requests=_entry["sum"]["requests"],
-            )
-            _rows.append(_curr_row)
-
-        df_top_requests = pd.DataFrame(_rows)
+        _columns = {
+            "dimensions.bucketName": "bucket",
+            "dimensions.storageClass": "storage_class",
+            "sum.requests": "requests",
+        }
+        _frames = [
+            json_frame(json_request_rank_data, f"data.viewer.accounts.0.{_alias}", _columns, operation_type=_op_type)
+            for _alias, _op_type in [
+                ("classAOpsStandard", "A"),
+                ("classAOpsIA", "A"),
+                ("classBOpsStandard", "B"),
+                ("classBOpsIA", "B"),
+            ]
+        ]
+        df_top_requests = pd.concat(_frames, ignore_index=True)[["bucket", "storage_class", "operation_type", "requests"]]
         df_top_requests["requests_readable"] = df_top_requests["requests"].apply(
             lambda x: readable_numbers(x)
         )
@@ -716,7 +654,8 @@ def _(json_request_rank_data, pd, readable_numbers):
 
 
 @app.cell
-def _(alt, datetime, df_top_requests, start_dt):
+def _(alt, datetime, df_top_requests, headless, mo, start_dt):
+    mo.stop(headless())
     _fig = None
     _curr_view = df_top_requests.loc[
         (df_top_requests["storage_class"] == "Standard")
@@ -762,7 +701,8 @@ def _(alt, datetime, df_top_requests, start_dt):
 
 
 @app.cell
-def _(alt, datetime, df_top_requests, start_dt):
+def _(alt, datetime, df_top_requests, headless, mo, start_dt):
+    mo.stop(headless())
     _fig = None
     _curr_view = df_top_requests.loc[
         (df_top_requests["storage_class"] == "Standard")
@@ -808,7 +748,8 @@ def _(alt, datetime, df_top_requests, start_dt):
 
 
 @app.cell
-def _(alt, datetime, df_top_requests, start_dt):
+def _(alt, datetime, df_top_requests, headless, mo, start_dt):
+    mo.stop(headless())
     _fig = None
     _curr_view = df_top_requests.loc[
         (df_top_requests["storage_class"] == "InfrequentAccess")
@@ -854,7 +795,8 @@ def _(alt, datetime, df_top_requests, start_dt):
 
 
 @app.cell
-def _(alt, datetime, df_top_requests, start_dt):
+def _(alt, datetime, df_top_requests, headless, mo, start_dt):
+    mo.stop(headless())
     _fig = None
     _curr_view = df_top_requests.loc[
         (df_top_requests["storage_class"] == "InfrequentAccess")
@@ -908,25 +850,28 @@ def _(mo):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    TOP_N,
-    json,
-    start_dt,
-    urlopen,
-):
-    _QUERY_STR = """
-    query getR2Requests($accountTag: string,
-                        $classAOpsFilter: AccountR2OperationsAdaptiveGroupsFilter_InputObject,
-                        $classBOpsFilter: AccountR2OperationsAdaptiveGroupsFilter_InputObject,
-                        $storageFilter: AccountR2StorageAdaptiveGroupsFilter_InputObject) {
-      viewer {
-        accounts(filter: {accountTag: $accountTag}) {
+def _(CF_ACCOUNT_ID, hourly_store, start_dt):
+    # In incremental mode, hourly usage already fetched by a previous run is read from disk
+    # (as Parquet) and only the hours since the last complete one are queried
+    INCREMENTAL = True
+
+    metric_stores = {}
+    if INCREMENTAL:
+        metric_stores = {
+            "requests": hourly_store("r2_usage", CF_ACCOUNT_ID, "requests"),
+            "storage": hourly_store("r2_usage", CF_ACCOUNT_ID, "storage"),
+        }
+    metric_start_dt = min((_store.resume_from(start_dt) for _store in metric_stores.values()), default=start_dt)
+    return metric_start_dt, metric_stores
+
+
+@app.cell
+def _(CF_ACCOUNT_ID, TOP_N, metric_start_dt):
+    # Selections by alias, with their filter variable and its type
+    _SELECTIONS = {
+        "classAOps": ("classAOpsFilter", "AccountR2OperationsAdaptiveGroupsFilter_InputObject", """
           classAOps: r2OperationsAdaptiveGroups(limit: 10000,
-                                                orderBy: [datetimeHour_ASC],
+                                                orderBy: [datetimeHour_ASC, storageClass_ASC],
                                                 filter: $classAOpsFilter) {
             sum {
               requests
@@ -935,9 +880,10 @@ def _(
               storageClass
               datetimeHour
             }
-          }
+          }"""),
+        "classBOps": ("classBOpsFilter", "AccountR2OperationsAdaptiveGroupsFilter_InputObject", """
           classBOps: r2OperationsAdaptiveGroups(limit: 10000,
-                                                orderBy: [datetimeHour_ASC],
+                                                orderBy: [datetimeHour_ASC, storageClass_ASC],
                                                 filter: $classBOpsFilter) {
             sum {
               requests
@@ -946,9 +892,10 @@ def _(
               storageClass
               datetimeHour
             }
-          }
+          }"""),
+        "storage": ("storageFilter", "AccountR2StorageAdaptiveGroupsFilter_InputObject", """
           storage: r2StorageAdaptiveGroups(limit: 10000,
-                                           orderBy: [datetimeHour_ASC],
+                                           orderBy: [datetimeHour_ASC, storageClass_ASC],
                                            filter: $storageFilter) {
             max {
               payloadSize
@@ -958,10 +905,19 @@ def _(
               storageClass
               datetimeHour
             }
-          }
-        }
-      }
+          }"""),
     }
+
+    def _metric_query(aliases):
+        _filters = "".join(f", ${_SELECTIONS[a][0]}: {_SELECTIONS[a][1]}" for a in aliases)
+        _fields = "".join(_SELECTIONS[a][2] for a in aliases)
+        return f"""
+    query getR2Requests($accountTag: string{_filters}) {{
+      viewer {{
+        accounts(filter: {{accountTag: $accountTag}}) {{{_fields}
+        }}
+      }}
+    }}
     """
 
     _action_status = ["success", "userError"]
@@ -1002,70 +958,87 @@ def _(
         "classAOpsFilter": {
             "actionType_in": _aops_actions,
             "actionStatus_in": _action_status,
-            "AND": [{"datetime_geq": start_dt}],
+            "AND": [{"datetime_geq": metric_start_dt}],
         },
         "classBOpsFilter": {
             "actionType_in": _bops_actions,
             "actionStatus_in": _action_status,
-            "AND": [{"datetime_geq": start_dt}],
+            "AND": [{"datetime_geq": metric_start_dt}],
         },
-        "storageFilter": {"AND": [{"datetime_geq": start_dt}]},
+        "storageFilter": {"AND": [{"datetime_geq": metric_start_dt}]},
     }
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_metric_data = json.loads(_resp_raw)
-    return (json_metric_data,)
+    query_metric = {"query": _metric_query(list(_SELECTIONS)), "variables": _QUERY_VARIABLES}
+    # Further pages of a selection are fetched with a query holding only that selection
+    query_metric_pages = {
+        _alias: {
+            "query": _metric_query([_alias]),
+            "variables": {"accountTag": CF_ACCOUNT_ID, _filter: _QUERY_VARIABLES[_filter]},
+        }
+        for _alias, (_filter, _, _) in _SELECTIONS.items()
+    }
+    return query_metric, query_metric_pages
 
 
 @app.cell
-def _(json_metric_data, pd, readable_byte_vals):
+def _(
+    CF_API_TOKEN,
+    HOSTNAME,
+    json_metric_data,
+    metric_stores,
+    paginate_graphql,
+    pd,
+    query_metric_pages,
+    readable_byte_vals,
+    rows_frame,
+    start_dt,
+):
     if json_metric_data["errors"] is None:
         # Store everything request related under the same dataframe, long format
         # Storage is organized into a separate dataframe
-        _rows = []
-        _rows_storage = []
+
+        # Each selection is limited to 10000 rows, so if the response above is not complete
+        # the remaining rows are fetched in pages, starting after the last (hour, storage class)
+        def _metric_pages(alias, filter_variable):
+            return paginate_graphql(HOSTNAME, CF_API_TOKEN, query_metric_pages[alias], alias,
+                                    cursor=["datetimeHour", "storageClass"],
+                                    filter_variable=filter_variable,
+                                    first_response=json_metric_data)
+
+        _request_columns = {
+            "dimensions.datetimeHour": "time",
+            "dimensions.storageClass": "storage_class",
+            "sum.requests": "requests",
+        }
+        _storage_columns = {
+            "dimensions.datetimeHour": "time",
+            "dimensions.storageClass": "storage_class",
+            "max.payloadSize": "payload_size",
+            "max.metadataSize": "metadata_size",
+        }
 
         # Requests
-        for _entry in json_metric_data["data"]["viewer"]["accounts"][0]["classAOps"]:
-            _curr_row = dict(
-                time=_entry["dimensions"]["datetimeHour"],
-                storage_class=_entry["dimensions"]["storageClass"],
-                operation_type="A",
-                requests=_entry["sum"]["requests"],
-            )
-            _rows.append(_curr_row)
-
-        for _entry in json_metric_data["data"]["viewer"]["accounts"][0]["classBOps"]:
-            _curr_row = dict(
-                time=_entry["dimensions"]["datetimeHour"],
-                storage_class=_entry["dimensions"]["storageClass"],
-                operation_type="B",
-                requests=_entry["sum"]["requests"],
-            )
-            _rows.append(_curr_row)
-        df_metric_requests = pd.DataFrame(_rows)
+        _frames = [
+            rows_frame(_page, _request_columns, operation_type=_op_type)
+            for _alias, _filter, _op_type in [("classAOps", "classAOpsFilter", "A"), ("classBOps", "classBOpsFilter", "B")]
+            for _page in _metric_pages(_alias, _filter)
+        ]
+        df_metric_requests = pd.concat(_frames, ignore_index=True)[["time", "storage_class", "operation_type", "requests"]]
+
+        # Add the new hours to the ones stored by previous runs
+        if "requests" in metric_stores:
+            df_metric_requests = metric_stores["requests"].extend(df_metric_requests, start_dt)
         df_metric_requests["time"] = pd.to_datetime(
             df_metric_requests["time"], format="%Y-%m-%dT%H:%M:00Z"
         ).astype("datetime64[s]")
 
         # Storage
-        for _entry in json_metric_data["data"]["viewer"]["accounts"][0]["storage"]:
-            _curr_row = dict(
-                time=_entry["dimensions"]["datetimeHour"],
-                storage_class=_entry["dimensions"]["storageClass"],
-                payload_size=_entry["max"]["payloadSize"],
-                metadata_size=_entry["max"]["metadataSize"],
-            )
-            _rows_storage.append(_curr_row)
-        df_metric_storage = pd.DataFrame(_rows_storage)
+        df_metric_storage = pd.concat(
+            [rows_frame(_page, _storage_columns) for _page in _metric_pages("storage", "storageFilter")],
+            ignore_index=True,
+        )
+        if "storage" in metric_stores:
+            df_metric_storage = metric_stores["storage"].extend(df_metric_storage, start_dt)
         df_metric_storage["time"] = pd.to_datetime(
             df_metric_storage["time"], format="%Y-%m-%dT%H:%M:00Z"
         ).astype("datetime64[s]")
@@ -1082,7 +1055,8 @@ def _(json_metric_data, pd, readable_byte_vals):
 
 
 @app.cell
-def _(alt, df_metric_requests):
+def _(alt, df_metric_requests, headless, mo):
+    mo.stop(headless())
     alt.Chart(df_metric_requests).transform_calculate(
         category="datum.storage_class + ' - Operation class ' + datum.operation_type"
     ).mark_area().encode(
@@ -1104,7 +1078,8 @@ def _(alt, df_metric_requests):
 
 
 @app.cell
-def _(alt, df_metric_storage):
+def _(alt, df_metric_storage, headless, mo):
+    mo.stop(headless())
     alt.Chart(df_metric_storage).mark_line().encode(
         alt.X("time:T", title="Time"),
         alt.Y("payload_size_gb:Q", title="Object storage (GB)"),
@@ -18,11 +18,27 @@ app = marimo.App(width="full", app_title="Cloudflare Notebook", auto_download=["
 # Login Cells #
 ###############
 @app.cell(hide_code=True)
-def _():
+async def _():
     # Helper Stub - click to view code
     import json, marimo as mo, requests, warnings, moutils, urllib, sys  # noqa: E401
     from moutils.oauth import PKCEFlow
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
+
+    if sys.platform == "emscripten":
+        # The cfkit helpers are not among the files of the WASM build, they are installed from the wheel
+        # exported next to the notebooks (see `make export`)
+        import micropip
+        try:
+            await micropip.install(str(mo.notebook_location() / "cfkit-0.1.0-py3-none-any.whl"))
+        except Exception as e:
+            raise RuntimeError("The cfkit helpers, which the cells below rely on, could not be installed "
+                               "from the wheel exported next to this notebook") from e
+    from cfkit.http import urlopen  # pooled, keep-alive replacement for urllib's urlopen
+    try:
+        from cfkit.headless import batch_account_id, batch_login, headless  # headless runs, see cfkit.batch
+    except ImportError:
+        batch_account_id = batch_login = lambda: None  # noqa: E731
+        headless = lambda: False  # noqa: E731
 
     debug = False
     warnings.filterwarnings("ignore", category=UserWarning, module="pkg_resources")
@@ -46,13 +62,13 @@ def _():
             print("Token invalid - Please login using the button above")
             if debug: print("[DEBUG] Exception:", e)
             return []
-    return PKCEFlow, Request, debug, get_accounts, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
+    return PKCEFlow, Request, batch_account_id, batch_login, debug, get_accounts, headless, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
 
 
 @app.cell(hide_code=True)
-def _(PKCEFlow):
+def _(PKCEFlow, batch_login):
     # Login to Cloudflare - click to view code
-    df = PKCEFlow(provider="cloudflare", use_new_tab=True)
+    df = batch_login() or PKCEFlow(provider="cloudflare", use_new_tab=True)
     df
     return df
 
@@ -67,10 +83,13 @@ async def _(debug, df, get_accounts, mo):
 
 
 @app.cell(hide_code=True)
-def _(accounts, df, mo, radio):
+def _(accounts, batch_account_id, df, mo, radio):
     # Select Account Stub - click to view code
     account_name = radio.value if radio.value else None
     account_id = (next((a["id"] for a in accounts if a["name"] == account_name), None) if accounts else None)
+    if batch_account_id():
+        account_id = batch_account_id()
+        account_name = next((a["name"] for a in accounts if a["id"] == account_id), account_id)
     mo.hstack(
         [
             radio,
@@ -97,11 +116,45 @@ def _(account_id, mo, proxy, df):
     import altair as alt
     from datetime import datetime, timedelta
     import pandas as pd
+    from cfkit.aggregate import top_n_other
+    from cfkit.cache import closed_before
+    from cfkit.frames import map_frames, rows_frame
+    from cfkit.graphql import fetch_graphql_many, stream_graphql_windowed
+    from cfkit.pagination import selection_rows
+    from cfkit.planner import QueryPlan, Selection
+    from cfkit.rollup import rollup_store
+    from cfkit.sampling import sample_bounds
+    from cfkit.sweep import sweep_map_frames, sweep_zones
+    from cfkit.windows import format_time
+    from cfkit.zones import zone_inventory
 
     CF_ACCOUNT_ID = account_id
     CF_API_TOKEN = df.access_token  # or a custom token from dash.cloudflare.com
     HOSTNAME = proxy
-    return CF_ACCOUNT_ID, CF_API_TOKEN, HOSTNAME, alt, datetime, pd, timedelta
+    return (
+        CF_ACCOUNT_ID,
+        CF_API_TOKEN,
+        HOSTNAME,
+        QueryPlan,
+        Selection,
+        alt,
+        closed_before,
+        datetime,
+        fetch_graphql_many,
+        format_time,
+        map_frames,
+        pd,
+        rollup_store,
+        rows_frame,
+        sample_bounds,
+        selection_rows,
+        stream_graphql_windowed,
+        sweep_map_frames,
+        sweep_zones,
+        timedelta,
+        top_n_other,
+        zone_inventory,
+    )
 
 
 @app.cell
@@ -121,35 +174,11 @@ def _(mo):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    json,
-    pd,
-    urllib,
-    urlopen,
-):
-    # Endpoint to get list of zones belonging to the selected account
-    # Warning: this will fetch at most 50 zones
-    _main_call = f"{HOSTNAME}/client/v4/zones"
-    _params = {"per_page": 50, "account.id": CF_ACCOUNT_ID}
-    _api_call = _main_call + '?' + urllib.parse.urlencode(_params)
-    _request = Request(_api_call, headers={"Authorization": f"Bearer {CF_API_TOKEN}"})
-    _api_resp = urlopen(_request).read()
-    _res_raw = pd.DataFrame(json.loads(_api_resp)["result"])
-
-    # Clean columns
-    account_zones = _res_raw[
-        ["id", "name", "status", "paused", "plan", "modified_on"]
-    ].copy()
-    account_zones["plan_name"] = account_zones["plan"].apply(lambda x: x["name"])
-    account_zones = account_zones.drop(columns=["plan"])[
-        ["name", "id", "plan_name", "status", "paused", "modified_on"]
-    ]
-    account_zones = account_zones.sort_values("name")
-    return (account_zones,)
+def _(CF_ACCOUNT_ID, CF_API_TOKEN, HOSTNAME, zone_inventory):
+    # Every zone belonging to the selected account, listed concurrently and kept for an hour
+    zones = zone_inventory(HOSTNAME, CF_API_TOKEN, CF_ACCOUNT_ID)
+    account_zones = zones.frame()
+    return account_zones, zones
 
 
 @app.cell
@@ -179,6 +208,7 @@ def _(mo):
 @app.cell
 def _(account_zones, datetime, timedelta):
     # Choose zone tag (id) to obtain data from, using the table above
+    # or by name, e.g. zones.by_name("example.com")["id"]
     zone_tag = account_zones["id"][0]
     # Demo example: First zone from the list
 
@@ -186,29 +216,26 @@ def _(account_zones, datetime, timedelta):
     curr_dt = datetime.now().replace(second=0, microsecond=0)
     end_dt = curr_dt.strftime("%Y-%m-%dT%H:%M:00Z")
     start_dt = (curr_dt - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:00Z")
-    return end_dt, start_dt, zone_tag
+
+    # Longer intervals are fetched in sub-intervals of this size, all at once
+    WINDOW_SIZE = timedelta(days=1)
+    return WINDOW_SIZE, end_dt, start_dt, zone_tag
 
 
 @app.cell
 def _(
     CF_API_TOKEN,
     HOSTNAME,
-    Request,
+    WINDOW_SIZE,
     end_dt,
-    json,
     start_dt,
-    urlopen,
+    stream_graphql_windowed,
     zone_tag,
 ):
-    _QUERY_STR = """
+    ZONE_ANALYTICS_QUERY = """
     query GetZoneAnalytics($zoneTag: string, $since: string, $until: string) {
       viewer {
         zones(filter: {zoneTag: $zoneTag}) {
-          totals: httpRequests1hGroups(limit: 10000, filter: {datetime_geq: $since, datetime_lt: $until}) {
-            uniq {
-              uniques
-            }
-          }
           zones: httpRequests1hGroups(orderBy: [datetime_ASC], limit: 10000,
                                       filter: {datetime_geq: $since, datetime_lt: $until}) {
             dimensions {
@@ -263,19 +290,43 @@ def _(
       }
     }
     """
-    _QUERY_VARIABLES = {"zoneTag": zone_tag, "since": start_dt, "until": end_dt}
-
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_analytics = json.loads(_resp_raw)
-    return (json_analytics,)
+    # Hourly totals, and the entries of every map of the hour (kept as lists, formatted below)
+    ZONE_ANALYTICS_COLUMNS = {
+        "dimensions.timeslot": "time",
+        "sum.requests": "requests",
+        "sum.cachedRequests": "cached_requests",
+        "sum.encryptedRequests": "encrypted_requests",
+        "sum.bytes": "bytes",
+        "sum.cachedBytes": "cached_bytes",
+        "sum.encryptedBytes": "encrypted_bytes",
+        "sum.pageViews": "page_views",
+        "sum.threats": "threats",
+        "uniq.uniques": "uniques",
+        **{f"sum.{_name}": _name for _name in [
+            "responseStatusMap",
+            "countryMap",
+            "browserMap",
+            "contentTypeMap",
+            "clientSSLMap",
+            "ipClassMap",
+            "threatPathingMap",
+        ]},
+    }
+    # The interval is split into sub-intervals (aligned on hours) that are fetched concurrently,
+    # any sub-interval with too many rows is split again, and all hours are returned in order.
+    # Each response is turned into columns while it is read, rather than decoded as a whole
+    zone_hourly_groups = stream_graphql_windowed(
+        HOSTNAME,
+        CF_API_TOKEN,
+        {"query": ZONE_ANALYTICS_QUERY},
+        "zones",
+        ZONE_ANALYTICS_COLUMNS,
+        start_dt,
+        end_dt,
+        lambda since, until: {"zoneTag": zone_tag, "since": since, "until": until},
+        size=WINDOW_SIZE,
+    )
+    return ZONE_ANALYTICS_COLUMNS, ZONE_ANALYTICS_QUERY, zone_hourly_groups
 
 
 @app.cell
@@ -285,36 +336,110 @@ def _(mo):
         The query, if successful, will return a lot of data at once, including page views and requests,
         as well as some metrics such as the browser associated with the request, the response code, among others.
 
-        Here, we will focus on a single metric: requests by common response codes. The `json_analytics` object
-        will have other types of data for further analysis, but it needs to be formated to a pandas `DataFrame` first.
+        Here, we will focus on a single metric: requests by common response codes. Each of the maps in the
+        `zone_hourly_groups` DataFrame (response codes, countries, browsers, ...), which holds one row per hour,
+        is formatted into its own pandas `DataFrame` first, with one row per hour and entry, so it is also available
+        for further analysis.
         """
     )
     return
 
 
+@app.cell
+def _(map_frames, zone_hourly_groups):
+    # Format every map into a DataFrame with [time - key - values], e.g. zone_maps["countryMap"]
+    zone_maps = map_frames(zone_hourly_groups, [
+        "responseStatusMap",
+        "countryMap",
+        "browserMap",
+        "contentTypeMap",
+        "clientSSLMap",
+        "ipClassMap",
+        "threatPathingMap",
+    ])
+    return (zone_maps,)
+
+
 @app.cell
 def _(mo):
-    mo.md("""### Distribution of HTTP response codes""")
+    mo.md(
+        r"""
+        ### Breakdowns over past weeks
+
+        Every complete hour of these maps is also kept on disk (as Parquet files), by zone and hour, and rolled up
+        into days and weeks once they are complete. Breakdowns over longer windows are then read from the fewest
+        stored partitions covering them, and only the hours no previous run has stored are queried.
+        """
+    )
     return
 
 
 @app.cell
-def _(json_analytics, pd):
-    df_status_code = pd.DataFrame()
+def _(CF_ACCOUNT_ID, end_dt, rollup_store, start_dt, zone_maps, zone_tag):
+    # Store the hours fetched above, see cfkit.rollup for the layout
+    zone_rollups = rollup_store("zone_logs", CF_ACCOUNT_ID)
+    zone_rollups.add(zone_tag, zone_maps, start_dt, end_dt)
+    return (zone_rollups,)
 
-    # Format response code data into a DataFrame with [time - typename - response code - requests]
-    for j in range(len(json_analytics["data"]["viewer"]["zones"][0]["zones"])):
-        _temp_row_ts = json_analytics["data"]["viewer"]["zones"][0]["zones"][j][
-            "dimensions"
-        ]["timeslot"]
-        _temp_row = pd.DataFrame(
-            json_analytics["data"]["viewer"]["zones"][0]["zones"][j]["sum"][
-                "responseStatusMap"
-            ]
+
+@app.cell
+def _(
+    CF_API_TOKEN,
+    HOSTNAME,
+    WINDOW_SIZE,
+    ZONE_ANALYTICS_COLUMNS,
+    ZONE_ANALYTICS_QUERY,
+    closed_before,
+    format_time,
+    map_frames,
+    stream_graphql_windowed,
+    timedelta,
+    zone_maps,
+    zone_rollups,
+    zone_tag,
+):
+    # Window of the breakdowns, up to the last complete hour
+    ROLLUP_WINDOW = timedelta(weeks=4)
+    rollup_end_dt = format_time(closed_before())
+    rollup_start_dt = format_time(closed_before() - ROLLUP_WINDOW)
+
+    # Query (and store) the hours of the window not stored yet
+    for _since, _until in zone_rollups.missing(zone_tag, rollup_start_dt, rollup_end_dt):
+        _groups = stream_graphql_windowed(
+            HOSTNAME,
+            CF_API_TOKEN,
+            {"query": ZONE_ANALYTICS_QUERY},
+            "zones",
+            ZONE_ANALYTICS_COLUMNS,
+            _since,
+            _until,
+            lambda since, until: {"zoneTag": zone_tag, "since": since, "until": until},
+            size=WINDOW_SIZE,
         )
-        _temp_row["time"] = _temp_row_ts
-        df_status_code = pd.concat([df_status_code, _temp_row])
+        zone_rollups.add(zone_tag, map_frames(_groups, list(zone_maps)), _since, _until)
+    return rollup_end_dt, rollup_start_dt
 
+
+@app.cell
+def _(rollup_end_dt, rollup_start_dt, zone_maps, zone_rollups, zone_tag):
+    # Totals by key of every map over the window, e.g. zone_breakdowns["contentTypeMap"]
+    zone_breakdowns = {
+        _name: zone_rollups.breakdown(zone_tag, _name, rollup_start_dt, rollup_end_dt) for _name in zone_maps
+    }
+    zone_breakdowns["countryMap"]
+    return (zone_breakdowns,)
+
+
+@app.cell
+def _(mo):
+    mo.md("""### Distribution of HTTP response codes""")
+    return
+
+
+@app.cell
+def _(pd, zone_maps):
+    # Response code data, as a DataFrame with [time - response code - requests]
+    df_status_code = zone_maps["responseStatusMap"].copy()
     df_status_code["time"] = pd.to_datetime(
         df_status_code["time"], format="%Y-%m-%dT%H:%M:00Z"
     ).astype("datetime64[s]")
@@ -329,31 +454,14 @@ def _(json_analytics, pd):
 
 
 @app.cell
-def _(df_status_code):
+def _(df_status_code, top_n_other):
     # Select number of status codes to show in summary
     TOP_STATUS_CODES = 10
 
-    df_status_summary = (
-        df_status_code.groupby("key").agg({"requests": "sum"}).reset_index()
-    )
-
-    # Rename non-top entries into the "Other" label
-    df_status_summary.loc[
-        df_status_summary["requests"].rank(ascending=False) > TOP_STATUS_CODES, "key"
-    ] = "Other"
-
-    # The "Other" label must be aggregated
-    df_status_summary = (
-        df_status_summary.groupby("key")
-        .agg({"requests": "sum"})
-        .reset_index()
-        .sort_values("requests", ascending=False)
-        .reset_index(drop=True)
-    )
-
-    # Percentage out of all requests
-    df_status_summary["share_requests"] = (
-        df_status_summary["requests"] / df_status_summary["requests"].sum() * 100
+    # Requests per status code, with non-top entries aggregated under the "Other" label,
+    # and their percentage out of all requests
+    df_status_summary = top_n_other(
+        df_status_code, "key", "requests", TOP_STATUS_CODES, other="Other", share="share_requests"
     )
     return (df_status_summary,)
 
@@ -365,7 +473,8 @@ def _(df_status_summary):
 
 
 @app.cell
-def _(alt, df_status_summary):
+def _(alt, df_status_summary, headless, mo):
+    mo.stop(headless())
     alt.Chart(
         df_status_summary, title="Requests by HTTP status code"
     ).mark_bar().encode(
@@ -387,16 +496,14 @@ def _(alt, df_status_summary):
 def _(mo):
     mo.md(
         r"""
-        This last section of the notebook will perform a separate query that digs deeper into a specified status code.
-        Perhaps in the results above, a non 2XX was higher than expected. Which hosts were being requested? Which paths?
+        ### Response codes across every zone
 
-        To achieve this, we will extract the GraphQL query which provides these statistics in the Cloudflare dashboard
-        using the aforementioned method involving browser developer tools. We saw in the previous query that the status
-        code variable is `edgeResponseStatus`, so we will have to add a filter in the GraphQL variable dictionary:
-        `"edgeResponseStatus": {HTTP_STATUS_CODE}`
+        The same hourly groups can be obtained for every zone of the account at once, to spot zones with unusual
+        amounts of `403` or `5XX` responses. The zones are listed in a `zoneTag_in` filter, in groups small enough
+        for the hourly rows of the whole group to fit in a single response, and the groups are queried concurrently.
+        Each map is then formatted into one long `DataFrame` with a leading `zone` column.
 
-        where `{HTTP_STATUS_CODE}` represents our chosen HTTP response status code (200 for `OK`, 403 for `Forbidden`,
-        429 for `Too Many Requests`, etc).
+        Since this queries every zone of the account, it only runs once requested below (and always in headless runs).
         """
     )
     return
@@ -404,159 +511,224 @@ def _(mo):
 
 @app.cell
 def _(mo):
-    mo.md("""### HTTP status code trends""")
-    return
-
-
-@app.cell
-def _():
-    # Choose the status code as an integer
-    HTTP_STATUS_CODE = 403
-    return (HTTP_STATUS_CODE,)
+    sweep_button = mo.ui.run_button(label="Query every zone")
+    sweep_button
+    return (sweep_button,)
 
 
 @app.cell
 def _(
     CF_API_TOKEN,
     HOSTNAME,
-    HTTP_STATUS_CODE,
-    Request,
     end_dt,
-    json,
+    headless,
+    mo,
+    pd,
     start_dt,
-    urlopen,
-    zone_tag,
+    sweep_button,
+    sweep_map_frames,
+    sweep_zones,
+    zones,
 ):
+    mo.stop(not (sweep_button.value or headless()), 'Press the button above to query every zone')
+
     _QUERY_STR = """
-    query GetZoneTopNs {
+    query GetZonesAnalytics($zoneTags: [string], $limit: uint64!, $since: string, $until: string) {
       viewer {
-        scope: zones(filter: {zoneTag: $zoneTag}) {
-          total: httpRequestsAdaptiveGroups(filter: $filter, limit: 1) {
-            count
-            sum {
-              edgeResponseBytes
-              visits
-            }
-          }
-          topPaths: httpRequestsAdaptiveGroups(filter: $filter, limit: 15, orderBy: [$order]) {
-            count
-            avg {
-              sampleInterval
-            }
-            sum {
-              edgeResponseBytes
-              visits
-            }
-            dimensions {
-              metric: clientRequestPath
-            }
-          }
-          topHosts: httpRequestsAdaptiveGroups(filter: $filter, limit: 15, orderBy: [$order]) {
-            count
-            avg {
-              sampleInterval
-            }
-            sum {
-              edgeResponseBytes
-              visits
-            }
-            dimensions {
-              metric: clientRequestHTTPHost
-            }
-          }
-          topBrowsers: httpRequestsAdaptiveGroups(filter: $filter, limit: 15, orderBy: [$order]) {
-            count
-            avg {
-              sampleInterval
-            }
-            sum {
-              edgeResponseBytes
-              visits
-            }
-            dimensions {
-              metric: userAgentBrowser
-            }
-          }
-          topEdgeStatusCodes: httpRequestsAdaptiveGroups(filter: $filter, limit: 15, orderBy: [$order]) {
-            count
-            avg {
-              sampleInterval
-            }
-            sum {
-              edgeResponseBytes
-              visits
-            }
-            dimensions {
-              metric: edgeResponseStatus
-            }
-          }
-          countries: httpRequestsAdaptiveGroups(filter: $filter, limit: 200, orderBy: [$order]) {
-            count
-            avg {
-              sampleInterval
-            }
-            sum {
-              edgeResponseBytes
-              visits
-            }
+        zones(filter: {zoneTag_in: $zoneTags}) {
+          zoneTag
+          hours: httpRequests1hGroups(orderBy: [datetime_ASC], limit: $limit,
+                                      filter: {datetime_geq: $since, datetime_lt: $until}) {
             dimensions {
-              metric: clientCountryName
-            }
-          }
-          topUserAgents: httpRequestsAdaptiveGroups(filter: $filter, limit: 15, orderBy: [$order]) {
-            count
-            avg {
-              sampleInterval
+              timeslot: datetime
             }
             sum {
-              edgeResponseBytes
-              visits
-            }
-            dimensions {
-              metric: userAgent
+              contentTypeMap {
+                bytes
+                requests
+                key: edgeResponseContentTypeName
+              }
+              countryMap {
+                bytes
+                requests
+                threats
+                key: clientCountryName
+              }
+              responseStatusMap {
+                requests
+                key: edgeResponseStatus
+              }
             }
           }
         }
       }
     }
     """
-    _QUERY_VARIABLES = {
-        "zoneTag": zone_tag,
-        "filter": {
-            "AND": [
-                {"datetime_geq": start_dt, "datetime_leq": end_dt},
-                {"requestSource": "eyeball"},
-                {"edgeResponseStatus": HTTP_STATUS_CODE},
-            ]
-        },
-        "order": "count_DESC",
-    }
+    # Hourly rows returned for each zone, which sets how many zones are queried together (the limit of the
+    # selection applies to each zone on its own, and must stay above it)
+    _hours = (pd.Timestamp(end_dt) - pd.Timestamp(start_dt)) // pd.Timedelta(hours=1) + 1
+
+    _rows_by_zone = sweep_zones(
+        HOSTNAME,
+        CF_API_TOKEN,
+        _QUERY_STR,
+        "hours",
+        [zone["id"] for zone in zones.zones],
+        {"since": start_dt, "until": end_dt},
+        rows_per_zone=_hours,
+    )
+    # Every map as a DataFrame with [zone - time - key - values], e.g. zone_sweep["countryMap"]
+    zone_sweep = sweep_map_frames(_rows_by_zone, ["responseStatusMap", "countryMap", "contentTypeMap"])
+    return (zone_sweep,)
+
+
+@app.cell
+def _(zone_sweep, zones):
+    # Requests per zone over the interval, with those answered with a 403 or a 5XX response
+    # (the columns are set explicitly, since an account without any traffic returns no map entries)
+    _status = zone_sweep["responseStatusMap"].reindex(columns=["zone", "time", "key", "requests"])
+    _status["key"] = _status["key"].astype(int)
+    _status["forbidden"] = _status["requests"].where(_status["key"] == 403, 0)
+    _status["server_errors"] = _status["requests"].where(_status["key"] >= 500, 0)
+
+    df_zone_errors = (
+        _status.groupby("zone")
+        .agg({"requests": "sum", "forbidden": "sum", "server_errors": "sum"})
+        .reset_index()
+    )
+    df_zone_errors.insert(1, "name", [zones.by_id(zone)["name"] for zone in df_zone_errors["zone"]])
+    df_zone_errors["share_forbidden"] = (100 * df_zone_errors["forbidden"] / df_zone_errors["requests"]).round(2)
+    df_zone_errors["share_server_errors"] = (
+        100 * df_zone_errors["server_errors"] / df_zone_errors["requests"]
+    ).round(2)
+    df_zone_errors = df_zone_errors.sort_values(
+        ["share_server_errors", "share_forbidden"], ascending=False, ignore_index=True
+    )
+    df_zone_errors
+    return (df_zone_errors,)
+
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
+@app.cell
+def _(mo):
+    mo.md(
+        r"""
+        This last section of the notebook will perform a separate query that digs deeper into specific status codes.
+        Perhaps in the results above, a non 2XX was higher than expected. Which hosts were being requested? Which paths?
+
+        To achieve this, we will extract the GraphQL query which provides these statistics in the Cloudflare dashboard
+        using the aforementioned method involving browser developer tools. We saw in the previous query that the status
+        code variable is `edgeResponseStatus`, so we will have to add a filter to each selection:
+        `"edgeResponseStatus": {HTTP_STATUS_CODE}`
+
+        where `{HTTP_STATUS_CODE}` represents an HTTP response status code (200 for `OK`, 403 for `Forbidden`,
+        429 for `Too Many Requests`, etc). The selections of every code are aliased and sent together, in as few
+        queries as the API accepts.
+        """
+    )
+    return
 
-    json_dict_filtered = json.loads(_resp_raw)
-    return (json_dict_filtered,)
+
+@app.cell
+def _(mo):
+    mo.md("""### HTTP status code trends""")
+    return
 
 
 @app.cell
-def _(pd):
-    # Obtain top n of a given request attribute in a pandas DataFrame
-    # Attribute and counts will be in the "entry" and "count" values, respectively
-    def top_n_from_json(json_dict, attribute):
-        _all_rows = []
-        for el in json_dict["data"]["viewer"]["scope"][0][attribute]:
-            _temp_row = {"entry": el["dimensions"]["metric"], "count": el["count"]}
-            _all_rows.append(_temp_row)
-        return pd.DataFrame(_all_rows)
+def _(df_status_summary):
+    # Error codes (4XX and 5XX) above this share of requests (in %) are looked into
+    STATUS_SHARE_THRESHOLD = 1.0
+
+    # Or choose the status codes as integers, e.g. [403, 429, 502, 503]
+    HTTP_STATUS_CODES = sorted(
+        int(_key)
+        for _key, _share in zip(df_status_summary["key"], df_status_summary["share_requests"])
+        if _key.isdigit() and int(_key) >= 400 and _share >= STATUS_SHARE_THRESHOLD
+    )
+    HTTP_STATUS_CODES
+    return (HTTP_STATUS_CODES,)
 
-    return (top_n_from_json,)
+
+@app.cell
+def _(
+    CF_API_TOKEN,
+    HOSTNAME,
+    HTTP_STATUS_CODES,
+    QueryPlan,
+    Selection,
+    end_dt,
+    fetch_graphql_many,
+    pd,
+    rows_frame,
+    sample_bounds,
+    selection_rows,
+    start_dt,
+    zone_tag,
+):
+    # Request attributes to rank for each status code, with the number of entries kept
+    _TOP_N_ATTRIBUTES = {
+        "topPaths": ("clientRequestPath", 15),
+        "topHosts": ("clientRequestHTTPHost", 15),
+        "topBrowsers": ("userAgentBrowser", 15),
+        "topEdgeStatusCodes": ("edgeResponseStatus", 15),
+        "countries": ("clientCountryName", 200),
+        "topUserAgents": ("userAgent", 15),
+    }
+
+    def _selections(status_code):
+        _filter = {
+            "AND": [
+                {"datetime_geq": start_dt, "datetime_leq": end_dt},
+                {"requestSource": "eyeball"},
+                {"edgeResponseStatus": status_code},
+            ]
+        }
+        _fields = {"count": None, "avg": ["sampleInterval"], "sum": ["edgeResponseBytes", "visits"]}
+        return [
+            Selection(_attribute, "httpRequestsAdaptiveGroups", _filter,
+                      {**_fields, "dimensions": [_dimension]}, order_by=["count_DESC"], limit=_limit)
+            for _attribute, (_dimension, _limit) in _TOP_N_ATTRIBUTES.items()
+        ]
+
+    # One query per status code, packed into as few documents as fit the complexity limit, sent concurrently
+    _plan = QueryPlan(
+        "zones",
+        {"zoneTag": zone_tag},
+        {f"status{_code}": _selections(_code) for _code in HTTP_STATUS_CODES},
+        merge=False,
+    )
+    _responses = {}
+    for _plan_responses in fetch_graphql_many(HOSTNAME, CF_API_TOKEN, _plan.split()):
+        _responses.update(_plan_responses)
+
+    # Top n of each request attribute per status code, with the attribute and counts in the "entry" and "count"
+    # columns, e.g. top_n_by_code[403]["topPaths"]
+    # Counts are estimated from sampled requests: "count_low" and "count_high" bound each of them (see cfkit.sampling),
+    # and entries with overlapping bounds may be ranked in either order
+    top_n_by_code = {
+        _code: {
+            _attribute: sample_bounds(
+                rows_frame(
+                    selection_rows(_responses[f"status{_code}"], _attribute),
+                    {f"dimensions.{_dimension}": "entry", "count": "count", "avg.sampleInterval": "sample_interval"},
+                ),
+                "count",
+            )
+            for _attribute, (_dimension, _limit) in _TOP_N_ATTRIBUTES.items()
+        }
+        for _code in HTTP_STATUS_CODES
+    }
+    # The same frames, with those of every status code one after the other and a "status" column
+    _columns = ["entry", "count", "count_low", "count_high", "count_sampled", "sample_interval"]
+    top_n_filtered = {
+        _attribute: pd.concat(
+            [_frames[_attribute].assign(status=_code) for _code, _frames in top_n_by_code.items()]
+            or [pd.DataFrame(columns=["status"] + _columns)],
+            ignore_index=True,
+        )[["status"] + _columns]
+        for _attribute in _TOP_N_ATTRIBUTES
+    }
+    return top_n_by_code, top_n_filtered
 
 
 @app.cell
@@ -577,8 +749,8 @@ def _(mo):
 
 
 @app.cell
-def _(json_dict_filtered, top_n_from_json):
-    top_n_from_json(json_dict_filtered, "countries")
+def _(top_n_filtered):
+    top_n_filtered["countries"]
     return
 
 
@@ -589,8 +761,8 @@ def _(mo):
 
 
 @app.cell
-def _(json_dict_filtered, top_n_from_json):
-    top_n_from_json(json_dict_filtered, "topHosts")
+def _(top_n_filtered):
+    top_n_filtered["topHosts"]
     return
 
 
@@ -601,8 +773,8 @@ def _(mo):
 
 
 @app.cell
-def _(json_dict_filtered, top_n_from_json):
-    top_n_from_json(json_dict_filtered, "topPaths")
+def _(top_n_filtered):
+    top_n_filtered["topPaths"]
     return
 
 
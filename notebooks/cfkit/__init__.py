@@ -0,0 +1,5 @@
+"""Shared helpers for the Cloudflare example notebooks.
+
+The notebooks import these modules directly (e.g. ``from cfkit.http import urlopen``) from the
+helper stub cell, so every notebook talks to the Cloudflare API the same way.
+"""
@@ -0,0 +1,92 @@
+"""Aggregations shared by the notebooks, run with polars or pandas.
+
+With the polars backend (the default), each aggregation runs as a single lazy query, which polars
+optimizes and spreads over every core, and the result is converted to pandas only at the end, since
+that is what Altair and the notebook tables expect. Set the CFKIT_BACKEND environment variable to
+``pandas`` (or pass ``backend="pandas"``) to run the same aggregations in pandas.
+"""
+
+import os
+
+import polars as pl
+
+from cfkit.frames import pandas_to_polars, polars_to_pandas
+
+
+BACKEND = os.environ.get("CFKIT_BACKEND", "polars")
+
+_POLARS_AGGS = {
+    "sum": lambda column: pl.col(column).sum(),
+    "mean": lambda column: pl.col(column).mean(),
+    "max": lambda column: pl.col(column).max(),
+    "min": lambda column: pl.col(column).min(),
+}
+
+
+def _lazy(frame):
+    return frame.lazy() if isinstance(frame, pl.DataFrame) else pandas_to_polars(frame).lazy()
+
+
+def group_totals(frame, by, aggs, sort_by=None, descending=True, backend=None):
+    """Aggregate ``frame`` by the ``by`` column(s), e.g. ``aggs={"requests": "sum", "cpu": "mean"}``."""
+
+    by = [by] if isinstance(by, str) else list(by)
+
+    if (backend or BACKEND) == "pandas":
+        result = frame.groupby(by).agg(aggs).reset_index()
+        if sort_by is not None:
+            result = result.sort_values(sort_by, ascending=not descending).reset_index(drop=True)
+        return result
+
+    query = _lazy(frame).group_by(by).agg([_POLARS_AGGS[agg](column) for column, agg in aggs.items()])
+    query = query.sort(sort_by or by, descending=descending if sort_by else False)
+    return polars_to_pandas(query.collect())
+
+
+def top_n_other(frame, key, value, n, other="Other", share=None, backend=None):
+    """Sum ``value`` per ``key``, keeping the top ``n`` keys and grouping the rest under ``other``.
+
+    Rows are sorted by ``value`` (descending). ``share`` names an optional column holding each
+    key's percentage of the total.
+    """
+
+    if (backend or BACKEND) == "pandas":
+        result = frame.groupby(key).agg({value: "sum"}).reset_index()
+        result = result.sort_values(value, ascending=False, kind="stable")
+        result.loc[~result[key].isin(result.head(n)[key]), key] = other
+        result = (
+            result.groupby(key).agg({value: "sum"}).reset_index()
+            .sort_values(value, ascending=False).reset_index(drop=True)
+        )
+        if share is not None:
+            result[share] = result[value] / result[value].sum() * 100
+        return result
+
+    query = (
+        _lazy(frame)
+        .group_by(key).agg(pl.col(value).sum())
+        .with_columns(
+            pl.when(pl.col(value).rank("ordinal", descending=True) <= n)
+            .then(pl.col(key).cast(pl.String))
+            .otherwise(pl.lit(other))
+            .alias(key)
+        )
+        .group_by(key).agg(pl.col(value).sum())
+        .sort(value, descending=True)
+    )
+    if share is not None:
+        query = query.with_columns((pl.col(value) / pl.col(value).sum() * 100).alias(share))
+    return polars_to_pandas(query.collect())
+
+
+def with_share(frame, value, share, over=None, backend=None):
+    """Add a ``share`` column with each row's percentage of the ``value`` total (per ``over`` group)."""
+
+    if (backend or BACKEND) == "pandas":
+        frame = frame.copy()
+        total = frame[value].sum() if over is None else frame.groupby(over)[value].transform("sum")
+        frame[share] = frame[value] / total * 100
+        return frame
+
+    total = pl.col(value).sum() if over is None else pl.col(value).sum().over(over)
+    return polars_to_pandas(_lazy(frame).with_columns((pl.col(value) / total * 100).alias(share)).collect())
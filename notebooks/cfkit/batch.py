@@ -0,0 +1,182 @@
+"""Run a notebook headlessly, for many accounts at once.
+
+The notebooks are written for a single account, picked in the UI after logging in.
+:func:`run_accounts` instead runs a notebook as a script once per account, in a pool of worker
+processes, passing the API token and the account through the environment: the login stubs pick them
+up with the hooks of :mod:`cfkit.headless` rather than waiting for the OAuth flow and the account
+radio button. Those runs are headless: cells that only present results (charts) stop early with
+``mo.stop(headless())``, so the time goes into the queries and aggregations. The
+DataFrames defined by each run are then concatenated into one frame per name, tagged with the
+account they belong to, and can be written to Parquet or Arrow IPC files with :func:`write_frames`.
+
+Each account runs in its own process, whose shared HTTP client is limited to ``rate_limit`` requests
+per second, so that a large account cannot use up the API rate limit for the others. The processes
+also split the API limits of each endpoint class (see :mod:`cfkit.throttle`) evenly between them::
+
+    cd notebooks && CLOUDFLARE_API_TOKEN=... python -m cfkit.batch storage_kv.py df_kv --output out/
+
+(``cfkit`` is imported from the ``notebooks`` directory, hence running from there.)
+"""
+
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cfkit.frames import pandas_to_polars
+from cfkit.headless import ACCOUNT_ENV, BATCH_ENV, TOKEN_ENV
+from cfkit.rest import list_all
+
+
+ACCOUNTS_URL = "https://api.cloudflare.com/client/v4/accounts"
+
+# Notebooks run at the same time, one account each
+MAX_PROCESSES = 4
+# Requests per second allowed for each account
+ACCOUNT_RATE_LIMIT = 4
+# File extension of each output format
+FORMATS = {"parquet": "parquet", "ipc": "arrow"}
+
+
+def list_accounts(token):
+    """Every account the token has access to, as returned by the API (``id``, ``name``, ...)."""
+
+    return list_all(ACCOUNTS_URL, token)
+
+
+_apps = {}
+
+
+def _load_app(path):
+    """Marimo app of a notebook file, imported once per process."""
+
+    path = os.path.abspath(path)
+    if path not in _apps:
+        # Notebooks import cfkit from their own directory
+        if os.path.dirname(path) not in sys.path:
+            sys.path.insert(0, os.path.dirname(path))
+        spec = importlib.util.spec_from_file_location(f"_cfkit_notebook_{len(_apps)}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _apps[path] = module.app
+    return _apps[path]
+
+
+def run_notebook(path, names=None):
+    """Run a notebook as a script, returning the DataFrames it defines (only ``names`` if given)."""
+
+    _, defs = _load_app(path).run()
+    return {
+        name: value for name, value in defs.items()
+        if isinstance(value, pd.DataFrame) and (names is None or name in names)
+    }
+
+
+def _run_account(path, account_id, token, names, rate_limit, share):
+    os.environ.update({
+        BATCH_ENV: "1",
+        TOKEN_ENV: token,
+        ACCOUNT_ENV: account_id,
+        "CFKIT_RATE_LIMIT": str(rate_limit),
+        "CFKIT_RATE_SHARE": str(share),
+    })
+    return run_notebook(path, names)
+
+
+def _tagged(frame, account):
+    frame = frame.copy()
+    frame.insert(0, "account_name", account.get("name", account["id"]))
+    frame.insert(0, "account_id", account["id"])
+    return frame
+
+
+def run_accounts(path, token, accounts=None, names=None, max_processes=MAX_PROCESSES,
+                 rate_limit=ACCOUNT_RATE_LIMIT):
+    """Run a notebook for every account (by default, all those the token has access to).
+
+    Returns the combined DataFrames by name, starting with ``account_id`` and ``account_name``
+    columns, and the error of every account whose run failed (by account id).
+    """
+
+    accounts = list_accounts(token) if accounts is None else list(accounts)
+    if not accounts:
+        return {}, {}
+
+    # Spawned rather than forked, so that no process inherits the connections of another
+    context = multiprocessing.get_context("spawn")
+    processes = min(max_processes, len(accounts))
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = [
+            executor.submit(_run_account, path, account["id"], token, names, rate_limit, 1 / processes)
+            for account in accounts
+        ]
+
+        parts, failures = {}, {}
+        for account, future in zip(accounts, futures):
+            try:
+                frames = future.result()
+            except Exception as e:
+                failures[account["id"]] = e
+                continue
+            for name, frame in frames.items():
+                parts.setdefault(name, []).append(_tagged(frame, account))
+
+    return {name: pd.concat(frames, ignore_index=True) for name, frames in parts.items()}, failures
+
+
+def write_frames(frames, directory, format="parquet"):
+    """Write each DataFrame to ``directory/<name>.parquet`` (or ``.arrow`` for Arrow IPC).
+
+    Returns the paths written, by name.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, frame in frames.items():
+        path = os.path.join(directory, f"{name}.{FORMATS[format]}")
+        data = pandas_to_polars(frame)
+        if format == "ipc":
+            data.write_ipc(path)
+        else:
+            data.write_parquet(path)
+        paths[name] = path
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a notebook for every account of an API token.")
+    parser.add_argument("notebook", help="path of the notebook to run")
+    parser.add_argument("frames", nargs="*", help="DataFrames to keep (all of them by default)")
+    parser.add_argument("--account", action="append", help="only run for this account id (repeatable)")
+    parser.add_argument("--processes", type=int, default=MAX_PROCESSES, help="notebooks run at the same time")
+    parser.add_argument("--rate-limit", type=float, default=ACCOUNT_RATE_LIMIT,
+                        help="requests per second allowed for each account")
+    parser.add_argument("--output", help="directory to write the DataFrames to")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet", help="format of the written files")
+    args = parser.parse_args(argv)
+
+    token = os.environ.get(TOKEN_ENV)
+    if not token:
+        parser.error(f"set {TOKEN_ENV} to an API token")
+
+    accounts = list_accounts(token)
+    if args.account:
+        accounts = [account for account in accounts if account["id"] in args.account]
+
+    frames, failures = run_accounts(args.notebook, token, accounts, args.frames or None, args.processes,
+                                    args.rate_limit)
+    for account_id, error in failures.items():
+        print(f"{account_id}: {error!r}", file=sys.stderr)
+    paths = write_frames(frames, args.output, args.format) if args.output else {}
+    for name, frame in frames.items():
+        print(f"{name}: {len(frame)} rows, {frame['account_id'].nunique()} accounts", paths.get(name, ""))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
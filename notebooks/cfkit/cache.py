@@ -0,0 +1,201 @@
+"""On-disk cache of GraphQL Analytics API responses.
+
+Responses are stored compressed under a key hashing the endpoint, the query, its variables and the
+account (or zone) it is scoped to, so re-running a notebook does not fetch the same data twice.
+
+Only queries whose time range is over are cached: the latest upper bound of their time filters
+(``datetime_lt``, ``datetimeHour_leq``, ``date_leq``, ...) must fall before the current hour, minus
+a few minutes for late data to settle. Those closed hours can no longer change and are kept
+forever, while anything touching the current hour (or with no upper bound) is always fetched.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+
+# Where responses are stored, unless overridden by the CFKIT_CACHE_DIR environment variable
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "cfkit", "graphql")
+# Where data kept across runs (hourly series, lookups) is stored, unless overridden by CFKIT_DATA_DIR
+DATA_DIR = os.environ.get("CFKIT_DATA_DIR", os.path.join(os.path.expanduser("~"), ".cache", "cfkit", "data"))
+# Time allowed for late data to be ingested before an hour is considered closed
+SETTLE_TIME = timedelta(minutes=10)
+
+_UPPER_BOUND_KEY = re.compile(r"^date\w*_(lt|leq)$")
+_UPPER_BOUND_ARG = re.compile(r"\b(date\w*)_(lt|leq)\s*:\s*(?:\"([^\"]+)\"|\$(\w+))")
+
+
+class ResponseCache:
+    """Content-addressed store of compressed GraphQL responses, one file per query."""
+
+    def __init__(self, directory=CACHE_DIR, settle_time=SETTLE_TIME):
+        self.directory = directory
+        self.settle_time = settle_time
+
+    def key(self, url, data, now=None):
+        """Cache key of a request, or None if its response may still change."""
+
+        if not url.rstrip("/").endswith("/graphql") or data is None:
+            return None
+
+        try:
+            document = json.loads(data)
+        except ValueError:
+            return None
+
+        query = document.get("query") or ""
+        variables = document.get("variables") or {}
+        end = _time_range_end(query, variables)
+        if end is None or end > closed_before(now, self.settle_time):
+            return None
+
+        account = variables.get("accountTag") or variables.get("zoneTag")
+        content = json.dumps({"url": url, "query": " ".join(query.split()), "variables": variables,
+                              "account": account}, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def get(self, key):
+        """Cached response body, or None on a miss."""
+
+        try:
+            with gzip.open(self._path(key), "rb") as f:
+                return f.read()
+        except (OSError, EOFError):
+            return None
+
+    def put(self, key, body):
+        """Store a response body, unless it reports errors (which may be transient)."""
+
+        try:
+            if json.loads(body).get("errors"):
+                return
+        except (ValueError, AttributeError):
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first, so concurrent readers never see a partial response
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(body))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def writer(self, key):
+        """Store a response body as it is read, see :class:`CacheWriter`."""
+
+        return CacheWriter(self._path(key))
+
+    def clear(self):
+        """Remove every cached response."""
+
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    os.remove(os.path.join(root, name))
+
+
+class CacheWriter:
+    """Compressed cache file written chunk by chunk, for responses that are never held in full.
+
+    The file only becomes visible on :meth:`commit`, once the whole response was read and found to
+    hold no errors, and is removed on :meth:`discard` otherwise.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        self._raw = os.fdopen(fd, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb")
+
+    def write(self, chunk):
+        self._file.write(chunk)
+
+    def _close(self):
+        self._file.close()
+        self._raw.close()
+
+    def commit(self):
+        self._close()
+        try:
+            os.replace(self._tmp_path, self.path)
+        except OSError:
+            self.discard()
+
+    def discard(self):
+        self._close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def closed_before(now=None, settle_time=SETTLE_TIME):
+    """Start of the current hour: data before it is final (as a naive UTC datetime)."""
+
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    return (now - settle_time).replace(minute=0, second=0, microsecond=0)
+
+
+def _time_range_end(query, variables):
+    """Latest upper bound of the time filters of a query, or None if it has none."""
+
+    bounds = []
+    for _, op, literal, variable in _UPPER_BOUND_ARG.findall(query):
+        value = literal or variables.get(variable)
+        if isinstance(value, str):
+            bounds.append((op, value))
+
+    def walk(value):
+        if isinstance(value, dict):
+            for name, item in value.items():
+                match = _UPPER_BOUND_KEY.match(name)
+                if match and isinstance(item, str):
+                    bounds.append((match.group(1), item))
+                else:
+                    walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+
+    walk(variables)
+
+    ends = []
+    for op, value in bounds:
+        end = _parse_bound(value)
+        if end is None:
+            # A bound we cannot read could be anything, so the response is not cached
+            return None
+        # A date bound includes the whole day when inclusive
+        if op == "leq" and len(value) == 10:
+            end += timedelta(days=1)
+        ends.append(end)
+
+    return max(ends) if ends else None
+
+
+def _parse_bound(value):
+    for fmt in ("%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%MZ", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def default_cache():
+    """Cache used by the shared client, disabled when CFKIT_CACHE is set to 0."""
+
+    if os.environ.get("CFKIT_CACHE", "1").lower() in ("0", "false", "off", "no"):
+        return None
+    return ResponseCache(os.environ.get("CFKIT_CACHE_DIR", CACHE_DIR))
@@ -0,0 +1,25 @@
+"""Run independent API calls concurrently.
+
+Threads are a good fit here since the work is dominated by waiting on the network. Pyodide (WASM)
+cannot start threads, so the calls run one after another there.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from cfkit.http import IS_WASM
+
+
+# Concurrent calls allowed by default, kept below the pooled client's connections per host
+MAX_WORKERS = 8
+
+
+def parallel_map(fn, items, max_workers=MAX_WORKERS):
+    """Apply ``fn`` to every item concurrently, returning the results in the same order."""
+
+    items = list(items)
+
+    if IS_WASM or max_workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(fn, items))
@@ -0,0 +1,115 @@
+"""Build DataFrames from GraphQL rows, one column at a time.
+
+Rather than building a dict per row and handing the list to pandas, every column is read from the
+rows in a single pass and the DataFrame is built from those arrays. Columns are described as a
+mapping from a dotted path in each row to the column name, e.g.::
+
+    {"dimensions.bucketName": "bucket", "max.objectCount": "objects"}
+"""
+
+import pandas as pd
+import polars as pl
+
+
+def response_rows(response, path):
+    """Rows found at a dotted ``path`` of a response, e.g. ``data.viewer.accounts.0.standard``."""
+
+    value = response
+    for key in path.split("."):
+        if value is None:
+            return []
+        value = value[int(key)] if isinstance(value, list) else value[key]
+    return value or []
+
+
+def column_values(rows, path):
+    """Values found at a dotted ``path`` of every row, as a list."""
+
+    keys = path.split(".")
+    if len(keys) == 1:
+        return [row[keys[0]] for row in rows]
+    if len(keys) == 2:
+        group, field = keys
+        return [row[group][field] for row in rows]
+
+    values = rows
+    for key in keys:
+        values = [value[key] for value in values]
+    return values
+
+
+def rows_frame(rows, columns, **constants):
+    """DataFrame with a column per ``path -> name`` of ``columns``, plus constant columns."""
+
+    rows = rows if isinstance(rows, list) else list(rows)
+    data = {name: column_values(rows, path) for path, name in columns.items()}
+    for name, value in constants.items():
+        data[name] = [value] * len(rows)
+
+    return pd.DataFrame(data, columns=list(data))
+
+
+def json_frame(response, path, columns, **constants):
+    """DataFrame from the rows at a dotted ``path`` of a response, see :func:`rows_frame`."""
+
+    return rows_frame(response_rows(response, path), columns, **constants)
+
+
+def map_frames(groups, maps, time_path="dimensions.timeslot", group="sum"):
+    """One long DataFrame per map of time groups (e.g. ``sum.responseStatusMap``), in a single pass.
+
+    Each map entry becomes a row holding its fields (``key``, ``requests``, ...) along with the
+    ``time`` of its group. ``groups`` can also be a DataFrame with a ``time`` column and a column per
+    map, as streamed by :func:`cfkit.graphql.stream_graphql_windowed`.
+    """
+
+    entries = {name: [] for name in maps}
+    times = {name: [] for name in maps}
+
+    if isinstance(groups, pd.DataFrame):
+        empty = [None] * len(groups)
+        hours = zip(groups["time"], *(groups[name] if name in groups else empty for name in maps))
+    else:
+        hours = ((column_values([row], time_path)[0], *(row[group].get(name) for name in maps)) for row in groups)
+
+    for time, *values in hours:
+        for name, map_entries in zip(maps, values):
+            map_entries = map_entries or []
+            entries[name] += map_entries
+            times[name] += [time] * len(map_entries)
+
+    frames = {}
+    for name in maps:
+        # Every entry of a map has the same fields, as selected in the query
+        fields = list(entries[name][0]) if entries[name] else []
+        data = {"time": times[name]}
+        data.update({field: [entry.get(field) for entry in entries[name]] for field in fields})
+        frames[name] = pd.DataFrame(data, columns=list(data))
+    return frames
+
+
+def polars_to_pandas(frame):
+    """Convert a polars DataFrame column by column, without requiring pyarrow."""
+
+    return pd.DataFrame(frame.to_dict(as_series=False), columns=frame.columns)
+
+
+def pandas_to_polars(frame):
+    """Convert a pandas DataFrame column by column, without requiring pyarrow (unlike ``pl.from_pandas``)."""
+
+    columns = []
+    for name, column in frame.items():
+        if isinstance(column.dtype, pd.DatetimeTZDtype):
+            values = column.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy().astype("datetime64[us]")
+            columns.append(pl.Series(str(name), values).dt.replace_time_zone("UTC"))
+        elif pd.api.types.is_datetime64_dtype(column.dtype):
+            # polars has no second resolution, e.g. for columns cast to datetime64[s]
+            columns.append(pl.Series(str(name), column.to_numpy().astype("datetime64[us]")))
+        elif pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_extension_array_dtype(column.dtype):
+            columns.append(pl.Series(str(name), column.to_numpy()))
+        else:
+            # Strings and other objects, possibly holding None (or NaN, as pandas marks missing values)
+            values = [None if value is pd.NA or (isinstance(value, float) and value != value) else value
+                      for value in column.tolist()]
+            columns.append(pl.Series(str(name), values, strict=False))
+    return pl.DataFrame(columns)
@@ -0,0 +1,121 @@
+"""Helpers to send queries to the Cloudflare GraphQL Analytics API.
+
+A query document is the JSON body sent to the endpoint: ``{"query": ..., "variables": ...}``.
+A :class:`~cfkit.planner.QueryPlan` can be used wherever a document is expected, in which case
+the result is its response split per query.
+"""
+
+import json
+from datetime import timedelta
+from urllib.request import Request
+
+import pandas as pd
+
+from cfkit.concurrency import MAX_WORKERS, parallel_map
+from cfkit.http import urlopen
+from cfkit.pagination import PAGE_SIZE, iter_frame_pages, iter_pages, selection_rows
+from cfkit.planner import QueryPlan
+from cfkit.stream import stream_frames
+from cfkit.windows import fetch_windowed
+
+
+def graphql_request(hostname, token, document):
+    """Build the POST request for a query document."""
+
+    return Request(f"{hostname}/client/v4/graphql",
+                   headers={"Authorization": f"Bearer {token}",
+                            "Accept": "application/json",
+                            "Content-Type": "application/json"},
+                   data=json.dumps(document).encode(),
+                   method='POST')
+
+
+def fetch_graphql(hostname, token, document):
+    """Send a query document (or plan) and return the decoded JSON response."""
+
+    if isinstance(document, QueryPlan):
+        return document.fetch(lambda plan_document: fetch_graphql(hostname, token, plan_document))
+
+    return json.loads(urlopen(graphql_request(hostname, token, document)).read())
+
+
+def stream_graphql(hostname, token, document, selections, **constants):
+    """Send a query document and build a DataFrame per selection while its response is read.
+
+    ``selections`` maps aliases to their ``path -> name`` columns, see :func:`cfkit.stream.stream_frames`.
+    """
+
+    # The response is only cached once it was read in full without errors
+    with urlopen(graphql_request(hostname, token, document), stream=True) as response:
+        return stream_frames(response, selections, **constants)
+
+
+def fetch_graphql_many(hostname, token, documents, max_workers=MAX_WORKERS):
+    """Send independent query documents concurrently, returning the responses in the same order."""
+
+    return parallel_map(lambda document: fetch_graphql(hostname, token, document), documents, max_workers)
+
+
+def paginate_graphql(hostname, token, document, alias, cursor, filter_variable="filter", page_size=PAGE_SIZE,
+                     first_response=None):
+    """Yield every row of the ``alias`` selection of a query document, one page at a time.
+
+    See :func:`cfkit.pagination.iter_pages` for how the ``cursor`` dimensions are walked.
+    """
+
+    return iter_pages(lambda page_document: fetch_graphql(hostname, token, page_document), document, alias,
+                      cursor, filter_variable, page_size, first_response)
+
+
+def stream_graphql_pages(hostname, token, document, alias, columns, cursor, filter_variable="filter",
+                         page_size=PAGE_SIZE, **constants):
+    """Yield the ``alias`` selection of a query document as a DataFrame per page, built while each page is read.
+
+    ``columns`` are given like for :func:`stream_graphql`, and must include the ``cursor`` dimensions
+    (as ``dimensions.<name>``), which are walked like :func:`cfkit.pagination.iter_pages` does.
+    """
+
+    cursor = [cursor] if isinstance(cursor, str) else list(cursor)
+    missing = [name for name in cursor if f"dimensions.{name}" not in columns]
+    if missing:
+        raise ValueError(f"The cursor dimensions {missing} must be among the columns")
+
+    def fetch_frame(page_document):
+        return stream_graphql(hostname, token, page_document, {alias: columns}, **constants)[alias]
+
+    return iter_frame_pages(fetch_frame, document, {name: columns[f"dimensions.{name}"] for name in cursor},
+                            filter_variable, page_size)
+
+
+def fetch_graphql_windowed(hostname, token, document, alias, start, end, variables, size,
+                           grain=timedelta(hours=1), limit=PAGE_SIZE, max_workers=MAX_WORKERS):
+    """Fetch the rows of the ``alias`` selection between ``start`` and ``end`` in sub-windows.
+
+    ``variables(start, end)`` returns the query variables for a sub-window. See
+    :func:`cfkit.windows.fetch_windowed` for how the window is split.
+    """
+
+    def fetch_rows(window_start, window_end):
+        window_document = {**document, "variables": variables(window_start, window_end)}
+        return selection_rows(fetch_graphql(hostname, token, window_document), alias)
+
+    return fetch_windowed(fetch_rows, start, end, size, grain, limit, max_workers)
+
+
+def stream_graphql_windowed(hostname, token, document, alias, columns, start, end, variables, size,
+                            grain=timedelta(hours=1), limit=PAGE_SIZE, max_workers=MAX_WORKERS, **constants):
+    """Like :func:`fetch_graphql_windowed`, as a DataFrame whose sub-windows are built while they are read.
+
+    ``columns`` are given like for :func:`stream_graphql`.
+    """
+
+    def fetch_frame(window_start, window_end):
+        window_document = {**document, "variables": variables(window_start, window_end)}
+        return stream_graphql(hostname, token, window_document, {alias: columns}, **constants)[alias]
+
+    def join(frames):
+        if not frames:
+            return pd.DataFrame(columns=[*columns.values(), *constants])
+        return pd.concat(frames, ignore_index=True)
+
+    return fetch_windowed(fetch_frame, start, end, size, grain, limit, max_workers, join)
@@ -0,0 +1,42 @@
+"""Hooks letting the notebooks run headlessly, set up by :mod:`cfkit.batch`.
+
+They only read the environment, so the helper stub of every notebook can import them without
+pulling in the batch runner itself (process pools, polars), which only headless runs need.
+"""
+
+import os
+
+
+# Set for the notebooks run by cfkit.batch, which then skip the interactive login
+BATCH_ENV = "CFKIT_BATCH"
+TOKEN_ENV = "CLOUDFLARE_API_TOKEN"
+ACCOUNT_ENV = "CLOUDFLARE_ACCOUNT_ID"
+
+
+class BatchLogin:
+    """Stands in for the ``PKCEFlow`` login widget, with a token taken from the environment."""
+
+    def __init__(self, access_token):
+        self.access_token = access_token
+
+
+def batch_login():
+    """Login for a headless run, or None when running interactively."""
+
+    if not os.environ.get(BATCH_ENV):
+        return None
+    return BatchLogin(os.environ.get(TOKEN_ENV))
+
+
+def batch_account_id():
+    """Account of a headless run, or None when running interactively."""
+
+    if not os.environ.get(BATCH_ENV):
+        return None
+    return os.environ.get(ACCOUNT_ENV)
+
+
+def headless():
+    """Whether the notebook is run headlessly, in which case presentation cells are skipped."""
+
+    return bool(os.environ.get(BATCH_ENV))
@@ -0,0 +1,111 @@
+"""Keep hourly time series on disk, so that only the hours since the last run are fetched.
+
+Rows are stored in a Parquet file once their hour is over (see :func:`cfkit.cache.closed_before`),
+along with the hour up to which the series is known to be complete. The next run asks
+:meth:`HourlyStore.resume_from` where its query should start, and hands the rows it fetched to
+:meth:`HourlyStore.extend`, which persists the closed hours and returns the whole series.
+"""
+
+import json
+import os
+
+import pandas as pd
+import polars as pl
+
+from cfkit.cache import DATA_DIR, closed_before
+from cfkit.frames import pandas_to_polars, polars_to_pandas
+from cfkit.windows import format_time, parse_time
+
+
+class HourlyStore:
+    """Hourly rows (with a ``time_column`` time string) persisted to a Parquet file."""
+
+    def __init__(self, path, time_column="time"):
+        self.path = path
+        self.time_column = time_column
+
+    @property
+    def _state_path(self):
+        return f"{self.path}.json"
+
+    def load(self):
+        """Stored rows as a polars DataFrame, or None if nothing was stored yet."""
+
+        return pl.read_parquet(self.path) if os.path.exists(self.path) else None
+
+    def complete_until(self):
+        """End of the last complete hour stored, or None."""
+
+        try:
+            with open(self._state_path) as f:
+                return parse_time(json.load(f)["complete_until"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def resume_from(self, start):
+        """Time the next query should start at: ``start``, or the first hour not stored yet."""
+
+        complete_until = self.complete_until()
+        if complete_until is None or complete_until <= parse_time(start):
+            return format_time(parse_time(start))
+        return format_time(complete_until)
+
+    def extend(self, rows, start):
+        """Store the closed hours of ``rows`` and return every row since ``start`` as a pandas DataFrame.
+
+        ``rows`` (a list of dicts or a DataFrame) must hold everything fetched from
+        :meth:`resume_from` up to now: hours stored again replace the previous ones, and the
+        ongoing hour is returned but not stored, since its values are still changing.
+        """
+
+        column = self.time_column
+        closed = closed_before()
+        closed_str = format_time(closed)
+
+        stored = self.load()
+        if not len(rows):
+            new = None
+        elif isinstance(rows, pd.DataFrame):
+            new = pandas_to_polars(rows)
+        else:
+            new = pl.DataFrame(rows, infer_schema_length=None)
+
+        if new is not None:
+            done = new.filter(pl.col(column) < closed_str)
+            if done.height:
+                if stored is not None:
+                    stored = stored.filter(~pl.col(column).is_in(done[column].unique().implode()))
+                stored = done if stored is None else pl.concat([stored, done], how="diagonal_relaxed")
+                self._write(stored.sort(column))
+            new = new.filter(pl.col(column) >= closed_str)
+
+        # Hours without any row are complete too, once the query that returned nothing covered them
+        complete_until = self.complete_until()
+        if complete_until is None or complete_until < closed:
+            self._write_state(max(closed, parse_time(start)))
+
+        frames = [frame for frame in (stored, new) if frame is not None and frame.height]
+        if not frames:
+            return pd.DataFrame(rows)
+
+        series = pl.concat(frames, how="diagonal_relaxed")
+        return polars_to_pandas(series.filter(pl.col(column) >= format_time(parse_time(start))).sort(column))
+
+    def _write(self, frame):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        frame.write_parquet(tmp_path)
+        os.replace(tmp_path, self.path)
+
+    def _write_state(self, complete_until):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self._state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"complete_until": format_time(complete_until)}, f)
+        os.replace(tmp_path, self._state_path)
+
+
+def hourly_store(*parts, time_column="time"):
+    """Store for a series named by ``parts`` (e.g. notebook, account and metric) under DATA_DIR."""
+
+    return HourlyStore(os.path.join(DATA_DIR, *parts[:-1], f"{parts[-1]}.parquet"), time_column)
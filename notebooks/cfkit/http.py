@@ -0,0 +1,276 @@
+"""Pooled HTTP client used in place of ``urllib.request.urlopen``.
+
+Every call made through :func:`urlopen` goes through a single ``requests`` session, which keeps
+connections alive and pools them per host, so consecutive API calls skip the TCP and TLS
+handshakes. GraphQL responses for time ranges that are over are also served from an on-disk cache
+(see :mod:`cfkit.cache`), and API calls are rate limited and retried when throttled (see
+:mod:`cfkit.throttle`). Under Pyodide (WASM) the browser already pools connections, so requests are
+sent with urllib instead, and are still cached, rate limited and retried the same way.
+"""
+
+import io
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cfkit.cache import default_cache
+from cfkit.throttle import Throttle, endpoint_class
+
+
+IS_WASM = sys.platform == "emscripten"
+
+# Connections kept alive per host, should be at least the number of concurrent fetches
+POOL_MAXSIZE = 16
+# Seconds to wait for the API before giving up
+DEFAULT_TIMEOUT = 120
+# Requests per second allowed by the shared client for each endpoint class, unless capped below
+# the API limits by CFKIT_RATE_LIMIT (0 for the API limits)
+RATE_LIMIT = 0
+# Bytes read from the connection at a time by streamed responses
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+class Response:
+    """File-like response, compatible with what ``urllib.request.urlopen`` returns.
+
+    A few ``requests`` style attributes (``status_code``, ``text``, ``raise_for_status``) are also
+    provided, since some notebook cells rely on them for error reporting.
+    """
+
+    def __init__(self, content, url, status=200, reason="OK", headers=None):
+        self.content = content
+        self._body = io.BytesIO(content)
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers or {}
+
+    def read(self, size=-1):
+        return self._body.read(size)
+
+    def getcode(self):
+        return self.status
+
+    @property
+    def status_code(self):
+        return self.status
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise requests.HTTPError(f"{self.status} {self.reason} for url: {self.url}", response=self)
+
+    def close(self):
+        self._body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class UrllibResponse:
+    """The parts of a ``requests`` response used by :class:`HTTPClient`, for a response read with urllib."""
+
+    def __init__(self, url, status, reason, headers, content):
+        self.url = url
+        self.status_code = status
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class StreamedResponse:
+    """File-like response whose body is read from the connection as :meth:`read` is called.
+
+    When ``cache_writer`` is given (see :meth:`cfkit.cache.ResponseCache.writer`), the body is
+    written to the cache as it is read, and kept once it was read in full and the response is
+    closed without an error (e.g. ``with`` blocks that raise on query errors discard it).
+    """
+
+    def __init__(self, resp, cache_writer=None, chunk_size=STREAM_CHUNK_SIZE):
+        self._resp = resp
+        self._chunks = resp.iter_content(chunk_size)
+        self._buffer = b""
+        self._cache_writer = cache_writer
+        self._done = False
+        self.url = resp.url
+        self.status = resp.status_code
+        self.reason = resp.reason
+        self.headers = resp.headers
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunk, self._buffer = self._buffer + b"".join(self._chunks), b""
+            self._done = True
+        else:
+            if not self._buffer:
+                self._buffer = next(self._chunks, b"")
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+            self._done = self._done or not chunk
+        if self._cache_writer is not None and chunk:
+            self._cache_writer.write(chunk)
+        return chunk
+
+    def getcode(self):
+        return self.status
+
+    @property
+    def status_code(self):
+        return self.status
+
+    def json(self):
+        return json.loads(self.read())
+
+    def close(self, failed=False):
+        if self._cache_writer is not None:
+            if self._done and not failed:
+                self._cache_writer.commit()
+            else:
+                self._cache_writer.discard()
+            self._cache_writer = None
+        self._resp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.close(failed=exc_type is not None)
+
+
+class HTTPClient:
+    """Thread-safe HTTP client keeping a pool of keep-alive connections per host.
+
+    ``cache`` is an optional :class:`~cfkit.cache.ResponseCache` for GraphQL responses, and
+    ``throttle`` an optional :class:`~cfkit.throttle.Throttle` limiting and retrying API calls
+    (cached responses are not counted).
+    """
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT, cache=None, throttle=None):
+        self.timeout = timeout
+        self.cache = cache
+        self.throttle = throttle
+        self.session = requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def urlopen(self, url, data=None, timeout=None, headers=None, method=None, stream=False):
+        """Drop-in replacement for ``urllib.request.urlopen`` (also accepts ``headers``).
+
+        With ``stream``, the body is read from the connection as the response is read (see
+        :class:`StreamedResponse`) rather than all at once.
+        """
+
+        if isinstance(url, urllib.request.Request):
+            request = url
+            url = request.full_url
+            data = request.data if data is None else data
+            method = method or request.get_method()
+            headers = {**dict(request.header_items()), **(headers or {})}
+
+        method = method or ("POST" if data is not None else "GET")
+
+        cache_key = self.cache.key(url, data) if self.cache is not None and method == "POST" else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return Response(cached, url)
+
+        resp = self._send(method, url, data, headers, timeout or self.timeout, stream)
+
+        # Behave like urllib, which raises on any HTTP error status
+        if resp.status_code >= 400:
+            raise urllib.error.HTTPError(url, resp.status_code, resp.reason, resp.headers, io.BytesIO(resp.content))
+
+        if stream:
+            return StreamedResponse(resp, self.cache.writer(cache_key) if cache_key is not None else None)
+
+        if cache_key is not None:
+            self.cache.put(cache_key, resp.content)
+
+        return Response(resp.content, resp.url, resp.status_code, resp.reason, resp.headers)
+
+    def _send(self, method, url, data, headers, timeout, stream=False):
+        """Send a request, waiting for the rate limit and retrying while throttled."""
+
+        name = endpoint_class(url) if self.throttle is not None else None
+        attempt = 1
+        while True:
+            if name is not None:
+                self.throttle.wait(name)
+            resp = self._request(method, url, data, headers, timeout, stream)
+            if name is None or not self.throttle.should_retry(name, method, resp.status_code, attempt):
+                return resp
+            resp.close()
+            self.throttle.delay(name, attempt, resp.headers)
+            attempt += 1
+
+    def _request(self, method, url, data, headers, timeout, stream):
+        if not IS_WASM:
+            return self.session.request(method, url, data=data, headers=headers, timeout=timeout, stream=stream)
+
+        # Under Pyodide the browser fetches the whole body, even for streamed responses
+        request = urllib.request.Request(url, data=_as_bytes(data), headers=headers or {}, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as resp:
+                return UrllibResponse(resp.url, resp.status, resp.reason, resp.headers, resp.read())
+        except urllib.error.HTTPError as e:
+            return UrllibResponse(url, e.code, e.reason, e.headers, e.read())
+
+    def close(self):
+        self.session.close()
+
+
+def _as_bytes(data):
+    return data.encode() if isinstance(data, str) else data
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_client():
+    """Return the client shared by all notebooks in this process."""
+
+    global _default_client
+
+    with _default_client_lock:
+        if _default_client is None:
+            throttle = Throttle(share=float(os.environ.get("CFKIT_RATE_SHARE", 1)),
+                                rate_limit=float(os.environ.get("CFKIT_RATE_LIMIT", RATE_LIMIT)))
+            _default_client = HTTPClient(cache=default_cache(), throttle=throttle)
+        return _default_client
+
+
+def urlopen(url, data=None, timeout=None, headers=None, method=None, stream=False):
+    """Open a URL through the shared, pooled client."""
+
+    return default_client().urlopen(url, data=data, timeout=timeout, headers=headers, method=method, stream=stream)
+
+
+def throttle_stats():
+    """Requests, retries and seconds spent throttled per endpoint class, for the shared client."""
+
+    return default_client().throttle.stats()
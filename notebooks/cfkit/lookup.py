@@ -0,0 +1,95 @@
+"""Id to name lookups (e.g. KV namespace titles) kept on disk across runs.
+
+Analytics only return ids, and listing every object of an account to name them can take many
+requests. A :class:`LookupCache` remembers the names found by previous runs, and only resolves ids it
+has never seen, one request per id. Each name is fetched again once older than ``max_age``, since
+objects can be renamed, and a full listing is used instead when too many ids are unknown.
+"""
+
+import json
+import os
+import time
+from datetime import timedelta
+
+from cfkit.cache import DATA_DIR
+from cfkit.concurrency import MAX_WORKERS, parallel_map
+
+
+# Age after which names are fetched again, in case objects were renamed
+MAX_AGE = timedelta(days=1)
+# Above this many unknown ids, listing every object takes fewer requests than one lookup per id
+BULK_THRESHOLD = 100
+
+
+class LookupCache:
+    """Persistent ``id -> name`` mapping, stored as JSON."""
+
+    def __init__(self, path, max_age=MAX_AGE, bulk_threshold=BULK_THRESHOLD):
+        self.path = path
+        self.max_age = max_age
+        self.bulk_threshold = bulk_threshold
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return {}, {}
+
+        names = stored.get("names", {})
+        # Files written before names had their own fetch time share a single one
+        fetched_at = stored.get("fetched_at") or dict.fromkeys(names, stored.get("updated_at", 0))
+        return names, fetched_at
+
+    def load(self):
+        """Names stored by previous runs, leaving out those fetched more than ``max_age`` ago."""
+
+        names, fetched_at = self._read()
+        oldest = time.time() - self.max_age.total_seconds()
+        return {key: name for key, name in names.items() if fetched_at.get(key, 0) >= oldest}
+
+    def save(self, names, fetched=None):
+        """Store ``names``, as just fetched, or only the ids in ``fetched`` if given.
+
+        Other names keep the time they were fetched at, so they still expire on time.
+        """
+
+        now = time.time()
+        _, stored_at = self._read()
+        fetched = set(names if fetched is None else fetched)
+        fetched_at = {key: now if key in fetched else stored_at.get(key, now) for key in names}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"names": names, "fetched_at": fetched_at}, f)
+        os.replace(tmp_path, self.path)
+
+    def resolve(self, ids, fetch_one, fetch_all=None, max_workers=MAX_WORKERS):
+        """Return the names of ``ids`` that could be found, as a dict.
+
+        ``fetch_one(id)`` returns the name of a single id (or None if it does not exist), and the
+        optional ``fetch_all()`` returns the names of every id as a dict.
+        """
+
+        ids = list(dict.fromkeys(ids))
+        names = self.load()
+        missing = [key for key in ids if key not in names]
+
+        if missing:
+            if fetch_all is not None and len(missing) > self.bulk_threshold:
+                names = fetch_all()
+                # Ids not listed do not exist (anymore), no need to look them up again until stale
+                names.update({key: None for key in ids if key not in names})
+                self.save(names)
+            else:
+                names.update(zip(missing, parallel_map(fetch_one, missing, max_workers)))
+                self.save(names, fetched=missing)
+
+        return {key: names[key] for key in ids if names.get(key) is not None}
+
+
+def lookup_cache(*parts, **kwargs):
+    """Lookup cache named by ``parts`` (e.g. notebook, account and object type) under DATA_DIR."""
+
+    return LookupCache(os.path.join(DATA_DIR, *parts[:-1], f"{parts[-1]}.json"), **kwargs)
@@ -0,0 +1,112 @@
+"""Fetch every row of an adaptive-groups selection, beyond the rows a single query can return.
+
+Rows are requested ordered by one or more dimensions (the cursor, which must match the selection's
+``orderBy``). When a page comes back full, the next one starts at the last cursor value seen: rows
+sharing that value are dropped from the current page, since the limit may have cut them short, and
+are fetched again at the start of the next page. Pages are yielded as they arrive, so they can be
+formatted one at a time instead of holding every response in memory.
+"""
+
+
+# Maximum rows returned by a single adaptive-groups selection
+PAGE_SIZE = 10000
+
+
+def selection_rows(response, alias):
+    """Rows of the ``alias`` selection in a GraphQL response, raising on query errors."""
+
+    if response.get("errors"):
+        messages = "\n - ".join(error["message"] for error in response["errors"])
+        raise RuntimeError(f"Obtained the following errors:\n - {messages}")
+
+    scope = next(iter(response["data"]["viewer"].values()))
+    return scope[0][alias] if scope else []
+
+
+def iter_pages(fetch, document, alias, cursor, filter_variable="filter", page_size=PAGE_SIZE, first_response=None):
+    """Yield every row of the ``alias`` selection, one page at a time.
+
+    ``fetch(document) -> response`` sends a query document; the cursor conditions are added to the
+    ``filter_variable`` variable of the document. ``first_response`` can be given when the first
+    page was already fetched (e.g. concurrently with other queries).
+    """
+
+    cursor = [cursor] if isinstance(cursor, str) else list(cursor)
+    base_filter = document["variables"].get(filter_variable)
+    response = first_response if first_response is not None else fetch(document)
+
+    while True:
+        rows = selection_rows(response, alias)
+        if len(rows) < page_size:
+            yield rows
+            return
+
+        last = _cursor_key(rows[-1], cursor)
+        page = [row for row in rows if _cursor_key(row, cursor) != last]
+        if not page:
+            raise RuntimeError(f"More than {page_size} rows of {alias} share {dict(zip(cursor, last))}, "
+                               f"add dimensions to the cursor")
+        yield page
+
+        response = fetch(_next_document(document, filter_variable, base_filter, cursor, last))
+
+
+def iter_frame_pages(fetch_frame, document, cursor, filter_variable="filter", page_size=PAGE_SIZE):
+    """Like :func:`iter_pages`, for pages fetched as DataFrames (e.g. built while each response is
+    read, see :func:`cfkit.graphql.stream_graphql_pages`).
+
+    ``fetch_frame(document) -> DataFrame`` sends a query document, and ``cursor`` maps each cursor
+    dimension to its column in the frames.
+    """
+
+    names = list(cursor)
+    columns = [cursor[name] for name in names]
+    base_filter = document["variables"].get(filter_variable)
+    frame = fetch_frame(document)
+
+    while True:
+        if len(frame) < page_size:
+            yield frame
+            return
+
+        last = tuple(_plain(frame[column].iloc[-1]) for column in columns)
+        page = frame[frame[columns].ne(list(last)).any(axis=1)].reset_index(drop=True)
+        if not len(page):
+            raise RuntimeError(f"More than {page_size} rows share {dict(zip(names, last))}, "
+                               f"add dimensions to the cursor")
+        yield page
+
+        frame = fetch_frame(_next_document(document, filter_variable, base_filter, names, last))
+
+
+def _cursor_key(row, cursor):
+    return tuple(row["dimensions"][name] for name in cursor)
+
+
+def _plain(value):
+    """A value read from a DataFrame as a plain Python value, to be sent back in a filter."""
+
+    return value.item() if hasattr(value, "item") else value
+
+
+def _next_document(document, filter_variable, base_filter, cursor, last):
+    """The document of the page starting at the ``last`` cursor values."""
+
+    cursor_filter = _starting_at(cursor, last)
+    variables = {
+        **document["variables"],
+        filter_variable: cursor_filter if base_filter is None else {"AND": [base_filter, cursor_filter]},
+    }
+    return {**document, "variables": variables}
+
+
+def _starting_at(cursor, values):
+    """Filter for rows whose cursor is greater or equal to ``values`` (in lexicographic order)."""
+
+    alternatives = []
+    for idx, name in enumerate(cursor):
+        condition = dict(zip(cursor[:idx], values[:idx]))
+        condition[f"{name}_geq" if idx == len(cursor) - 1 else f"{name}_gt"] = values[idx]
+        alternatives.append(condition)
+
+    return alternatives[0] if len(alternatives) == 1 else {"OR": alternatives}
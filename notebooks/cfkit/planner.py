@@ -0,0 +1,222 @@
+"""Merge several GraphQL queries over the same scope into a single request.
+
+Each query is described as a list of :class:`Selection` objects (one per alias), and a
+:class:`QueryPlan` renders all of them into one document. Selections reading the same dataset with
+the same filter and dimensions are merged into a single aliased selection carrying the union of
+their fields: the dataset is scanned once, and ordering and limits are then applied locally when
+the response is split back into one response per query, shaped as if each had been sent alone.
+"""
+
+import json
+
+
+# Rows requested for a merged selection, which must return every group to be ranked locally
+MERGE_LIMIT = 10000
+# Aliased selections sent in a single document, keeping its cost under the API's complexity limit
+MAX_SELECTIONS = 30
+
+
+class Selection:
+    """One aliased dataset selection, e.g. ``standard: r2StorageAdaptiveGroups(...) {...}``.
+
+    ``fields`` maps each field group to its fields, e.g. ``{"max": ["objectCount"], "dimensions":
+    ["bucketName"]}``. Scalar fields such as ``count`` map to ``None``.
+    """
+
+    def __init__(self, alias, dataset, filter, fields, order_by=(), limit=MERGE_LIMIT):
+        self.alias = alias
+        self.dataset = dataset
+        self.filter = filter
+        self.fields = fields
+        self.order_by = list(order_by)
+        self.limit = limit
+
+    def merge_key(self):
+        """Selections sharing this key can be answered by a single merged selection."""
+
+        return (self.dataset, _canonical(self.filter), tuple(sorted(self.fields.get("dimensions") or ())))
+
+    def render(self, alias=None):
+        args = [f"limit: {self.limit}"]
+        if self.order_by:
+            args.append(f"orderBy: [{', '.join(self.order_by)}]")
+        args.append(f"filter: {graphql_literal(self.filter)}")
+
+        body = []
+        for group, names in self.fields.items():
+            body.append(group if names is None else f"{group} {{ {' '.join(names)} }}")
+
+        return f"{alias or self.alias}: {self.dataset}({', '.join(args)}) {{ {' '.join(body)} }}"
+
+    def project(self, rows):
+        """Keep only the fields of this selection, ordered and limited as the API would have."""
+
+        for token in reversed(self.order_by):
+            name, direction = token.rsplit("_", 1)
+            rows = sorted(rows, key=lambda row: _sort_value(row, name), reverse=direction == "DESC")
+
+        return [
+            {group: (row.get(group) if names is None else {n: (row.get(group) or {}).get(n) for n in names})
+             for group, names in self.fields.items()}
+            for row in rows[:self.limit]
+        ]
+
+
+class QueryPlan:
+    """Render several queries over the same scope as a single document and split the response.
+
+    ``queries`` maps a query name to its list of selections, and ``scope`` is the ``viewer`` field
+    they are nested in (``accounts`` or ``zones``) along with its filter.
+    """
+
+    def __init__(self, scope, scope_filter, queries, merge=True):
+        self.scope = scope
+        self.scope_filter = scope_filter
+        self.queries = queries
+        self.merge = merge
+
+    def _groups(self):
+        groups = {}
+        for name, selections in self.queries.items():
+            for selection in selections:
+                key = selection.merge_key() if self.merge else (name, selection.alias)
+                groups.setdefault(key, []).append((name, selection))
+        return list(groups.values())
+
+    def _render(self, groups):
+        fields = []
+        for idx, group in enumerate(groups):
+            if len(group) == 1:
+                name, selection = group[0]
+                fields.append(selection.render(f"{name}__{selection.alias}"))
+            else:
+                fields.append(_merged(group).render(f"merged_{idx}"))
+
+        return (f"query {{ viewer {{ {self.scope}(filter: {graphql_literal(self.scope_filter)}) {{ "
+                f"{' '.join(fields)} }} }} }}")
+
+    def split(self, max_selections=MAX_SELECTIONS):
+        """Plans holding every query of this one, as few as fit ``max_selections`` selections each.
+
+        Queries are never split across plans, so that each response still answers whole queries.
+        The plans can be sent concurrently, e.g. with :func:`cfkit.graphql.fetch_graphql_many`.
+        """
+
+        plans, queries, count = [], {}, 0
+        for name, selections in self.queries.items():
+            if queries and count + len(selections) > max_selections:
+                plans.append(QueryPlan(self.scope, self.scope_filter, queries, self.merge))
+                queries, count = {}, 0
+            queries[name] = selections
+            count += len(selections)
+        if queries:
+            plans.append(QueryPlan(self.scope, self.scope_filter, queries, self.merge))
+        return plans
+
+    def document(self, groups=None):
+        """Build the query document to send to the GraphQL endpoint."""
+
+        return {"query": self._render(groups or self._groups()), "variables": {}}
+
+    def fetch(self, fetch):
+        """Send the plan using ``fetch(document) -> response`` and return a response per query.
+
+        A merged selection that comes back with ``MERGE_LIMIT`` rows may be missing groups, so the
+        selections it answers are then fetched again, unmerged, to keep results exact.
+        """
+
+        groups = self._groups()
+        response = fetch(self.document(groups))
+        scope = _scope_data(response, self.scope)
+
+        rows = {}
+        saturated = []
+        for idx, group in enumerate(groups):
+            if len(group) == 1:
+                name, selection = group[0]
+                rows[(name, selection.alias)] = (scope or {}).get(f"{name}__{selection.alias}")
+                continue
+
+            merged_rows = (scope or {}).get(f"merged_{idx}") or []
+            if len(merged_rows) >= MERGE_LIMIT:
+                saturated += group
+                continue
+            for name, selection in group:
+                rows[(name, selection.alias)] = selection.project(merged_rows)
+
+        errors = response.get("errors")
+        if saturated:
+            retry = fetch(self.document([[member] for member in saturated]))
+            retry_scope = _scope_data(retry, self.scope) or {}
+            for name, selection in saturated:
+                rows[(name, selection.alias)] = retry_scope.get(f"{name}__{selection.alias}")
+            if retry.get("errors"):
+                errors = (errors or []) + retry["errors"]
+
+        return {
+            name: {
+                "data": None if scope is None else {
+                    "viewer": {self.scope: [{s.alias: rows[(name, s.alias)] for s in selections}]}
+                },
+                "errors": errors,
+            }
+            for name, selections in self.queries.items()
+        }
+
+
+def _merged(group):
+    """Single selection with the union of the fields of every selection in the group."""
+
+    first = group[0][1]
+    fields = {}
+    for _, selection in group:
+        for field_group, names in selection.fields.items():
+            if names is None:
+                fields[field_group] = None
+            else:
+                fields.setdefault(field_group, [])
+                fields[field_group] += [n for n in names if n not in fields[field_group]]
+
+    # Fields used for ordering must be fetched too, since ordering is done locally
+    for _, selection in group:
+        for token in selection.order_by:
+            name = token.rsplit("_", 1)[0]
+            field_group, _, field = name.partition("_")
+            if field and field_group != "dimensions":
+                fields.setdefault(field_group, [])
+                if field not in fields[field_group]:
+                    fields[field_group].append(field)
+
+    return Selection(first.alias, first.dataset, first.filter, fields, limit=MERGE_LIMIT)
+
+
+def _sort_value(row, name):
+    group, _, field = name.partition("_")
+    if field and isinstance(row.get(group), dict):
+        value = row[group].get(field)
+    elif name in row:
+        value = row[name]
+    else:
+        value = (row.get("dimensions") or {}).get(name)
+    return 0 if value is None else value
+
+
+def _scope_data(response, scope):
+    try:
+        return response["data"]["viewer"][scope][0]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True)
+
+
+def graphql_literal(value):
+    """Render a Python value as a GraphQL input literal (object keys are left unquoted)."""
+
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{k}: {graphql_literal(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(graphql_literal(v) for v in value) + "]"
+    return json.dumps(value)
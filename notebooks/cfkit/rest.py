@@ -0,0 +1,56 @@
+"""Helpers for the Cloudflare REST API (``/client/v4/...``).
+
+List endpoints are paginated: the first page tells how many pages there are
+(``result_info.total_pages``), and the remaining ones are then fetched concurrently.
+"""
+
+import json
+import urllib.error
+import urllib.parse
+from urllib.request import Request
+
+from cfkit.concurrency import MAX_WORKERS, parallel_map
+from cfkit.http import urlopen
+
+
+def rest_request(url, token, params=None):
+    """Build the GET request for an endpoint, with optional query string ``params``."""
+
+    if params:
+        url = url + '?' + urllib.parse.urlencode(params)
+    return Request(url, headers={"Authorization": f"Bearer {token}"})
+
+
+def fetch_rest(url, token, params=None):
+    """GET an endpoint and return the decoded JSON response."""
+
+    return json.loads(urlopen(rest_request(url, token, params)).read())
+
+
+def fetch_result(url, token, params=None):
+    """GET a single object and return its ``result``, or None if it does not exist."""
+
+    try:
+        return fetch_rest(url, token, params)["result"]
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+def list_pages(url, token, per_page=100, params=None, max_workers=MAX_WORKERS):
+    """Fetch every page of a list endpoint, returning the ``result`` list of each page in order."""
+
+    params = {**(params or {}), "per_page": per_page}
+    first = fetch_rest(url, token, params)
+    total_pages = (first.get("result_info") or {}).get("total_pages") or 1
+
+    rest = parallel_map(lambda page: fetch_rest(url, token, {**params, "page": page})["result"],
+                        range(2, total_pages + 1), max_workers)
+    return [first["result"]] + rest
+
+
+def list_all(url, token, per_page=100, params=None, max_workers=MAX_WORKERS):
+    """Every item of a list endpoint, across all of its pages."""
+
+    return [item for page in list_pages(url, token, per_page, params, max_workers) for item in page]
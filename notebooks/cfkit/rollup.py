@@ -0,0 +1,187 @@
+"""Keep the hourly maps of a zone (countries, content types, ...) on disk, rolled up by day and week.
+
+Maps such as ``countryMap`` are returned per hour by ``httpRequests1hGroups``, one row per hour and
+key (see :func:`cfkit.frames.map_frames`). A :class:`RollupStore` writes each closed hour (see
+:func:`cfkit.cache.closed_before`) to a partition per zone and hour, holding a Parquet file per map.
+Once every hour of a day is stored, they are summed by key into a daily partition, and once every
+day of a week (starting on Monday) is stored, into a weekly one::
+
+    <directory>/<zone>/hour/2024-01-31T23/countryMap.parquet
+    <directory>/<zone>/day/2024-01-31/countryMap.parquet
+    <directory>/<zone>/week/2024-01-29/countryMap.parquet
+
+A breakdown over any past window then reads the fewest partitions covering it, e.g. a week, a few
+days and a few hours, instead of querying the API again. Hours without traffic are stored as empty
+partitions, so that the store knows they are complete.
+"""
+
+import os
+import shutil
+from datetime import timedelta
+
+import polars as pl
+
+from cfkit.cache import DATA_DIR, closed_before
+from cfkit.frames import pandas_to_polars, polars_to_pandas
+from cfkit.windows import format_time, parse_time
+
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+WEEK = timedelta(weeks=1)
+# Partition grains, from the coarsest, with the format of their directory names
+GRAINS = {"week": (WEEK, "%Y-%m-%d"), "day": (DAY, "%Y-%m-%d"), "hour": (HOUR, "%Y-%m-%dT%H")}
+
+
+def _grain_start(value, grain):
+    """Start of the ``grain`` partition holding ``value`` (weeks start on Monday)."""
+
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if grain == "hour":
+        return value
+    value = value.replace(hour=0)
+    return value - timedelta(days=value.weekday()) if grain == "week" else value
+
+
+class RollupStore:
+    """Maps (long DataFrames with ``time`` and ``key`` columns) by zone, partitioned by hour, day and week."""
+
+    def __init__(self, directory, time_column="time", key_column="key"):
+        self.directory = directory
+        self.time_column = time_column
+        self.key_column = key_column
+
+    def _partition(self, zone, grain, start):
+        return os.path.join(self.directory, zone, grain, start.strftime(GRAINS[grain][1]))
+
+    def has(self, zone, grain, start):
+        return os.path.isdir(self._partition(zone, grain, start))
+
+    def add(self, zone, maps, start, end):
+        """Store the closed hours of ``maps`` (by name) fetched for ``[start, end)``, and roll them up.
+
+        Every closed hour of the window is stored, even without rows, and replaces what was stored.
+        """
+
+        # An hour the window starts within was not fetched in full
+        start = parse_time(start)
+        if _grain_start(start, "hour") != start:
+            start = _grain_start(start, "hour") + HOUR
+        end = min(parse_time(end), closed_before())
+        frames = {name: self._polars(frame) for name, frame in maps.items()}
+
+        hours = []
+        curr = start
+        while curr + HOUR <= end:
+            hour = format_time(curr)
+            self._write(zone, "hour", curr, {
+                name: frame.filter(pl.col(self.time_column) == hour) for name, frame in frames.items()
+            })
+            hours.append(curr)
+            curr += HOUR
+
+        for day in sorted({_grain_start(hour, "day") for hour in hours}):
+            self._roll_up(zone, "day", day, "hour", HOUR, 24)
+        for week in sorted({_grain_start(hour, "week") for hour in hours}):
+            self._roll_up(zone, "week", week, "day", DAY, 7)
+
+    def missing(self, zone, start, end):
+        """Windows of ``[start, end)`` (as time strings) with hours not stored yet, to fetch and :meth:`add`."""
+
+        windows = []
+        for grain, start_time, _ in self._cover(zone, parse_time(start), parse_time(end)):
+            if grain is None:
+                if windows and windows[-1][1] == start_time:
+                    windows[-1][1] = start_time + HOUR
+                else:
+                    windows.append([start_time, start_time + HOUR])
+        return [(format_time(since), format_time(until)) for since, until in windows]
+
+    def read(self, zone, name, start, end):
+        """Rows of the ``name`` map over ``[start, end)``, from the coarsest partitions covering it.
+
+        The time of each row is the start of its partition. Raises if any hour is not stored.
+        """
+
+        frames = []
+        for grain, start_time, _ in self._cover(zone, parse_time(start), parse_time(end)):
+            if grain is None:
+                raise ValueError(f"{format_time(start_time)} of zone {zone} is not stored, see RollupStore.missing")
+            path = os.path.join(self._partition(zone, grain, start_time), f"{name}.parquet")
+            if os.path.exists(path):
+                frames.append(pl.read_parquet(path))
+
+        frames = [frame for frame in frames if frame.height]
+        if not frames:
+            return polars_to_pandas(pl.DataFrame(schema={self.time_column: pl.Utf8, self.key_column: pl.Utf8}))
+        return polars_to_pandas(pl.concat(frames, how="diagonal_relaxed").sort(self.time_column))
+
+    def breakdown(self, zone, name, start, end):
+        """Totals by key of the ``name`` map over ``[start, end)``, sorted by their first value column."""
+
+        frame = self.read(zone, name, start, end).drop(columns=[self.time_column])
+        totals = frame.groupby(self.key_column).sum(numeric_only=True).reset_index()
+        values = [column for column in totals.columns if column != self.key_column]
+        return totals.sort_values(values[:1], ascending=False, ignore_index=True) if values else totals
+
+    def _cover(self, zone, start, end):
+        """Partitions covering ``[start, end)``, as ``(grain, start, end)``; grain is None for hours not stored."""
+
+        curr = _grain_start(start, "hour")
+        while curr < end:
+            for grain, (size, _) in GRAINS.items():
+                if _grain_start(curr, grain) == curr and curr + size <= end and self.has(zone, grain, curr):
+                    yield grain, curr, curr + size
+                    curr += size
+                    break
+            else:
+                yield None, curr, curr + HOUR
+                curr += HOUR
+
+    def _roll_up(self, zone, grain, start, part_grain, part_size, parts):
+        starts = [start + part_size * i for i in range(parts)]
+        if self.has(zone, grain, start) or not all(self.has(zone, part_grain, part) for part in starts):
+            return
+
+        names = set()
+        for part in starts:
+            names.update(name[:-len(".parquet")] for name in os.listdir(self._partition(zone, part_grain, part))
+                         if name.endswith(".parquet"))
+
+        time = format_time(start)
+        rolled = {}
+        for name in sorted(names):
+            frames = [
+                pl.read_parquet(path) for path in (
+                    os.path.join(self._partition(zone, part_grain, part), f"{name}.parquet") for part in starts
+                ) if os.path.exists(path)
+            ]
+            frame = pl.concat([frame for frame in frames if frame.height] or frames[:1], how="diagonal_relaxed")
+            if self.key_column in frame.columns:
+                frame = (frame.drop(self.time_column)
+                         .group_by(self.key_column).agg(pl.all().sum())
+                         .with_columns(pl.lit(time).alias(self.time_column)))
+            rolled[name] = frame.select([self.time_column] + [c for c in frame.columns if c != self.time_column])
+        self._write(zone, grain, start, rolled)
+
+    def _polars(self, frame):
+        frame = frame if isinstance(frame, pl.DataFrame) else pandas_to_polars(frame)
+        return frame.with_columns(pl.col(self.time_column).cast(pl.Utf8))
+
+    def _write(self, zone, grain, start, frames):
+        """Write a whole partition at once, replacing the previous one."""
+
+        path = self._partition(zone, grain, start)
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, frame in frames.items():
+            frame.write_parquet(os.path.join(tmp_path, f"{name}.parquet"))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+
+def rollup_store(*parts):
+    """Store for the maps named by ``parts`` (e.g. notebook and account) under DATA_DIR."""
+
+    return RollupStore(os.path.join(DATA_DIR, *parts))
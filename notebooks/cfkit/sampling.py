@@ -0,0 +1,43 @@
+"""Confidence bounds for the counts of sampled (adaptive) datasets.
+
+Adaptive datasets such as ``httpRequestsAdaptiveGroups`` store a sample of the events when traffic
+is high, and ``avg { sampleInterval }`` reports how many events each stored one stands for (1 when
+every event was kept). The ``count`` and ``sum`` fields returned are already extrapolated: each
+sampled event is weighted by its interval. Dividing them by the interval gives back the number of
+events actually sampled, which sets how precise the estimate is.
+
+The sampled events of a group are treated as a Poisson count, and its bounds (with the square root
+approximation, which holds down to a few events) are weighted by the interval like the estimate.
+Entries whose bounds overlap can swap places in a ranking; unsampled groups have exact bounds.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+
+# Probability that the true value lies between the bounds
+CONFIDENCE = 0.95
+
+
+def sample_bounds(frame, column, interval="sample_interval", confidence=CONFIDENCE):
+    """Add the sampled events and confidence bounds of an extrapolated ``column`` (e.g. ``count``).
+
+    The new columns are ``<column>_sampled``, ``<column>_low`` and ``<column>_high``. ``interval`` is
+    the column holding ``avg.sampleInterval`` for each row (missing values count as unsampled).
+    """
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    weights = frame[interval].fillna(1).clip(lower=1).to_numpy(dtype=float)
+    estimates = frame[column].to_numpy(dtype=float)
+    sampled = estimates / weights
+
+    low = weights * np.maximum(np.sqrt(sampled) - z / 2, 0) ** 2
+    high = weights * (np.sqrt(sampled + 1) + z / 2) ** 2
+    exact = weights <= 1
+
+    return frame.assign(**{
+        f"{column}_sampled": np.round(sampled),
+        f"{column}_low": np.where(exact, estimates, np.round(low)),
+        f"{column}_high": np.where(exact, estimates, np.round(high)),
+    })
@@ -0,0 +1,70 @@
+"""Time series kept at the grain they were fetched at, serving coarser grains without new queries.
+
+A notebook often fetches hourly data for a first overview, then queries the same window again to
+chart a few entries over time. A :class:`SeriesStore` holds the series already fetched, by grain,
+and derives a series at any grain that is a multiple of one it holds (e.g. hourly or daily from
+hourly), by summing counts into coarser time buckets. Only finer grains call ``fetch``.
+
+Quantiles (e.g. a median CPU time) cannot be summed or averaged: those of each coarser bucket are
+read from the merged distributions of its rows instead (see :func:`cfkit.sketch.sketch_quantiles`).
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+
+from cfkit.aggregate import group_totals
+from cfkit.sketch import percentile_column, sketch_quantiles
+
+
+class SeriesStore:
+    """Long time series DataFrames (one row per time bucket and key), by grain."""
+
+    def __init__(self, time_column="time"):
+        self.time_column = time_column
+        self.frames = {}
+
+    def add(self, frame, grain):
+        """Keep a series fetched at ``grain`` (its time column must hold datetimes)."""
+
+        self.frames[grain] = frame
+
+    def source_grain(self, grain):
+        """Finest grain held that ``grain`` is a multiple of, or None if it must be fetched."""
+
+        grains = [held for held in self.frames if held <= grain and grain % held == timedelta(0)]
+        return min(grains) if grains else None
+
+    def series(self, grain, by, aggs, quantiles=None, count=None, where=None, fetch=None):
+        """Series at ``grain`` by the ``by`` column(s), aggregating columns as in ``aggs`` (e.g. "sum").
+
+        ``quantiles`` maps probabilities to the columns holding them (e.g. ``{0.5: "cpuTimeP50"}``),
+        which are merged over the time buckets weighted by the ``count`` column (e.g. requests), and
+        ``where`` maps columns to the values to keep. When no series held can be rolled up to
+        ``grain``, ``fetch(grain)`` returns it and it is kept for later calls.
+        """
+
+        by = [by] if isinstance(by, str) else list(by)
+        quantiles = quantiles or {}
+
+        source = self.source_grain(grain)
+        if source is None:
+            if fetch is None:
+                raise ValueError(f"No series held at {grain} or a finer grain it is a multiple of")
+            self.add(fetch(grain), grain)
+            source = grain
+
+        frame = self.frames[source]
+        for column, values in (where or {}).items():
+            frame = frame.loc[frame[column].isin(values)]
+
+        keys = [self.time_column] + by
+        frame = frame.assign(**{self.time_column: frame[self.time_column].dt.floor(pd.Timedelta(grain))})
+        result = group_totals(frame, keys, {**aggs, **({count: "sum"} if quantiles else {})})
+
+        if quantiles:
+            merged = sketch_quantiles(frame, keys, quantiles, count, percentiles=sorted(quantiles))
+            merged = merged.rename(columns={percentile_column(p): column for p, column in quantiles.items()})
+            result = result.merge(merged, on=keys, how="left")
+
+        return result[keys + [column for column in frame.columns if column in result and column not in keys]]
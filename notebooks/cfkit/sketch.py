@@ -0,0 +1,157 @@
+"""Mergeable quantile sketches, to aggregate percentiles reported per time bucket.
+
+The Analytics API returns quantiles (``cpuTimeP50``, ``cpuTimeP99``, ...) for each group of its
+results, e.g. per hour and worker, but quantiles cannot be averaged into the quantiles of a longer
+window. Instead, the distribution of every group is rebuilt from its quantiles and request count,
+and added to a :class:`DDSketch`: a histogram over logarithmic buckets, so that any quantile read
+from it is within a relative ``accuracy`` of the true value, and that two sketches merge by adding
+their buckets. The sketches of every hour (or worker) then give the percentiles of the whole window.
+
+Each group is assumed to be log-normal between its reported quantiles, which latencies are close to,
+and values below the lowest one follow the shape of the first interval (the API returns no minimum).
+"""
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+
+# Relative error of the quantiles read from a sketch
+ACCURACY = 0.01
+# Probability slices each group's distribution is rebuilt from, finer towards the tail
+SLICES = np.concatenate([
+    np.linspace(0, 0.5, 9),
+    np.linspace(0.5, 0.75, 5)[1:],
+    np.linspace(0.75, 0.99, 9)[1:],
+    np.linspace(0.99, 0.999, 5)[1:],
+    [1.0],
+])
+
+_NORMAL = NormalDist()
+# Stands in for zero where logarithms are taken
+_TINY = 1e-9
+
+
+class DDSketch:
+    """Weighted counts over logarithmic buckets of positive values, plus a bucket for zeros."""
+
+    def __init__(self, accuracy=ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0.0
+        self.count = 0.0
+
+    def add(self, values, weights=1.0):
+        """Add a value (or an array of values) with the given weight(s)."""
+
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        weights = np.broadcast_to(np.asarray(weights, dtype=float), values.shape)
+
+        positive = values > 0
+        self.zeros += float(weights[~positive].sum())
+        self.count += float(weights.sum())
+
+        indexes = np.ceil(np.log(values[positive]) / self._log_gamma).astype(int)
+        for index, weight in zip(*_sum_by(indexes, weights[positive])):
+            self.buckets[index] = self.buckets.get(index, 0.0) + weight
+
+    def merge(self, other):
+        """Add the counts of another sketch (with the same accuracy) to this one."""
+
+        for index, weight in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0.0) + weight
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Value at quantile ``q`` (between 0 and 1), or NaN for an empty sketch."""
+
+        if self.count <= 0:
+            return math.nan
+
+        rank = q * self.count
+        if rank <= self.zeros:
+            return 0.0
+        seen = self.zeros
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+def _sum_by(keys, weights):
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique.tolist(), np.bincount(inverse, weights=weights).tolist()
+
+
+def rebuild(quantiles, counts):
+    """Values and weights approximating the distribution of each group, from its quantiles.
+
+    ``quantiles`` maps probabilities (e.g. ``0.5``) to an array of values per group, and ``counts``
+    holds the number of events of each group. Returns two arrays of shape (groups, slices).
+    """
+
+    probabilities = sorted(quantiles)
+    knots = np.column_stack([np.asarray(quantiles[p], dtype=float) for p in probabilities])
+    # A group may report quantiles out of order when it holds very few events
+    knots = np.maximum.accumulate(np.nan_to_num(knots), axis=1)
+
+    # Latencies are skewed (close to log-normal), so the log of the values is interpolated against
+    # normal scores, which is exact for a log-normal distribution
+    scores = np.array([_NORMAL.inv_cdf(p) for p in probabilities])
+    midpoints = (SLICES[:-1] + SLICES[1:]) / 2
+    midpoint_scores = np.array([_NORMAL.inv_cdf(p) for p in midpoints])
+    logs = np.log(np.maximum(knots, _TINY))
+
+    values = np.empty((len(knots), len(midpoints)))
+    for row, group_logs in zip(values, logs):
+        row[:] = np.interp(midpoint_scores, scores, group_logs)
+        if len(scores) > 1:
+            # Below the lowest quantile, the shape of the first interval is carried on
+            slope = (group_logs[1] - group_logs[0]) / (scores[1] - scores[0])
+            lower = midpoint_scores < scores[0]
+            row[lower] = group_logs[0] + slope * (midpoint_scores[lower] - scores[0])
+    values = np.exp(values)
+    # Zeros were stood in for by a tiny value, which interpolation can only make smaller
+    values[values <= 2 * _TINY] = 0.0
+    weights = np.outer(np.asarray(counts, dtype=float), np.diff(SLICES))
+    return values, weights
+
+
+def percentile_column(p):
+    """Name of the column holding percentile ``p`` in :func:`sketch_quantiles` results, e.g. ``p99``."""
+
+    return f"p{p * 100:g}".replace(".", "")
+
+
+def sketch_quantiles(frame, by, quantiles, count, percentiles=(0.5, 0.99), accuracy=ACCURACY):
+    """Percentiles per ``by`` group, merging the distributions of every row of the group.
+
+    ``quantiles`` maps probabilities to the columns holding them (e.g. ``{0.5: "cpuTimeP50"}``),
+    ``count`` is the column of event counts (e.g. requests), and the result has a column per
+    percentile, named like ``p50`` or ``p99``.
+    """
+
+    by = [by] if isinstance(by, str) else list(by)
+    values, weights = rebuild({p: frame[column].to_numpy() for p, column in quantiles.items()},
+                              frame[count].to_numpy())
+
+    sketches = {}
+    for position, key in enumerate(frame[by].itertuples(index=False, name=None)):
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = DDSketch(accuracy)
+        sketch.add(values[position], weights[position])
+
+    data = {column: [key[i] for key in sketches] for i, column in enumerate(by)}
+    for p in percentiles:
+        data[percentile_column(p)] = [
+            sketch.quantile(p) for sketch in sketches.values()
+        ]
+    return pd.DataFrame(data, columns=list(data))
@@ -0,0 +1,130 @@
+"""Decode the rows of GraphQL responses as they are read, without building the whole document.
+
+``json.loads`` on a response holds both its bytes and every row as a dict at once, which for
+10000-row selections (or rows holding nested maps) takes several times the size of the response.
+Here the response is read in chunks, and each array of rows under one of the given aliases (the
+``data.viewer.<scope>[0].<alias>`` selections) is decoded one row at a time, handed over in
+batches, and turned into columns (see :func:`cfkit.frames.rows_frame`) before the next batch is
+decoded. Responses opened with ``stream=True`` (see :func:`cfkit.http.urlopen`) are read from the
+connection chunk by chunk, so their body is never held in full either. Under Pyodide (WASM) the
+browser fetches the whole body first, and only the decoding is incremental.
+
+The rest of the document (with those arrays left empty) is decoded at the end, to report errors.
+"""
+
+import codecs
+import json
+import re
+
+import pandas as pd
+
+from cfkit.frames import column_values
+from cfkit.pagination import selection_rows
+
+
+# Bytes read from the response at a time
+CHUNK_SIZE = 1 << 16
+# Rows decoded before being turned into columns
+BATCH_SIZE = 1000
+# Text kept when looking for an alias across chunks, longer than any key and the spaces around it
+_KEY_MARGIN = 256
+_WHITESPACE = " \t\r\n,"
+
+
+def iter_selections(stream, aliases, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+    """Yield ``(alias, rows)`` batches of the arrays found under any of ``aliases``, as they are read.
+
+    ``stream`` is a file-like response. The last item yielded is ``(None, document)``, the decoded
+    response with those arrays left empty.
+    """
+
+    pattern = re.compile(r'(?<!\\)"({})"\s*:\s*\['.format("|".join(re.escape(alias) for alias in aliases)))
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer, outside, eof = "", [], False
+
+    def read():
+        nonlocal buffer, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += utf8.decode(chunk or b"", final=eof)
+
+    while True:
+        # Outside of the arrays of rows: look for the next one
+        match = pattern.search(buffer)
+        if match is None:
+            if eof:
+                outside.append(buffer)
+                break
+            keep = max(0, len(buffer) - _KEY_MARGIN)
+            outside.append(buffer[:keep])
+            buffer = buffer[keep:]
+            read()
+            continue
+
+        alias = match.group(1)
+        outside.append(buffer[:match.end()] + "]")
+        buffer = buffer[match.end():]
+
+        # Inside an array: decode rows until its closing bracket
+        rows, position = [], 0
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    raise ValueError(f"Response ended inside the {alias} selection")
+                buffer, position = buffer[position:], 0
+                read()
+                continue
+            if buffer[position] == "]":
+                buffer = buffer[position + 1:]
+                break
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The row is cut by the end of the chunk
+                if eof:
+                    raise
+                buffer, position = buffer[position:], 0
+                read()
+                continue
+            rows.append(row)
+            if len(rows) >= batch_size:
+                yield alias, rows
+                rows = []
+        if rows:
+            yield alias, rows
+
+    yield None, json.loads("".join(outside))
+
+
+def stream_frames(stream, selections, batch_size=BATCH_SIZE, **constants):
+    """DataFrames of several selections of a response, by alias, built as the response is read.
+
+    ``selections`` maps each alias to its ``path -> name`` columns, see :func:`cfkit.frames.rows_frame`.
+    Raises on query errors, like :func:`cfkit.pagination.selection_rows`.
+    """
+
+    data = {alias: {name: [] for name in columns.values()} for alias, columns in selections.items()}
+
+    for alias, rows in iter_selections(stream, list(selections), batch_size):
+        if alias is None:
+            # Raises on errors, the arrays themselves were emptied
+            selection_rows(rows, next(iter(selections)))
+            break
+        for path, name in selections[alias].items():
+            data[alias][name] += column_values(rows, path)
+
+    frames = {}
+    for alias, columns in data.items():
+        length = len(next(iter(columns.values()), []))
+        columns.update({name: [value] * length for name, value in constants.items()})
+        frames[alias] = pd.DataFrame(columns, columns=list(columns))
+    return frames
+
+
+def stream_frame(stream, alias, columns, batch_size=BATCH_SIZE, **constants):
+    """DataFrame of the ``alias`` selection of a response, built as the response is read."""
+
+    return stream_frames(stream, {alias: columns}, batch_size, **constants)[alias]
@@ -0,0 +1,83 @@
+"""Run a zone-scoped query over many zones at once.
+
+``zones(filter: {zoneTag_in: [...]})`` returns every listed zone in a single response, each with its
+own selections. Zones are grouped so that the rows expected from a group stay within the rows a
+single query may return, and the groups are fetched concurrently. The query must select ``zoneTag``
+on the zones, so that rows can be told apart, and take the zones in a ``$zoneTags`` variable and the
+limit of the selection in a ``$limit`` variable::
+
+    query ($zoneTags: [string], $limit: uint64!, ...) {
+      viewer {
+        zones(filter: {zoneTag_in: $zoneTags}) {
+          zoneTag
+          hours: httpRequests1hGroups(limit: $limit, ...) { ... }
+        }
+      }
+    }
+"""
+
+import pandas as pd
+
+from cfkit.concurrency import MAX_WORKERS
+from cfkit.frames import map_frames
+from cfkit.graphql import fetch_graphql_many
+from cfkit.pagination import PAGE_SIZE
+
+
+# Most zones listed in a single zoneTag_in filter
+MAX_ZONES_PER_QUERY = 50
+
+
+def zone_batches(zone_tags, rows_per_zone, budget=PAGE_SIZE, max_zones=MAX_ZONES_PER_QUERY):
+    """Split zones into groups whose expected rows (``rows_per_zone`` each) fit in ``budget``."""
+
+    size = max(1, min(max_zones, budget // max(1, rows_per_zone)))
+    zone_tags = list(zone_tags)
+    return [zone_tags[i:i + size] for i in range(0, len(zone_tags), size)]
+
+
+def sweep_zones(hostname, token, query, alias, zone_tags, variables, rows_per_zone, limit=PAGE_SIZE,
+                budget=PAGE_SIZE, max_workers=MAX_WORKERS):
+    """Rows of the ``alias`` selection for every zone, by zone tag.
+
+    ``variables`` are sent with every query, along with the ``zoneTags`` of its group and the ``limit``.
+    The limit applies to the selection of each zone on its own, while ``budget`` bounds the rows of a
+    whole group: a zone expected to return ``limit`` rows or more, or returning that many, may have been
+    truncated and raises a ``ValueError`` instead.
+    """
+
+    if rows_per_zone >= limit:
+        raise ValueError(f"{rows_per_zone} rows expected per zone, reaching the limit of {limit}: "
+                         "shorten the interval or increase the limit")
+
+    documents = [
+        {"query": query, "variables": {**variables, "zoneTags": batch, "limit": limit}}
+        for batch in zone_batches(zone_tags, rows_per_zone, budget)
+    ]
+
+    rows = {}
+    for response in fetch_graphql_many(hostname, token, documents, max_workers):
+        if response.get("errors"):
+            messages = "\n - ".join(error["message"] for error in response["errors"])
+            raise RuntimeError(f"Obtained the following errors:\n - {messages}")
+        for zone in response["data"]["viewer"]["zones"]:
+            if len(zone[alias]) >= limit:
+                raise ValueError(f"Zone {zone['zoneTag']} returned {limit} rows, which may have been truncated")
+            rows[zone["zoneTag"]] = zone[alias]
+    return rows
+
+
+def sweep_map_frames(rows_by_zone, maps, time_path="dimensions.timeslot", group="sum"):
+    """One long DataFrame per map, like :func:`cfkit.frames.map_frames`, with a leading ``zone`` column."""
+
+    parts = {name: [] for name in maps}
+    for zone_tag, rows in rows_by_zone.items():
+        for name, frame in map_frames(rows, maps, time_path, group).items():
+            if len(frame):
+                frame.insert(0, "zone", zone_tag)
+                parts[name].append(frame)
+
+    return {
+        name: pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["zone", "time"])
+        for name, frames in parts.items()
+    }
@@ -0,0 +1,164 @@
+"""Client-side rate limiting and retries for the Cloudflare API.
+
+Requests are classified by endpoint (GraphQL Analytics, REST, Workers AI runs), each class drawing
+from its own token bucket, sized after the API limits, so concurrent fetches stay under them rather
+than failing. Responses telling us to slow down (429) or reporting a transient server error (5xx)
+are retried with jittered exponential backoff, waiting at least as long as their ``Retry-After``
+header asks for, during which the whole endpoint class is paused.
+
+Time spent waiting on the buckets and on backoff is recorded per class, see :meth:`Throttle.stats`.
+"""
+
+import email.utils
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+
+# Sustained requests per second and burst allowed for each class of endpoint
+ENDPOINT_LIMITS = {
+    # 300 queries per 5 minutes
+    "graphql": (1.0, 25),
+    # 1200 requests per 5 minutes
+    "rest": (4.0, 100),
+    # Text generation models allow 300 requests per minute
+    "ai": (5.0, 50),
+}
+# Attempts made for a request before giving up
+MAX_ATTEMPTS = 5
+# First and longest backoff between attempts, in seconds
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Server errors that are worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def endpoint_class(url):
+    """Class of an API endpoint, or None for URLs outside of the Cloudflare API (never throttled)."""
+
+    path = url.split("?", 1)[0].rstrip("/")
+    if path.endswith("/graphql"):
+        return "graphql"
+    if "/client/v4/" not in path:
+        return None
+    if "/ai/run/" in path:
+        return "ai"
+    return "rest"
+
+
+class TokenBucket:
+    """Thread-safe token bucket, refilled at ``rate`` tokens per second up to ``burst`` tokens."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token, returning how long to wait before using it."""
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens can go negative: later callers queue up behind the earlier ones
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        """Wait for a token, returning the seconds spent waiting."""
+
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hold every request for ``seconds``, e.g. when the API asks to retry later."""
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def retry_after(headers):
+    """Seconds to wait from a ``Retry-After`` header (seconds or HTTP date), or None."""
+
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Jittered exponential backoff before retry number ``attempt`` (from 1)."""
+
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+
+class Throttle:
+    """Token buckets and retry policy shared by the requests of a client.
+
+    ``limits`` maps each endpoint class to its ``(rate, burst)``. Processes sharing the same API limits
+    (e.g. headless runs for several accounts) each use a ``share`` of them, and ``rate_limit``
+    optionally caps the rate of every class.
+    """
+
+    def __init__(self, limits=None, share=1.0, rate_limit=None, max_attempts=MAX_ATTEMPTS):
+        limits = ENDPOINT_LIMITS if limits is None else limits
+        self.max_attempts = max_attempts
+        self.buckets = {}
+        for name, (rate, burst) in limits.items():
+            rate = min(rate * share, rate_limit) if rate_limit else rate * share
+            self.buckets[name] = TokenBucket(rate, max(1, int(burst * share)))
+        self._stats = {name: {"requests": 0, "retries": 0, "throttled_seconds": 0.0, "backoff_seconds": 0.0}
+                       for name in limits}
+        self._stats_lock = threading.Lock()
+
+    def _record(self, name, **amounts):
+        with self._stats_lock:
+            for key, amount in amounts.items():
+                self._stats[name][key] += amount
+
+    def wait(self, name):
+        """Wait for the bucket of an endpoint class before sending a request."""
+
+        if name not in self.buckets:
+            return
+        self._record(name, requests=1, throttled_seconds=self.buckets[name].acquire())
+
+    def should_retry(self, name, method, status, attempt):
+        """Whether to retry a response; server errors are only retried for requests without side effects."""
+
+        if name not in self.buckets or attempt >= self.max_attempts or status not in RETRY_STATUSES:
+            return False
+        return status == 429 or method == "GET" or name == "graphql"
+
+    def delay(self, name, attempt, headers=None):
+        """Back off before retrying, pausing the whole endpoint class when the API asks for it."""
+
+        seconds = backoff(attempt)
+        asked = retry_after(headers)
+        if asked is not None:
+            seconds = asked + random.uniform(0, BACKOFF_BASE)
+            self.buckets[name].pause(seconds)
+        self._record(name, retries=1, backoff_seconds=seconds)
+        time.sleep(seconds)
+
+    def stats(self):
+        """Requests, retries and seconds spent throttled or backing off, per endpoint class."""
+
+        with self._stats_lock:
+            return {name: dict(values) for name, values in self._stats.items()}
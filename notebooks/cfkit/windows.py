@@ -0,0 +1,96 @@
+"""Split long time windows into sub-windows the GraphQL Analytics API can answer in one go.
+
+Long windows are split into sub-windows of a fixed size which are fetched concurrently. Any
+sub-window that comes back saturated (as many rows as the query limit) is split in half and fetched
+again, recursively, and the rows of every sub-window are stitched back in time order.
+
+Sub-windows are half-open (``[start, end)``), so queries should filter with ``*_geq`` and
+``*_lt``. Their boundaries are aligned on ``grain`` (e.g. one hour for ``datetimeHour``), so that
+no time bucket is ever split across two sub-windows.
+"""
+
+from datetime import datetime, timedelta
+
+from cfkit.concurrency import MAX_WORKERS, parallel_map
+from cfkit.pagination import PAGE_SIZE
+
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_time(value):
+    """Parse a ``2024-01-31T23:00:00Z`` time string (returned as a naive UTC datetime)."""
+
+    return value if isinstance(value, datetime) else datetime.strptime(value, TIME_FORMAT)
+
+
+def format_time(value):
+    return value.strftime(TIME_FORMAT)
+
+
+def _align(value, grain):
+    """Round ``value`` down to a multiple of ``grain``."""
+
+    return value - (value - _EPOCH) % grain
+
+
+def split_window(start, end, size, grain=timedelta(hours=1)):
+    """Split ``[start, end)`` into consecutive windows of at most ``size``, aligned on ``grain``.
+
+    Inner boundaries fall on multiples of ``size``, so the same windows come back from one run to
+    the next even though ``start`` and ``end`` move, and their responses can be cached.
+    """
+
+    start, end = parse_time(start), parse_time(end)
+    size = max(grain, _align(_EPOCH + size, grain) - _EPOCH)
+
+    windows = []
+    curr = start
+    while curr < end:
+        upper = min(end, _align(curr, size) + size)
+        windows.append((curr, upper))
+        curr = upper
+    return windows
+
+
+def _halves(window, grain):
+    start, end = window
+    middle = _align(start + (end - start) / 2, grain)
+    if middle <= start:
+        middle = _align(start, grain) + grain
+    if middle >= end:
+        return None
+    return [(start, middle), (middle, end)]
+
+
+def fetch_windowed(fetch_rows, start, end, size, grain=timedelta(hours=1), limit=PAGE_SIZE,
+                   max_workers=MAX_WORKERS, join=None):
+    """Fetch the rows of ``[start, end)`` in sub-windows, returning them in time order.
+
+    ``fetch_rows(start, end) -> rows`` queries a single sub-window, whose bounds are given as time
+    strings. A sub-window returning ``limit`` rows or more is split in half and fetched again.
+    ``join(parts)`` stitches the rows of consecutive sub-windows, by default concatenating lists
+    (e.g. ``pd.concat`` when sub-windows are fetched as DataFrames).
+    """
+
+    join = join or _join_lists
+
+    def fetch(window):
+        rows = fetch_rows(format_time(window[0]), format_time(window[1]))
+        if len(rows) < limit:
+            return rows
+
+        halves = _halves(window, grain)
+        if halves is None:
+            raise RuntimeError(f"More than {limit} rows between {format_time(window[0])} and "
+                               f"{format_time(window[1])}, which cannot be split any further")
+        return join(parallel_map(fetch, halves, max_workers))
+
+    windows = split_window(start, end, size, grain)
+    return join(parallel_map(fetch, windows, max_workers))
+
+
+def _join_lists(parts):
+    return [row for rows in parts for row in rows]
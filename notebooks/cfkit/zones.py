@@ -0,0 +1,81 @@
+"""Inventory of the zones of an account, with lookups by name and by id.
+
+Zones are listed 50 at a time (the most the API returns per page), every page after the first one
+being fetched concurrently. The inventory is kept on disk for ``max_age`` (see
+:class:`cfkit.lookup.LookupCache`), so later runs resolve zones without listing them again.
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+
+from cfkit.concurrency import MAX_WORKERS
+from cfkit.lookup import lookup_cache
+from cfkit.rest import list_all
+
+
+# Age after which zones are listed again, as they can be added, renamed or change plan
+MAX_AGE = timedelta(hours=1)
+# Most zones the API returns per page
+ZONES_PER_PAGE = 50
+# Fields kept for each zone, in the column order of the inventory table
+ZONE_FIELDS = ["name", "id", "plan_name", "status", "paused", "modified_on"]
+
+
+class ZoneInventory:
+    """Zones of an account, indexed by id and by (case-insensitive) name."""
+
+    def __init__(self, zones):
+        self.zones = sorted(zones, key=lambda zone: zone["name"])
+        self._by_id = {zone["id"]: zone for zone in self.zones}
+        self._by_name = {zone["name"].lower(): zone for zone in self.zones}
+
+    def __len__(self):
+        return len(self.zones)
+
+    def by_id(self, zone_id):
+        return self._by_id.get(zone_id)
+
+    def by_name(self, name):
+        return self._by_name.get(name.strip().lower().rstrip("."))
+
+    def resolve(self, value):
+        """Zone matching a name or an id (e.g. as typed in a form), or None."""
+
+        value = (value or "").strip()
+        return self.by_id(value) or self.by_name(value)
+
+    def frame(self):
+        """Every zone as a DataFrame, sorted by name."""
+
+        return pd.DataFrame({field: [zone[field] for zone in self.zones] for field in ZONE_FIELDS},
+                            columns=ZONE_FIELDS)
+
+
+def _zone_fields(zone):
+    return {
+        "name": zone["name"],
+        "id": zone["id"],
+        "plan_name": (zone.get("plan") or {}).get("name"),
+        "status": zone.get("status"),
+        "paused": zone.get("paused"),
+        "modified_on": zone.get("modified_on"),
+    }
+
+
+def list_zones(hostname, token, account_id, max_workers=MAX_WORKERS):
+    """Every zone of an account, as returned by the API."""
+
+    return list_all(f"{hostname}/client/v4/zones", token, per_page=ZONES_PER_PAGE,
+                    params={"account.id": account_id}, max_workers=max_workers)
+
+
+def zone_inventory(hostname, token, account_id, max_age=MAX_AGE, refresh=False, max_workers=MAX_WORKERS):
+    """Inventory of an account's zones, listed again only once older than ``max_age`` (or on ``refresh``)."""
+
+    cache = lookup_cache("zones", account_id, max_age=max_age)
+    zones = {} if refresh else cache.load()
+    if not zones:
+        zones = {zone["id"]: _zone_fields(zone) for zone in list_zones(hostname, token, account_id, max_workers)}
+        cache.save(zones)
+    return ZoneInventory(zones.values())
@@ -18,11 +18,27 @@ app = marimo.App(width="full", app_title="Cloudflare Notebook", auto_download=["
 # Login Cells #
 ###############
 @app.cell(hide_code=True)
-def _():
+async def _():
     # Helper Stub - click to view code
     import json, marimo as mo, requests, warnings, moutils, urllib, sys  # noqa: E401
     from moutils.oauth import PKCEFlow
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
+
+    if sys.platform == "emscripten":
+        # The cfkit helpers are not among the files of the WASM build, they are installed from the wheel
+        # exported next to the notebooks (see `make export`)
+        import micropip
+        try:
+            await micropip.install(str(mo.notebook_location() / "cfkit-0.1.0-py3-none-any.whl"))
+        except Exception as e:
+            raise RuntimeError("The cfkit helpers, which the cells below rely on, could not be installed "
+                               "from the wheel exported next to this notebook") from e
+    from cfkit.http import urlopen  # pooled, keep-alive replacement for urllib's urlopen
+    try:
+        from cfkit.headless import batch_account_id, batch_login, headless  # headless runs, see cfkit.batch
+    except ImportError:
+        batch_account_id = batch_login = lambda: None  # noqa: E731
+        headless = lambda: False  # noqa: E731
 
     debug = False
     warnings.filterwarnings("ignore", category=UserWarning, module="pkg_resources")
@@ -46,13 +62,13 @@ def _():
             print("Token invalid - Please login using the button above")
             if debug: print("[DEBUG] Exception:", e)
             return []
-    return PKCEFlow, Request, debug, get_accounts, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
+    return PKCEFlow, Request, batch_account_id, batch_login, debug, get_accounts, headless, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
 
 
 @app.cell(hide_code=True)
-def _(PKCEFlow):
+def _(PKCEFlow, batch_login):
     # Login to Cloudflare - click to view code
-    df = PKCEFlow(provider="cloudflare", use_new_tab=True)
+    df = batch_login() or PKCEFlow(provider="cloudflare", use_new_tab=True)
     df
     return df
 
@@ -67,10 +83,13 @@ async def _(debug, df, get_accounts, mo):
 
 
 @app.cell(hide_code=True)
-def _(accounts, df, mo, radio):
+def _(accounts, batch_account_id, df, mo, radio):
     # Select Account Stub - click to view code
     account_name = radio.value if radio.value else None
     account_id = (next((a["id"] for a in accounts if a["name"] == account_name), None) if accounts else None)
+    if batch_account_id():
+        account_id = batch_account_id()
+        account_name = next((a["name"] for a in accounts if a["id"] == account_id), account_id)
     mo.hstack(
         [
             radio,
@@ -97,11 +116,26 @@ def _(account_id, mo, proxy, df):
     import altair as alt
     from datetime import datetime, timedelta
     import pandas as pd
+    from cfkit.aggregate import group_totals, with_share
+    from cfkit.frames import rows_frame
+    from cfkit.graphql import fetch_graphql_windowed
 
     CF_ACCOUNT_ID = account_id  # After login, selected from list above
     CF_API_TOKEN = df.access_token  # Or a custom token from dash.cloudflare.com
     HOSTNAME = proxy
-    return CF_ACCOUNT_ID, CF_API_TOKEN, HOSTNAME, alt, datetime, pd, timedelta
+    return (
+        CF_ACCOUNT_ID,
+        CF_API_TOKEN,
+        HOSTNAME,
+        alt,
+        datetime,
+        fetch_graphql_windowed,
+        group_totals,
+        pd,
+        rows_frame,
+        timedelta,
+        with_share,
+    )
 
 
 @app.cell
@@ -125,7 +159,7 @@ def _(mo):
 
 
 @app.cell
-def _(CF_API_TOKEN, HOSTNAME, Request, json, urlopen):
+def _(CF_API_TOKEN, HOSTNAME, Request, json, urllib, urlopen):
     # Class used to prompt a given model
     class AIClient:
         def __init__(self, cf_account, cf_token, model_name):
@@ -146,13 +180,12 @@ def _(CF_API_TOKEN, HOSTNAME, Request, json, urlopen):
                           },
                           data=json.dumps(payload),
                           method='POST')
-            resp = urlopen(req)
-
-            if resp.getcode() == 200:
-                return json.load(resp)
-            else:
-                print(resp.text)
-                resp.raise_for_status()
+            # Rate limited calls are retried by urlopen, which raises on any other error
+            try:
+                return json.load(urlopen(req))
+            except urllib.error.HTTPError as e:
+                print(e.read().decode("utf-8", errors="replace"))
+                raise
 
     return (AIClient,)
 
@@ -284,7 +317,10 @@ def _(datetime, timedelta):
     curr_dt = datetime.now().replace(second=0, microsecond=0)
     end_dt = curr_dt.strftime("%Y-%m-%dT%H:%M:00Z")
     start_dt = (curr_dt - timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:00Z")
-    return end_dt, start_dt
+
+    # The interval is fetched in sub-intervals of this size, all at once
+    WINDOW_SIZE = timedelta(days=7)
+    return WINDOW_SIZE, end_dt, start_dt
 
 
 @app.cell
@@ -292,17 +328,17 @@ def _(
     CF_ACCOUNT_ID,
     CF_API_TOKEN,
     HOSTNAME,
-    Request,
+    WINDOW_SIZE,
     end_dt,
-    json,
+    fetch_graphql_windowed,
     start_dt,
-    urlopen,
+    timedelta,
 ):
     _QUERY_STR = """
-    query GetModelUsageOverTime($accountTag: string, $filter: filter) {
+    query GetModelUsageOverTime($accountTag: string, $dateStart: Time, $dateEnd: Time) {
       viewer {
         accounts(filter: {accountTag: $accountTag}) {
-          data: aiInferenceAdaptiveGroups(filter: {datetime_geq: $dateStart, datetime_leq: $dateEnd, neurons_gt: 0},
+          data: aiInferenceAdaptiveGroups(filter: {datetime_geq: $dateStart, datetime_lt: $dateEnd, neurons_gt: 0},
                                           orderBy: [date_ASC], limit: 10000) {
             sum {
               neurons: totalNeurons
@@ -317,58 +353,40 @@ def _(
     }
     """
 
-    _QUERY_VARIABLES = {
-        "accountTag": CF_ACCOUNT_ID,
-        "dateStart": start_dt,
-        "dateEnd": end_dt,
-    }
-
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_object_model_data = json.loads(_resp_raw)
-    return (json_object_model_data,)
+    # Sub-intervals are aligned on days (the `date` dimension), fetched concurrently, and split
+    # again if they return too many rows; query errors are raised along the way
+    model_usage_rows = fetch_graphql_windowed(
+        HOSTNAME,
+        CF_API_TOKEN,
+        {"query": _QUERY_STR},
+        "data",
+        start_dt,
+        end_dt,
+        lambda since, until: {"accountTag": CF_ACCOUNT_ID, "dateStart": since, "dateEnd": until},
+        size=WINDOW_SIZE,
+        grain=timedelta(days=1),
+    )
+    return (model_usage_rows,)
 
 
 @app.cell
-def _(json_object_model_data, pd):
-    if json_object_model_data["errors"] is None:
-        # Process model usage results
-        _rows = []
-        for _entry in json_object_model_data["data"]["viewer"]["accounts"][0]["data"]:
-            _curr_row = dict(
-                time=_entry["dimensions"]["ts"],
-                model=_entry["dimensions"]["modelId"],
-                neurons=_entry["sum"]["neurons"],
-            )
-            _rows.append(_curr_row)
-        df_model = pd.DataFrame(_rows)
-    else:
-        _error_msg = "\n - ".join(
-            [el["message"] for el in json_object_model_data["errors"]]
-        )
-        print(f"Obtained the following errors:\n - {_error_msg}")
-        raise Exception
+def _(model_usage_rows, rows_frame):
+    # Process model usage results
+    df_model = rows_frame(model_usage_rows, {
+        "dimensions.ts": "time",
+        "dimensions.modelId": "model",
+        "sum.neurons": "neurons",
+    })
     return (df_model,)
 
 
 @app.cell
-def _(alt, df_model):
+def _(alt, df_model, group_totals, headless, mo, with_share):
+    mo.stop(headless())
     _TOP_ENTRIES = 15
 
-    _df_model_agg = df_model.groupby("model").agg({"neurons": "sum"}).reset_index()
-    _df_model_agg = _df_model_agg.sort_values("neurons", ascending=False).reset_index(
-        drop=True
-    )
-    _df_model_agg["neuron_share"] = (
-        _df_model_agg["neurons"] / _df_model_agg["neurons"].sum() * 100
-    )
+    _df_model_agg = group_totals(df_model, "model", {"neurons": "sum"}, sort_by="neurons")
+    _df_model_agg = with_share(_df_model_agg, "neurons", "neuron_share")
 
     _df_model_agg = _df_model_agg.head(_TOP_ENTRIES)
 
@@ -393,7 +411,8 @@ def _(alt, df_model):
 
 
 @app.cell
-def _(alt, df_model):
+def _(alt, df_model, headless, mo):
+    mo.stop(headless())
     alt.Chart(df_model).mark_line().encode(
         alt.X("time:T", title="Date"),
         alt.Y("neurons:Q", title="Neurons"),
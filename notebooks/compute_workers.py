@@ -18,11 +18,27 @@ app = marimo.App(width="full", app_title="Cloudflare Notebook", auto_download=["
 # Login Cells #
 ###############
 @app.cell(hide_code=True)
-def _():
+async def _():
     # Helper Stub - click to view code
     import json, marimo as mo, requests, warnings, moutils, urllib, sys  # noqa: E401
     from moutils.oauth import PKCEFlow
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
+
+    if sys.platform == "emscripten":
+        # The cfkit helpers are not among the files of the WASM build, they are installed from the wheel
+        # exported next to the notebooks (see `make export`)
+        import micropip
+        try:
+            await micropip.install(str(mo.notebook_location() / "cfkit-0.1.0-py3-none-any.whl"))
+        except Exception as e:
+            raise RuntimeError("The cfkit helpers, which the cells below rely on, could not be installed "
+                               "from the wheel exported next to this notebook") from e
+    from cfkit.http import urlopen  # pooled, keep-alive replacement for urllib's urlopen
+    try:
+        from cfkit.headless import batch_account_id, batch_login, headless  # headless runs, see cfkit.batch
+    except ImportError:
+        batch_account_id = batch_login = lambda: None  # noqa: E731
+        headless = lambda: False  # noqa: E731
 
     debug = False
     warnings.filterwarnings("ignore", category=UserWarning, module="pkg_resources")
@@ -46,13 +62,13 @@ def _():
             print("Token invalid - Please login using the button above")
             if debug: print("[DEBUG] Exception:", e)
             return []
-    return PKCEFlow, Request, debug, get_accounts, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
+    return PKCEFlow, Request, batch_account_id, batch_login, debug, get_accounts, headless, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
 
 
 @app.cell(hide_code=True)
-def _(PKCEFlow):
+def _(PKCEFlow, batch_login):
     # Login to Cloudflare - click to view code
-    df = PKCEFlow(provider="cloudflare", use_new_tab=True)
+    df = batch_login() or PKCEFlow(provider="cloudflare", use_new_tab=True)
     df
     return df
 
@@ -67,10 +83,13 @@ async def _(debug, df, get_accounts, mo):
 
 
 @app.cell(hide_code=True)
-def _(accounts, df, mo, radio):
+def _(accounts, batch_account_id, df, mo, radio):
     # Select Account Stub - click to view code
     account_name = radio.value if radio.value else None
     account_id = (next((a["id"] for a in accounts if a["name"] == account_name), None) if accounts else None)
+    if batch_account_id():
+        account_id = batch_account_id()
+        account_name = next((a["name"] for a in accounts if a["id"] == account_id), account_id)
     mo.hstack(
         [
             radio,
@@ -97,11 +116,27 @@ def _(account_id, mo, proxy, df):
     import altair as alt
     from datetime import datetime, timedelta
     import pandas as pd
+    from cfkit.aggregate import group_totals
+    from cfkit.graphql import stream_graphql_pages
+    from cfkit.series import SeriesStore
+    from cfkit.sketch import sketch_quantiles
 
     CF_ACCOUNT_ID = account_id  # After login, selected from list above
     CF_API_TOKEN = df.access_token  # Or a custom token from dash.cloudflare.com
     HOSTNAME = proxy
-    return CF_ACCOUNT_ID, CF_API_TOKEN, HOSTNAME, alt, datetime, pd, timedelta
+    return (
+        CF_ACCOUNT_ID,
+        CF_API_TOKEN,
+        HOSTNAME,
+        SeriesStore,
+        alt,
+        datetime,
+        group_totals,
+        pd,
+        sketch_quantiles,
+        stream_graphql_pages,
+        timedelta,
+    )
 
 
 @app.cell
@@ -131,21 +166,14 @@ def _(datetime, timedelta):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    end_dt,
-    json,
-    start_dt,
-    urlopen,
-):
+def _(CF_ACCOUNT_ID, end_dt, start_dt):
+    # Rows are ordered by hour and worker, so that results past the 10000 rows limit can be fetched
+    # in pages, each one starting where the previous one ended
     _QUERY_STR = """
     query getServiceRequestsQuery($accountTag: string, $filter: ZoneWorkersRequestsFilter_InputObject) {
       viewer {
         accounts(filter: {accountTag: $accountTag}) {
-          workersInvocationsAdaptive(limit: 10000, filter: $filter) {
+          workersInvocationsAdaptive(limit: 10000, filter: $filter, orderBy: [datetimeHour_ASC, scriptName_ASC]) {
             sum {
               errors
               clientDisconnects
@@ -178,18 +206,6 @@ def _(
               scriptVersion
             }
           }
-          workersSubrequestsAdaptiveGroups(limit: 10000, filter: $filter) {
-            sum {
-              requestBodySizeUncached
-              subrequests
-            }
-            dimensions {
-              usageModel
-              datetimeHour
-              cacheStatus
-              scriptVersion
-            }
-          }
         }
       }
     }
@@ -200,17 +216,8 @@ def _(
         "filter": {"AND": [{"datetimeHour_leq": end_dt, "datetimeHour_geq": start_dt}]},
     }
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_worker_data = json.loads(_resp_raw)
-    return (json_worker_data,)
+    query_workers = {"query": _QUERY_STR, "variables": _QUERY_VARIABLES}
+    return (query_workers,)
 
 
 @app.cell
@@ -224,57 +231,84 @@ def _(mo):
         Results are returned on a hourly basis, so here is how these metrics are aggregated:<br>
          - requests are summed;<br>
          - dash combines both errors and disconnects, here we show them standalone, summed as well;<br>
-         - cpu time is averaged out of all hourly 50th percentiles.
+         - the median (and 99th percentile) cpu time of the whole day is estimated by merging the distributions
+         described by the hourly quantiles, weighted by requests.
         """
     )
     return
 
 
 @app.cell
-def _(json_worker_data, pd):
+def _(CF_API_TOKEN, HOSTNAME, group_totals, pd, query_workers, sketch_quantiles, stream_graphql_pages):
     # Format results into hourly metrics per obtained worker
-    _all_rows = []
-    for el in json_worker_data["data"]["viewer"]["accounts"][0][
-        "workersInvocationsAdaptive"
-    ]:
-        _curr_row = dict(
-            time=el["dimensions"]["datetimeHour"],
-            worker=el["dimensions"]["scriptName"],
-            requests=el["sum"]["requests"],
-            errors=el["sum"]["errors"],
-            disconnects=el["sum"]["clientDisconnects"],
-            subrequests=el["sum"]["subrequests"],
-            cpu_time=el["quantiles"]["cpuTimeP50"],
-        )
-        _all_rows.append(_curr_row)
-    df_worker = pd.DataFrame(_all_rows)
+    # Each page of results is turned into columns while it is read
+    _columns = {
+        "dimensions.datetimeHour": "time",
+        "dimensions.scriptName": "worker",
+        "dimensions.status": "status",
+        "sum.requests": "requests",
+        "sum.errors": "errors",
+        "sum.clientDisconnects": "disconnects",
+        "sum.subrequests": "subrequests",
+        "quantiles.cpuTimeP50": "cpu_time",
+        "quantiles.cpuTimeP75": "cpu_time_p75",
+        "quantiles.cpuTimeP99": "cpu_time_p99",
+        "quantiles.cpuTimeP999": "cpu_time_p999",
+    }
+    _frames = list(stream_graphql_pages(HOSTNAME, CF_API_TOKEN, query_workers, "workersInvocationsAdaptive",
+                                        _columns, cursor=["datetimeHour", "scriptName"]))
+    df_worker = pd.concat(_frames, ignore_index=True)
 
     # For top entries bar chart
-    df_worker_agg = (
-        df_worker.groupby("worker")
-        .agg(
-            {
-                "requests": "sum",
-                "errors": "sum",
-                "disconnects": "sum",
-                "cpu_time": "mean",
-            }
-        )
-        .reset_index()
+    df_worker_agg = group_totals(
+        df_worker,
+        "worker",
+        {
+            "requests": "sum",
+            "errors": "sum",
+            "disconnects": "sum",
+        },
     )
-    df_worker_agg["cpu_time"] /= 1000
-    return (df_worker_agg,)
+
+    # Percentiles cannot be averaged across hours, the hourly distributions are merged instead
+    _cpu_time = sketch_quantiles(
+        df_worker,
+        "worker",
+        {0.5: "cpu_time", 0.75: "cpu_time_p75", 0.99: "cpu_time_p99", 0.999: "cpu_time_p999"},
+        "requests",
+        percentiles=(0.5, 0.99),
+    ).rename(columns={"p50": "cpu_time", "p99": "cpu_time_p99"})
+    df_worker_agg = df_worker_agg.merge(_cpu_time, on="worker", how="left")
+    df_worker_agg[["cpu_time", "cpu_time_p99"]] /= 1000
+    return df_worker, df_worker_agg
 
 
 @app.cell
-def _(alt, df_worker_agg):
+def _(df_worker_agg):
     _TOP_N = 5
 
     # To prevent large query results, we only store the top 5 for comparison of top entries
+    TOP_REQUESTS_WORKERS = list(df_worker_agg.sort_values("requests", ascending=False).head(_TOP_N)["worker"].values)
+    TOP_ERRORS_WORKERS = list(df_worker_agg.sort_values("errors", ascending=False).head(_TOP_N)["worker"].values)
+    TOP_DISCONNECTS_WORKERS = list(
+        df_worker_agg.sort_values("disconnects", ascending=False).head(_TOP_N)["worker"].values
+    )
+    TOP_CPU_TIME_WORKERS = list(df_worker_agg.sort_values("cpu_time", ascending=False).head(_TOP_N)["worker"].values)
+    return (
+        TOP_CPU_TIME_WORKERS,
+        TOP_DISCONNECTS_WORKERS,
+        TOP_ERRORS_WORKERS,
+        TOP_REQUESTS_WORKERS,
+    )
+
+
+@app.cell
+def _(alt, df_worker_agg, headless, mo):
+    mo.stop(headless())
+    _TOP_N = 5
 
     # Workers with most requests
     _top_requests = df_worker_agg.sort_values("requests", ascending=False).head(_TOP_N)
-    TOP_REQUESTS_WORKERS = list(_top_requests.head(5)["worker"].values)
     _requests_chart = (
         alt.Chart(_top_requests)
         .mark_bar()
@@ -290,7 +324,6 @@ def _(alt, df_worker_agg):
 
     # Workers with most errors
     _top_errors = df_worker_agg.sort_values("errors", ascending=False).head(_TOP_N)
-    TOP_ERRORS_WORKERS = list(_top_errors.head(5)["worker"].values)
     _errors_chart = (
         alt.Chart(_top_errors)
         .mark_bar()
@@ -308,7 +341,6 @@ def _(alt, df_worker_agg):
     _top_disconnects = df_worker_agg.sort_values("disconnects", ascending=False).head(
         _TOP_N
     )
-    TOP_DISCONNECTS_WORKERS = list(_top_disconnects.head(5)["worker"].values)
     _disconnects_chart = (
         alt.Chart(_top_disconnects)
         .mark_bar()
@@ -324,7 +356,6 @@ def _(alt, df_worker_agg):
 
     # Workers with highest median CPU time
     _top_cpu = df_worker_agg.sort_values("cpu_time", ascending=False).head(_TOP_N)
-    TOP_CPU_TIME_WORKERS = list(_top_cpu.head(5)["worker"].values)
     _cpu_chart = (
         alt.Chart(_top_cpu)
         .mark_bar()
@@ -339,12 +370,7 @@ def _(alt, df_worker_agg):
     )
 
     (_requests_chart | _errors_chart) & (_disconnects_chart | _cpu_chart)
-    return (
-        TOP_CPU_TIME_WORKERS,
-        TOP_DISCONNECTS_WORKERS,
-        TOP_ERRORS_WORKERS,
-        TOP_REQUESTS_WORKERS,
-    )
+    return
 
 
 @app.cell
@@ -372,42 +398,50 @@ def _(mo):
     return
 
 
-@app.cell
-def _(mo):
-    mo.md(r"""### Workers with the most requests""")
-    return
-
-
 @app.cell
 def _(
     CF_ACCOUNT_ID,
     CF_API_TOKEN,
     HOSTNAME,
-    Request,
+    SeriesStore,
+    TOP_CPU_TIME_WORKERS,
+    TOP_DISCONNECTS_WORKERS,
+    TOP_ERRORS_WORKERS,
     TOP_REQUESTS_WORKERS,
+    df_worker,
     end_dt,
-    json,
+    pd,
     start_dt,
-    urlopen,
+    stream_graphql_pages,
+    timedelta,
 ):
+    # Grain of the time series compared below: hourly (or coarser) ones are derived from the ranking
+    # data fetched above, finer ones (e.g. 15 minutes) need another query
+    _DRILLDOWN_GRAIN = timedelta(hours=1)
+
+    # The top workers of each metric largely overlap, so every metric is fetched at once for all of them,
+    # then split into the time series compared below
     _QUERY_STR = """
-    query GetWorkerRequests($accountTag: string!,
-                            $datetimeStart: Time,
-                            $datetimeEnd: Time,
-                            $scriptNames: [string]) {
+    query GetWorkerDrillDown($accountTag: string!, $filter: ZoneWorkersRequestsFilter_InputObject) {
       viewer {
         accounts(filter: {accountTag: $accountTag}) {
-          workersInvocationsAdaptive(limit: 10000, filter: {
-              scriptName_in: $scriptNames,
-              datetime_geq: $datetimeStart,
-              datetime_leq: $datetimeEnd},
-            orderBy: [datetimeFifteenMinutes_ASC]) {
+          workersInvocationsAdaptive(limit: 10000, filter: $filter,
+            orderBy: [datetimeFifteenMinutes_ASC, scriptName_ASC]) {
             sum {
               requests
+              errors
+              clientDisconnects
+            }
+            quantiles {
+              cpuTimeP50
+              cpuTimeP75
+              cpuTimeP99
+              cpuTimeP999
             }
             dimensions {
               datetimeFifteenMinutes
               scriptName
+              status
             }
           }
         }
@@ -415,49 +449,80 @@ def _(
     }
     """
 
-    _QUERY_VARIABLES = {
-        "accountTag": CF_ACCOUNT_ID,
-        "datetimeStart": start_dt,
-        "datetimeEnd": end_dt,
-        "scriptNames": TOP_REQUESTS_WORKERS,
-    }
+    _script_names = sorted(set(TOP_REQUESTS_WORKERS + TOP_ERRORS_WORKERS + TOP_DISCONNECTS_WORKERS
+                               + TOP_CPU_TIME_WORKERS))
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
+    # Fetched by 15 minutes, the finest grain used here, and rolled up for the grains in between
+    def _fetch_drilldown(grain):
+        _QUERY_VARIABLES = {
+            "accountTag": CF_ACCOUNT_ID,
+            "filter": {"AND": [{"scriptName_in": _script_names, "datetime_geq": start_dt, "datetime_leq": end_dt}]},
+        }
+        _columns = {
+            "dimensions.datetimeFifteenMinutes": "time",
+            "dimensions.scriptName": "worker",
+            "dimensions.status": "status",
+            "sum.requests": "requests",
+            "sum.errors": "errors",
+            "sum.clientDisconnects": "disconnects",
+            "quantiles.cpuTimeP50": "cpuTimeP50",
+            "quantiles.cpuTimeP75": "cpu_time_p75",
+            "quantiles.cpuTimeP99": "cpu_time_p99",
+            "quantiles.cpuTimeP999": "cpu_time_p999",
+        }
+        _document = {"query": _QUERY_STR, "variables": _QUERY_VARIABLES}
+        _frames = list(stream_graphql_pages(HOSTNAME, CF_API_TOKEN, _document, "workersInvocationsAdaptive",
+                                            _columns, cursor=["datetimeFifteenMinutes", "scriptName"]))
+        _frame = pd.concat(_frames, ignore_index=True)
+        _frame["time"] = pd.to_datetime(_frame["time"], format="%Y-%m-%dT%H:%M:00Z")
+        return _failed_only(_frame)
+
+    # Errors and disconnects are only counted for invocations that did not succeed (status_neq: "success"),
+    # while requests and CPU time cover all of them
+    def _failed_only(frame):
+        _failed = frame["status"] != "success"
+        return frame.assign(errors=frame["errors"].where(_failed, 0),
+                            disconnects=frame["disconnects"].where(_failed, 0))
+
+    # Hourly rows of the ranking are per worker, status and version, summed up by the store
+    _workers_series = SeriesStore()
+    _workers_series.add(
+        _failed_only(df_worker.rename(columns={"cpu_time": "cpuTimeP50"}))
+        .assign(time=pd.to_datetime(df_worker["time"], format="%Y-%m-%dT%H:%M:%SZ")),
+        timedelta(hours=1),
+    )
+    df_workers_drilldown = _workers_series.series(
+        _DRILLDOWN_GRAIN,
+        "worker",
+        {"requests": "sum", "errors": "sum", "disconnects": "sum"},
+        # Medians cannot be summed or averaged, they are read from the distributions rebuilt from
+        # the quantiles of every row, merged for each bucket (see cfkit.sketch)
+        quantiles={0.5: "cpuTimeP50", 0.75: "cpu_time_p75", 0.99: "cpu_time_p99", 0.999: "cpu_time_p999"},
+        count="requests",
+        where={"worker": _script_names},
+        fetch=_fetch_drilldown,
+    )
+    df_workers_drilldown["time"] = df_workers_drilldown["time"].astype("datetime64[s]")
+    return (df_workers_drilldown,)
 
-    json_request_data = json.loads(_resp_raw)
-    return (json_request_data,)
+
+@app.cell
+def _(mo):
+    mo.md(r"""### Workers with the most requests""")
+    return
 
 
 @app.cell
-def _(json_request_data, pd):
-    # Format data into wide format
-    _all_rows = []
-    for _el in json_request_data["data"]["viewer"]["accounts"][0][
-        "workersInvocationsAdaptive"
-    ]:
-        _curr_row = dict(
-            time=_el["dimensions"]["datetimeFifteenMinutes"],
-            worker=_el["dimensions"]["scriptName"],
-            requests=_el["sum"]["requests"],
-        )
-        _all_rows.append(_curr_row)
-    df_workers_requests = pd.DataFrame(_all_rows)
-    df_workers_requests["time"] = pd.to_datetime(
-        df_workers_requests["time"], format="%Y-%m-%dT%H:%M:00Z"
-    ).astype("datetime64[s]")
-    df_workers_requests = df_workers_requests.sort_values(["time", "worker"])
+def _(TOP_REQUESTS_WORKERS, df_workers_drilldown):
+    df_workers_requests = df_workers_drilldown.loc[
+        df_workers_drilldown["worker"].isin(TOP_REQUESTS_WORKERS), ["time", "worker", "requests"]
+    ].reset_index(drop=True)
     return (df_workers_requests,)
 
 
 @app.cell
-def _(alt, df_workers_requests):
+def _(alt, df_workers_requests, headless, mo):
+    mo.stop(headless())
     alt.Chart(df_workers_requests).mark_line().encode(
         alt.X("time", title="Time (UTC)"),
         alt.Y("requests", title="Requests"),
@@ -474,7 +539,7 @@ def _(mo):
         r"""
         ### Workers with the most errors and disconnects
 
-        The bellow code fetches errors and disconnects for both the top workers with most errors,
+        The bellow code selects errors and disconnects for both the top workers with most errors,
         as well as the top workers with the most disconnects.
         """
     )
@@ -482,90 +547,18 @@ def _(mo):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    TOP_DISCONNECTS_WORKERS,
-    TOP_ERRORS_WORKERS,
-    end_dt,
-    json,
-    start_dt,
-    urlopen,
-):
-    _QUERY_STR = """
-    query GetWorkerRequests($accountTag: string!,
-                            $datetimeStart: Time,
-                            $datetimeEnd: Time,
-                            $scriptNames: [string]) {
-      viewer {
-        accounts(filter: {accountTag: $accountTag}) {
-          workersInvocationsAdaptive(limit: 10000, filter: {
-              scriptName_in: $scriptNames,
-              status_neq: "success",
-              datetime_geq: $datetimeStart,
-              datetime_leq: $datetimeEnd
-          }, orderBy: [datetimeFifteenMinutes_ASC]) {
-            sum {
-              errors
-              clientDisconnects
-            }
-            dimensions {
-              datetimeFifteenMinutes
-              scriptName
-            }
-          }
-        }
-      }
-    }
-    """
-
-    _QUERY_VARIABLES = {
-        "accountTag": CF_ACCOUNT_ID,
-        "datetimeStart": start_dt,
-        "datetimeEnd": end_dt,
-        # Unique set of workers with most errors and disconnects
-        "scriptNames": list(set(TOP_DISCONNECTS_WORKERS + TOP_ERRORS_WORKERS)),
-    }
-
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_error_data = json.loads(_resp_raw)
-    return (json_error_data,)
-
-
-@app.cell
-def _(json_error_data, pd):
-    # Format data into wide format
-    _all_rows = []
-    for _el in json_error_data["data"]["viewer"]["accounts"][0][
-        "workersInvocationsAdaptive"
-    ]:
-        _curr_row = dict(
-            time=_el["dimensions"]["datetimeFifteenMinutes"],
-            worker=_el["dimensions"]["scriptName"],
-            errors=_el["sum"]["errors"],
-            disconnects=_el["sum"]["clientDisconnects"],
-        )
-        _all_rows.append(_curr_row)
-    df_workers_errors = pd.DataFrame(_all_rows)
-    df_workers_errors["time"] = pd.to_datetime(
-        df_workers_errors["time"], format="%Y-%m-%dT%H:%M:00Z"
-    ).astype("datetime64[s]")
-    df_workers_errors = df_workers_errors.sort_values(["time", "worker"])
+def _(TOP_DISCONNECTS_WORKERS, TOP_ERRORS_WORKERS, df_workers_drilldown):
+    # Both the workers with most errors and those with most disconnects
+    df_workers_errors = df_workers_drilldown.loc[
+        df_workers_drilldown["worker"].isin(TOP_ERRORS_WORKERS + TOP_DISCONNECTS_WORKERS),
+        ["time", "worker", "errors", "disconnects"],
+    ].reset_index(drop=True)
     return (df_workers_errors,)
 
 
 @app.cell
-def _(TOP_ERRORS_WORKERS, alt, df_workers_errors):
+def _(TOP_ERRORS_WORKERS, alt, df_workers_errors, headless, mo):
+    mo.stop(headless())
     _df_errors_only = df_workers_errors.loc[
         df_workers_errors["worker"].isin(TOP_ERRORS_WORKERS)
     ]
@@ -578,7 +571,8 @@ def _(TOP_ERRORS_WORKERS, alt, df_workers_errors):
 
 
 @app.cell
-def _(TOP_DISCONNECTS_WORKERS, alt, df_workers_errors):
+def _(TOP_DISCONNECTS_WORKERS, alt, df_workers_errors, headless, mo):
+    mo.stop(headless())
     _df_errors_only = df_workers_errors.loc[
         df_workers_errors["worker"].isin(TOP_DISCONNECTS_WORKERS)
     ]
@@ -606,85 +600,16 @@ def _(mo):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    TOP_CPU_TIME_WORKERS,
-    end_dt,
-    json,
-    start_dt,
-    urlopen,
-):
-    _QUERY_STR = """
-    query GetWorkerCPUTime($accountTag: string!,
-                           $datetimeStart: Time,
-                           $datetimeEnd: Time,
-                           $scriptNames: [string]) {
-      viewer {
-        accounts(filter: {accountTag: $accountTag}) {
-          workersInvocationsAdaptive(limit: 10000, filter: {
-              scriptName_in: $scriptNames,
-              datetime_geq: $datetimeStart,
-              datetime_leq: $datetimeEnd
-              }, orderBy: [datetimeFifteenMinutes_ASC]) {
-            quantiles {
-              cpuTimeP50
-            }
-            dimensions {
-              datetimeFifteenMinutes
-              scriptName
-            }
-          }
-        }
-      }
-    }
-    """
-
-    _QUERY_VARIABLES = {
-        "accountTag": CF_ACCOUNT_ID,
-        "datetimeStart": start_dt,
-        "datetimeEnd": end_dt,
-        "scriptNames": TOP_CPU_TIME_WORKERS,
-    }
-
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_cpu_data = json.loads(_resp_raw)
-    return (json_cpu_data,)
-
-
-@app.cell
-def _(json_cpu_data, pd):
-    # Format data into wide format
-    _all_rows = []
-    for _el in json_cpu_data["data"]["viewer"]["accounts"][0][
-        "workersInvocationsAdaptive"
-    ]:
-        _curr_row = dict(
-            time=_el["dimensions"]["datetimeFifteenMinutes"],
-            worker=_el["dimensions"]["scriptName"],
-            cpuTimeP50=_el["quantiles"]["cpuTimeP50"],
-        )
-        _all_rows.append(_curr_row)
-    df_workers_cputime = pd.DataFrame(_all_rows)
-    df_workers_cputime["time"] = pd.to_datetime(
-        df_workers_cputime["time"], format="%Y-%m-%dT%H:%M:00Z"
-    ).astype("datetime64[s]")
-    df_workers_cputime = df_workers_cputime.sort_values(["time", "worker"])
+def _(TOP_CPU_TIME_WORKERS, df_workers_drilldown):
+    df_workers_cputime = df_workers_drilldown.loc[
+        df_workers_drilldown["worker"].isin(TOP_CPU_TIME_WORKERS), ["time", "worker", "cpuTimeP50"]
+    ].reset_index(drop=True)
     return (df_workers_cputime,)
 
 
 @app.cell
-def _(alt, df_workers_cputime):
+def _(alt, df_workers_cputime, headless, mo):
+    mo.stop(headless())
     alt.Chart(df_workers_cputime).mark_line().encode(
         alt.X("time", title="Time (UTC)"),
         alt.Y("cpuTimeP50", title="CPU time (P50)"),
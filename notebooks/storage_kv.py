@@ -18,11 +18,27 @@ app = marimo.App(width="full", app_title="Cloudflare Notebook", auto_download=["
 # Login Cells #
 ###############
 @app.cell(hide_code=True)
-def _():
+async def _():
     # Helper Stub - click to view code
     import json, marimo as mo, requests, warnings, moutils, urllib, sys  # noqa: E401
     from moutils.oauth import PKCEFlow
-    from urllib.request import Request, urlopen
+    from urllib.request import Request
+
+    if sys.platform == "emscripten":
+        # The cfkit helpers are not among the files of the WASM build, they are installed from the wheel
+        # exported next to the notebooks (see `make export`)
+        import micropip
+        try:
+            await micropip.install(str(mo.notebook_location() / "cfkit-0.1.0-py3-none-any.whl"))
+        except Exception as e:
+            raise RuntimeError("The cfkit helpers, which the cells below rely on, could not be installed "
+                               "from the wheel exported next to this notebook") from e
+    from cfkit.http import urlopen  # pooled, keep-alive replacement for urllib's urlopen
+    try:
+        from cfkit.headless import batch_account_id, batch_login, headless  # headless runs, see cfkit.batch
+    except ImportError:
+        batch_account_id = batch_login = lambda: None  # noqa: E731
+        headless = lambda: False  # noqa: E731
 
     debug = False
     warnings.filterwarnings("ignore", category=UserWarning, module="pkg_resources")
@@ -46,13 +62,13 @@ def _():
             print("Token invalid - Please login using the button above")
             if debug: print("[DEBUG] Exception:", e)
             return []
-    return PKCEFlow, Request, debug, get_accounts, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
+    return PKCEFlow, Request, batch_account_id, batch_login, debug, get_accounts, headless, is_wasm, json, mo, moutils, proxy, requests, sys, urllib, urlopen, warnings
 
 
 @app.cell(hide_code=True)
-def _(PKCEFlow):
+def _(PKCEFlow, batch_login):
     # Login to Cloudflare - click to view code
-    df = PKCEFlow(provider="cloudflare", use_new_tab=True)
+    df = batch_login() or PKCEFlow(provider="cloudflare", use_new_tab=True)
     df
     return df
 
@@ -67,10 +83,13 @@ async def _(debug, df, get_accounts, mo):
 
 
 @app.cell(hide_code=True)
-def _(accounts, df, mo, radio):
+def _(accounts, batch_account_id, df, mo, radio):
     # Select Account Stub - click to view code
     account_name = radio.value if radio.value else None
     account_id = (next((a["id"] for a in accounts if a["name"] == account_name), None) if accounts else None)
+    if batch_account_id():
+        account_id = batch_account_id()
+        account_name = next((a["name"] for a in accounts if a["id"] == account_id), account_id)
     mo.hstack(
         [
             radio,
@@ -95,7 +114,31 @@ def _():
     import altair as alt
     from datetime import datetime, timedelta
     import pandas as pd
-    return alt, datetime, pd, timedelta
+    from cfkit.aggregate import top_n_other, with_share
+    from cfkit.frames import rows_frame
+    from cfkit.graphql import fetch_graphql, paginate_graphql, stream_graphql
+    from cfkit.lookup import lookup_cache
+    from cfkit.pagination import selection_rows
+    from cfkit.planner import QueryPlan, Selection
+    from cfkit.rest import fetch_result, list_all
+    return (
+        QueryPlan,
+        Selection,
+        alt,
+        datetime,
+        fetch_graphql,
+        fetch_result,
+        list_all,
+        lookup_cache,
+        paginate_graphql,
+        pd,
+        rows_frame,
+        selection_rows,
+        stream_graphql,
+        timedelta,
+        top_n_other,
+        with_share,
+    )
 
 
 @app.cell
@@ -107,10 +150,9 @@ def _(mo):
         In this notebook, we will explore KV logs, where we will make use of the GraphQL API to obtain KV insights
         and rank entries by most requests, whether they are `read`, `write` and `list` requests.
 
-        <b style='color: tomato'>Warning:</b> by default this notebook will fetch at most 500 KV entries from a given
-        account, whilst other entries will be grouped into an "Other" entry. This number can be increased by
-        increasing the `_MAX_PAGE_REQUESTS` variable, which dictates how many hundreds of KV name - Id pairs
-        are obtained from the API.
+        <b style='color: tomato'>Note:</b> KV names are listed 100 at a time, and all pages after the first one
+        are fetched concurrently, so accounts with thousands of KVs are fully listed. KVs that could not be
+        found (e.g. deleted since) are grouped into an "Other" entry.
 
         **Prerequisites:**<br>
          - API token (see [here](https://developers.cloudflare.com/fundamentals/api/get-started/create-token/)
@@ -141,21 +183,14 @@ def _(mo):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    end_dt,
-    json,
-    start_dt,
-    urlopen,
-):
+def _(CF_ACCOUNT_ID, end_dt, start_dt):
+    # Rows are ordered by KV and action type, so that results past the 10000 rows limit can be
+    # fetched in pages, each one starting where the previous one ended
     _QUERY_STR = """
     query KVOperationsSummary($accountTag: string!, $filter: AccountKVOperationsAdaptiveGroupsFilter_InputObject) {
       viewer {
         accounts(filter: {accountTag: $accountTag}) {
-          kvOperationsAdaptiveGroups(limit: 10000, filter: $filter) {
+          kvOperationsAdaptiveGroups(limit: 10000, filter: $filter, orderBy: [namespaceId_ASC, actionType_ASC]) {
             count
             sum {
               requests
@@ -175,17 +210,96 @@ def _(
         "filter": {"AND": [{"datetimeHour_leq": end_dt, "datetimeHour_geq": start_dt}]},
     }
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
+    query_kv = {"query": _QUERY_STR, "variables": _QUERY_VARIABLES}
+    return (query_kv,)
+
 
-    json_kv_data = json.loads(_resp_raw)
-    return (json_kv_data,)
+@app.cell
+def _(CF_ACCOUNT_ID, QueryPlan, Selection, end_dt, start_dt):
+    # Ranking mode: with "server", only the top KVs of each action type are requested, along with
+    # the total requests per action type, from which the remaining KVs are summed as "Other"
+    # With "client", every KV is fetched and ranked here (see query_kv above)
+    KV_RANKING = "server"
+    KV_TOP_N = 5
+    KV_ACTION_TYPES = ["read", "write", "list", "delete"]
+    # Stands in for the KV Id of the "Other" entry, which is not a KV
+    KV_OTHER = "Other"
+
+    _time_filter = {"datetimeHour_geq": start_dt, "datetimeHour_leq": end_dt}
+    query_kv_rank = QueryPlan(
+        "accounts",
+        {"accountTag": CF_ACCOUNT_ID},
+        {
+            "top": [
+                Selection(
+                    _action_type,
+                    "kvOperationsAdaptiveGroups",
+                    filter={**_time_filter, "actionType": _action_type},
+                    fields={"sum": ["requests"], "dimensions": ["namespaceId"]},
+                    order_by=["sum_requests_DESC"],
+                    limit=KV_TOP_N,
+                )
+                for _action_type in KV_ACTION_TYPES
+            ],
+            "totals": [
+                Selection(
+                    "totals",
+                    "kvOperationsAdaptiveGroups",
+                    filter=_time_filter,
+                    fields={"sum": ["requests"], "dimensions": ["actionType"]},
+                )
+            ],
+        },
+        merge=False,
+    )
+    return KV_ACTION_TYPES, KV_OTHER, KV_RANKING, KV_TOP_N, query_kv_rank
+
+
+@app.cell
+def _(
+    CF_API_TOKEN,
+    HOSTNAME,
+    KV_ACTION_TYPES,
+    KV_OTHER,
+    KV_RANKING,
+    fetch_graphql,
+    paginate_graphql,
+    pd,
+    query_kv,
+    query_kv_rank,
+    rows_frame,
+    selection_rows,
+):
+    # Format results into requests per obtained kv
+    _columns = {"dimensions.namespaceId": "kv", "dimensions.actionType": "action_type", "sum.requests": "requests"}
+
+    if KV_RANKING == "server":
+        # Top KVs of each action type, plus an "Other" entry (see KV_OTHER) for the remaining requests
+        _responses = fetch_graphql(HOSTNAME, CF_API_TOKEN, query_kv_rank)
+        _totals = {
+            _el["dimensions"]["actionType"]: _el["sum"]["requests"]
+            for _el in selection_rows(_responses["totals"], "totals")
+        }
+
+        _frames = []
+        for _action_type in KV_ACTION_TYPES:
+            _top = rows_frame(selection_rows(_responses["top"], _action_type),
+                              {"dimensions.namespaceId": "kv", "sum.requests": "requests"},
+                              action_type=_action_type)
+            _frames.append(_top)
+            _other = _totals.get(_action_type, 0) - _top["requests"].sum()
+            if _other > 0:
+                _frames.append(pd.DataFrame({"kv": [KV_OTHER], "requests": [_other], "action_type": [_action_type]}))
+    else:
+        # Each page of results is formatted as soon as it is received
+        _frames = [
+            rows_frame(_page, _columns)
+            for _page in paginate_graphql(HOSTNAME, CF_API_TOKEN, query_kv, "kvOperationsAdaptiveGroups",
+                                          cursor=["namespaceId", "actionType"])
+        ]
+
+    df_kv_requests = pd.concat(_frames, ignore_index=True)[list(_columns.values())]
+    return (df_kv_requests,)
 
 
 @app.cell
@@ -195,8 +309,9 @@ def _(mo):
         It's important to note that the query itself may not return KVs that did not register any type of request
         during our time interval.
 
-        The query returns the KV Ids. To make results more readable, we will also perform an API call to obtain the
-        name:
+        The query returns the KV Ids. To make results more readable, we will also perform API calls to obtain the
+        names. Names are kept on disk between runs, so only KVs never seen before (or all of them, once a day)
+        need to be looked up:
         """
     )
     return
@@ -206,77 +321,55 @@ def _(mo):
 def _(
     CF_ACCOUNT_ID,
     CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    json,
+    KV_OTHER,
+    df_kv_requests,
+    fetch_result,
+    list_all,
+    lookup_cache,
     pd,
     proxy,
-    urllib,
-    urlopen,
 ):
-    # Before processing the GraphQL results, we fetch the KV info first so we can merge the info after processing
-    # If results are incomplete, this represents the total number of pages we request
-    _MAX_PAGE_REQUESTS = 5
-
-    # Endpoint to get all KV name and Ids
-    _main_call = f"{proxy}/client/v4/accounts/{CF_ACCOUNT_ID}/storage/kv/namespaces"
-    _params = {"per_page": 100}
-    _curr_call = _main_call + '?' + urllib.parse.urlencode(_params)
-    _request = Request(_curr_call, headers={"Authorization": f"Bearer {CF_API_TOKEN}"})
-    _api_resp = urlopen(_request).read()
-    kv_info = pd.DataFrame(json.loads(_api_resp)["result"])
-
-    # Each API GET request can fetch at most 100 rows, if there are more pages
-    # we fetch the next 4 at most, totalling 500 KVs
-    _total_pages = json.loads(_api_resp)["result_info"]["total_pages"]
-    if _total_pages > 1:
-        _page_upper_bound = min(_total_pages, _MAX_PAGE_REQUESTS) + 1
-        print(
-            f"Results are incomplete, will fetch the next {min(_total_pages - 1, _MAX_PAGE_REQUESTS - 1)} pages"
-        )
-
-        for _page in range(2, _page_upper_bound):
-            _params = {"per_page": 100, "page": _page}
-            _curr_call = _main_call + '?' + urllib.parse.urlencode(_params)
-            _request = Request(_curr_call, headers={"Authorization": f"Bearer {CF_API_TOKEN}"})
-            _api_resp = urlopen(_request).read()
-            _curr_results = pd.DataFrame(json.loads(_api_resp)["result"])
-            kv_info = pd.concat([kv_info, _curr_results])
-
-    # Clean columns
-    kv_info = kv_info[["id", "title"]].reset_index(drop=True)
+    _namespaces_url = f"{proxy}/client/v4/accounts/{CF_ACCOUNT_ID}/storage/kv/namespaces"
+
+    # A single KV is looked up by its Id, returning None if it was deleted since
+    def _fetch_title(namespace_id):
+        _namespace = fetch_result(f"{_namespaces_url}/{namespace_id}", CF_API_TOKEN)
+        return None if _namespace is None else _namespace["title"]
+
+    # When many KVs are unknown, listing all of them takes fewer requests
+    # Each API GET request can fetch at most 100 rows, pages after the first one are fetched concurrently
+    def _fetch_all_titles():
+        return {_el["id"]: _el["title"] for _el in list_all(_namespaces_url, CF_API_TOKEN)}
+
+    _titles = lookup_cache("storage_kv", CF_ACCOUNT_ID, "namespaces").resolve(
+        df_kv_requests.loc[df_kv_requests["kv"] != KV_OTHER, "kv"].dropna().unique(), _fetch_title, _fetch_all_titles
+    )
+
+    # Name - Id pairs of the KVs found in the results
+    kv_info = pd.DataFrame({"id": list(_titles), "title": list(_titles.values())})
     return (kv_info,)
 
 
 @app.cell
-def _(json_kv_data, kv_info, pd):
-    # Format results into requests per obtained kv
-    _all_rows = []
-    for _el in json_kv_data["data"]["viewer"]["accounts"][0][
-        "kvOperationsAdaptiveGroups"
-    ]:
-        _curr_row = dict(
-            kv=_el["dimensions"]["namespaceId"],
-            action_type=_el["dimensions"]["actionType"],
-            requests=_el["sum"]["requests"],
-        )
-        _all_rows.append(_curr_row)
-    df_kv = pd.DataFrame(_all_rows)
-
-    df_kv = df_kv.merge(kv_info, left_on="kv", right_on="id", how="left")
+def _(KV_OTHER, KV_TOP_N, df_kv_requests, kv_info, pd, top_n_other, with_share):
+    df_kv = df_kv_requests.merge(kv_info, left_on="kv", right_on="id", how="left")
     df_kv = df_kv.drop(columns=["id"])
 
-    # If an account has more than 500 KVs not all will be fetched, so we mark them as "Other"
+    # KVs whose name could not be found (e.g. deleted since) are marked as "Other"
     df_kv["title"] = df_kv["title"].fillna("Other")
 
     # Data is in long format, but we want shares out of total for each action type
     # That is, all "read"s sum to 100% as well as all "write"s and "list"s
-    df_kv["share_of_action_requests"] = (
-        df_kv["requests"]
-        / df_kv.groupby("action_type")["requests"].transform("sum")
-        * 100
-    )
-    return (df_kv,)
+    df_kv = with_share(df_kv, "requests", "share_of_action_requests", over="action_type")
+
+    # Top KVs of an action type for the charts, the rest summed as "Other". The "Other" entry of the
+    # server-side ranking is not a KV, so it is not ranked but added to that sum
+    def kv_top_n(action_type):
+        _rows = df_kv.loc[df_kv["action_type"] == action_type]
+        _top = top_n_other(_rows.loc[_rows["kv"] != KV_OTHER], "title", "requests", KV_TOP_N)
+        _other = pd.DataFrame({"title": ["Other"], "requests": [_rows.loc[_rows["kv"] == KV_OTHER, "requests"].sum()]})
+        return pd.concat([_top, _other], ignore_index=True).groupby("title", as_index=False, sort=False).sum()
+    return df_kv, kv_top_n
 
 
 @app.cell
@@ -286,32 +379,14 @@ def _(df_kv):
 
 
 @app.cell
-def _(alt, datetime, df_kv, end_dt, start_dt):
-    # Number of entries + "Other"
-    _TOP_N = 5
+def _(alt, datetime, end_dt, headless, kv_top_n, mo, start_dt):
+    mo.stop(headless())
     # For the chart subtitle
     _start_str = datetime.strptime(start_dt, "%Y-%m-%dT%H:00:00Z").date()
     _end_str = datetime.strptime(end_dt, "%Y-%m-%dT%H:00:00Z").date()
 
-    # KVs with most "read" requests
-    _top_reads = (
-        df_kv.loc[df_kv["action_type"] == "read"]
-        .groupby("title")
-        .agg({"requests": "sum"})
-        .reset_index()
-    )
-    _top_reads = _top_reads.sort_values("requests", ascending=False)
-
-    # Entries not in top 5 are grouped
-    _top_reads.loc[
-        ~_top_reads["title"].isin(_top_reads.head(_TOP_N)["title"]), "title"
-    ] = "Other"
-    _top_reads = (
-        _top_reads.groupby("title")
-        .agg({"requests": "sum"})
-        .reset_index()
-        .sort_values("requests", ascending=False)
-    )
+    # KVs with most "read" requests, entries not in top 5 are grouped as "Other"
+    _top_reads = kv_top_n("read")
 
     # Trim empty entries
     _top_reads = _top_reads.loc[_top_reads["requests"] > 0]
@@ -335,32 +410,14 @@ def _(alt, datetime, df_kv, end_dt, start_dt):
 
 
 @app.cell
-def _(alt, datetime, df_kv, end_dt, start_dt):
-    # Number of entries + "Other"
-    _TOP_N = 5
+def _(alt, datetime, end_dt, headless, kv_top_n, mo, start_dt):
+    mo.stop(headless())
     # For the chart subtitle
     _start_str = datetime.strptime(start_dt, "%Y-%m-%dT%H:00:00Z").date()
     _end_str = datetime.strptime(end_dt, "%Y-%m-%dT%H:00:00Z").date()
 
-    # KVs with most "write" requests
-    _top_write = (
-        df_kv.loc[df_kv["action_type"] == "write"]
-        .groupby("title")
-        .agg({"requests": "sum"})
-        .reset_index()
-    )
-    _top_write = _top_write.sort_values("requests", ascending=False)
-
-    # Entries not in top 5 are grouped
-    _top_write.loc[
-        ~_top_write["title"].isin(_top_write.head(_TOP_N)["title"]), "title"
-    ] = "Other"
-    _top_write = (
-        _top_write.groupby("title")
-        .agg({"requests": "sum"})
-        .reset_index()
-        .sort_values("requests", ascending=False)
-    )
+    # KVs with most "write" requests, entries not in top 5 are grouped as "Other"
+    _top_write = kv_top_n("write")
 
     # Trim empty entries
     _top_write = _top_write.loc[_top_write["requests"] > 0]
@@ -384,32 +441,14 @@ def _(alt, datetime, df_kv, end_dt, start_dt):
 
 
 @app.cell
-def _(alt, datetime, df_kv, end_dt, start_dt):
-    # Number of entries + "Other"
-    _TOP_N = 5
+def _(alt, datetime, end_dt, headless, kv_top_n, mo, start_dt):
+    mo.stop(headless())
     # For the chart subtitle
     _start_str = datetime.strptime(start_dt, "%Y-%m-%dT%H:00:00Z").date()
     _end_str = datetime.strptime(end_dt, "%Y-%m-%dT%H:00:00Z").date()
 
-    # KVs with most "read" requests
-    _top_lists = (
-        df_kv.loc[df_kv["action_type"] == "list"]
-        .groupby("title")
-        .agg({"requests": "sum"})
-        .reset_index()
-    )
-    _top_lists = _top_lists.sort_values("requests", ascending=False)
-
-    # Entries not in top 5 are grouped
-    _top_lists.loc[
-        ~_top_lists["title"].isin(_top_lists.head(_TOP_N)["title"]), "title"
-    ] = "Other"
-    _top_lists = (
-        _top_lists.groupby("title")
-        .agg({"requests": "sum"})
-        .reset_index()
-        .sort_values("requests", ascending=False)
-    )
+    # KVs with most "read" requests, entries not in top 5 are grouped as "Other"
+    _top_lists = kv_top_n("list")
 
     # Trim empty entries
     _top_lists = _top_lists.loc[_top_lists["requests"] > 0]
@@ -448,16 +487,7 @@ def _(mo):
 
 
 @app.cell
-def _(
-    CF_ACCOUNT_ID,
-    CF_API_TOKEN,
-    HOSTNAME,
-    Request,
-    end_dt,
-    json,
-    start_dt,
-    urlopen,
-):
+def _(CF_ACCOUNT_ID, CF_API_TOKEN, HOSTNAME, end_dt, pd, start_dt, stream_graphql):
     _QUERY_STR = """
     query KVOperationsTime($accountTag: string!, $filter: AccountKVOperationsAdaptiveGroupsFilter_InputObject) {
       viewer {
@@ -482,40 +512,22 @@ def _(
         "filter": {"AND": [{"datetimeHour_leq": end_dt, "datetimeHour_geq": start_dt}]},
     }
 
-    _data = json.dumps({"query": _QUERY_STR, "variables": _QUERY_VARIABLES}).encode()
-    _request = Request(f"{HOSTNAME}/client/v4/graphql",
-                       headers={"Authorization": f"Bearer {CF_API_TOKEN}",
-                                "Accept": "application/json",
-                                "Content-Type": "application/json"},
-                       data=_data,
-                       method='POST')
-    _resp_raw = urlopen(_request).read()
-
-    json_kv_time_data = json.loads(_resp_raw)
-    return (json_kv_time_data,)
-
-
-@app.cell
-def _(json_kv_time_data, pd):
-    # Format results into hourly metrics per obtained worker
-    _all_rows = []
-    for _el in json_kv_time_data["data"]["viewer"]["accounts"][0][
-        "kvOperationsAdaptiveGroups"
-    ]:
-        _curr_row = dict(
-            time=_el["dimensions"]["date"],
-            action_type=_el["dimensions"]["actionType"],
-            requests=_el["sum"]["requests"],
-        )
-        _all_rows.append(_curr_row)
-    df_time = pd.DataFrame(_all_rows)
+    # Rows are formatted into columns as the response is read
+    df_time = stream_graphql(HOSTNAME, CF_API_TOKEN, {"query": _QUERY_STR, "variables": _QUERY_VARIABLES}, {
+        "kvOperationsAdaptiveGroups": {
+            "dimensions.date": "time",
+            "dimensions.actionType": "action_type",
+            "sum.requests": "requests",
+        },
+    })["kvOperationsAdaptiveGroups"]
     df_time["time"] = pd.to_datetime(df_time["time"])
     df_time = df_time.sort_values("time")
     return (df_time,)
 
 
 @app.cell
-def _(alt, df_time):
+def _(alt, df_time, headless, mo):
+    mo.stop(headless())
     alt.Chart(df_time).mark_line().encode(
         alt.X("time", title="Date"),
         alt.Y("requests", title="Daily requests"),
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import os
+import os.path as path
+import sys
+import base64
+import hashlib
+import zipfile
+
+
+from sys import stderr
+from argparse import ArgumentParser
+
+
+PACKAGE_NAME = "cfkit"
+PACKAGE_VERSION = "0.1.0"
+PACKAGE_DIR = path.realpath(path.join(path.dirname(__file__), "..", "notebooks", PACKAGE_NAME))
+# Installed along with the wheel by micropip, which takes them from the Pyodide distribution
+PACKAGE_REQUIRES = ["numpy", "pandas", "polars", "requests"]
+
+WHEEL_NAME = "%s-%s-py3-none-any.whl" % (PACKAGE_NAME, PACKAGE_VERSION)
+# Fixed timestamp for every file, so that the same sources always build the same wheel
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def parse_args():
+    """Parse and enforce command-line arguments."""
+
+    # Disable the automatic "-h/--help" argument to customize its message...
+    parser = ArgumentParser(description="Build the cfkit helpers into a wheel the WASM notebooks install.",
+                            add_help=False)
+
+    parser.add_argument("-h", "--help", action="help",
+                              help="Show the available options and exit.")
+    parser.add_argument("output_path", metavar="output_path", help="Where to write the wheel.")
+
+    return parser.parse_args()
+
+
+def record_hash(data):
+    digest = hashlib.sha256(data).digest()
+    return "sha256=" + base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def package_files():
+    """Source files of the package, as (name in the wheel, contents), in a stable order."""
+
+    files = []
+
+    for filename in sorted(os.listdir(PACKAGE_DIR)):
+        if not filename.endswith(".py"):
+            continue
+
+        with open(path.join(PACKAGE_DIR, filename), "rb") as f:
+            files.append(("%s/%s" % (PACKAGE_NAME, filename), f.read()))
+
+    return files
+
+
+def metadata_files():
+    dist_info = "%s-%s.dist-info" % (PACKAGE_NAME, PACKAGE_VERSION)
+
+    metadata = ["Metadata-Version: 2.1", "Name: %s" % PACKAGE_NAME, "Version: %s" % PACKAGE_VERSION]
+    metadata += ["Requires-Dist: %s" % requirement for requirement in PACKAGE_REQUIRES]
+    wheel = ["Wheel-Version: 1.0", "Generator: pages/wheel.py", "Root-Is-Purelib: true", "Tag: py3-none-any"]
+
+    return dist_info, [
+        ("%s/METADATA" % dist_info, ("\n".join(metadata) + "\n").encode()),
+        ("%s/WHEEL" % dist_info, ("\n".join(wheel) + "\n").encode()),
+    ]
+
+
+def main():
+    args = parse_args()
+
+    if not path.isdir(PACKAGE_DIR):
+        print("ERROR: The package sources do not exist: %s" % PACKAGE_DIR, file=stderr)
+        sys.exit(1)
+
+    dist_info, metadata = metadata_files()
+    files = package_files() + metadata
+
+    record = ["%s,%s,%d" % (name, record_hash(data), len(data)) for name, data in files]
+    record.append("%s/RECORD,," % dist_info)
+    files.append(("%s/RECORD" % dist_info, ("\n".join(record) + "\n").encode()))
+
+    os.makedirs(args.output_path, exist_ok=True)
+
+    with zipfile.ZipFile(path.join(args.output_path, WHEEL_NAME), "w", zipfile.ZIP_DEFLATED) as wheel:
+        for name, data in files:
+            info = zipfile.ZipInfo(name, ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            wheel.writestr(info, data)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
+
+
+# vim: set expandtab ts=4 sw=4:
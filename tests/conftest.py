@@ -0,0 +1,94 @@
+"""Stand-ins for the Cloudflare API, so that the cfkit helpers are tested without network."""
+
+import json
+
+import pytest
+
+
+def graphql_response(rows, alias, scope="accounts", errors=None):
+    """A response holding the ``alias`` selection, shaped like ``data.viewer.<scope>[0].<alias>``."""
+
+    return {"data": {"viewer": {scope: [{alias: rows}]}}, "errors": errors}
+
+
+class FakeResponse:
+    """Enough of a ``requests.Response`` for :class:`cfkit.http.HTTPClient`."""
+
+    def __init__(self, body, status=200, headers=None, url="https://api.cloudflare.com/client/v4/graphql"):
+        self.content = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.status_code = status
+        self.reason = "OK" if status < 400 else "Error"
+        self.headers = headers or {}
+        self.url = url
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Answers requests with the given responses in turn, recording what was sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, data=None, headers=None, timeout=None, stream=False):
+        self.requests.append({"method": method, "url": url, "data": data, "headers": headers, "stream": stream})
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+def matches(row, condition):
+    """Whether a row satisfies a filter such as ``{"AND": [{"zone": "a"}, {"time_geq": "..."}]}``."""
+
+    for key, value in condition.items():
+        if key == "AND":
+            if not all(matches(row, part) for part in value):
+                return False
+            continue
+        if key == "OR":
+            if not any(matches(row, part) for part in value):
+                return False
+            continue
+
+        name, _, op = key.rpartition("_")
+        if op not in ("gt", "geq", "lt", "leq"):
+            name, op = key, "eq"
+        actual = row["dimensions"][name]
+        if not {"eq": actual == value, "gt": actual > value, "geq": actual >= value,
+                "lt": actual < value, "leq": actual <= value}[op]:
+            return False
+    return True
+
+
+class FakeDataset:
+    """Rows served like an adaptive-groups selection: filtered, ordered by ``cursor`` and limited."""
+
+    def __init__(self, rows, cursor, alias="rows", page_size=10):
+        self.rows = sorted(rows, key=lambda row: tuple(row["dimensions"][name] for name in cursor))
+        self.alias = alias
+        self.page_size = page_size
+        self.filters = []
+
+    def __call__(self, document):
+        condition = document["variables"].get("filter") or {}
+        self.filters.append(condition)
+        rows = [row for row in self.rows if matches(row, condition)]
+        return graphql_response(rows[:self.page_size], self.alias)
+
+
+@pytest.fixture
+def fake_dataset():
+    return FakeDataset
+
+
+@pytest.fixture
+def fake_session():
+    return FakeSession
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cfkit.aggregate import group_totals, top_n_other, with_share
+
+
+BACKENDS = ["polars", "pandas"]
+
+
+def status_codes():
+    """Requests per hour and status code, with the time cast like the notebooks do."""
+
+    return pd.DataFrame({
+        "time": pd.to_datetime(["2024-01-01T00:00:00Z"] * 4 + ["2024-01-01T01:00:00Z"] * 4,
+                               format="%Y-%m-%dT%H:%M:%SZ").astype("datetime64[s]"),
+        "key": ["200", "404", "500", "301"] * 2,
+        "requests": [100, 20, 5, 1, 80, 30, 2, 1],
+        "bytes": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, np.nan],
+    })
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_group_totals(backend):
+    result = group_totals(status_codes(), "key", {"requests": "sum", "bytes": "max"}, sort_by="requests",
+                          backend=backend)
+
+    assert result["key"].tolist() == ["200", "404", "500", "301"]
+    assert result["requests"].tolist() == [180, 50, 7, 2]
+    assert result["bytes"].tolist() == [5.0, 6.0, 7.0, 4.0]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_group_totals_by_time(backend):
+    result = group_totals(status_codes(), ["time"], {"requests": "sum"}, backend=backend)
+
+    assert result["requests"].tolist() == [126, 113]
+    assert pd.to_datetime(result["time"]).tolist() == [pd.Timestamp("2024-01-01 00:00"), pd.Timestamp("2024-01-01 01:00")]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_top_n_other(backend):
+    result = top_n_other(status_codes(), "key", "requests", 2, share="share", backend=backend)
+
+    assert result["key"].tolist() == ["200", "404", "Other"]
+    assert result["requests"].tolist() == [180, 50, 9]
+    assert result["share"].sum() == pytest.approx(100)
+
+
+def test_top_n_other_with_a_none_key():
+    frame = pd.DataFrame({"kv": ["a", "b", None, "c"], "requests": [10, 5, 7, 1]})
+
+    result = top_n_other(frame, "kv", "requests", 2)
+
+    assert result["kv"].tolist() == ["a", None, "Other"]
+    assert result["requests"].tolist() == [10, 7, 6]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_with_share(backend):
+    frame = status_codes()
+
+    overall = with_share(frame, "requests", "share", backend=backend)
+    hourly = with_share(frame, "requests", "share", over="time", backend=backend)
+
+    assert overall["share"].sum() == pytest.approx(100)
+    assert hourly.groupby("time")["share"].sum().tolist() == pytest.approx([100, 100])
+    assert list(hourly.columns) == list(frame.columns) + ["share"]
+    assert pd.api.types.is_datetime64_dtype(hourly["time"])
+
+
+def test_with_share_keeps_none_values():
+    frame = pd.DataFrame({"action": ["read", "read", "write"], "kv": ["a", None, "Other"], "requests": [3, 1, 4]})
+
+    result = with_share(frame, "requests", "share", over="action")
+
+    assert result["kv"].tolist() == ["a", None, "Other"]
+    assert result["share"].tolist() == pytest.approx([75, 25, 100])
@@ -0,0 +1,51 @@
+import textwrap
+
+import pandas as pd
+import polars as pl
+import pytest
+
+from cfkit.batch import run_notebook, write_frames
+
+
+def frames():
+    return {
+        "df_status_code": pd.DataFrame({
+            "account_id": ["acc1", "acc2"],
+            "time": pd.to_datetime(["2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z"],
+                                   format="%Y-%m-%dT%H:%M:%SZ").astype("datetime64[s]"),
+            "key": ["200", None],
+            "requests": [10, 2],
+        }),
+    }
+
+
+@pytest.mark.parametrize("format, read", [("parquet", pl.read_parquet), ("ipc", pl.read_ipc)])
+def test_write_frames(tmp_path, format, read):
+    paths = write_frames(frames(), str(tmp_path / "out"), format)
+
+    data = read(paths["df_status_code"])
+    assert paths["df_status_code"].endswith(".parquet" if format == "parquet" else ".arrow")
+    assert data.schema["time"] == pl.Datetime("us")
+    assert data["key"].to_list() == ["200", None]
+    assert data["requests"].to_list() == [10, 2]
+
+
+def test_run_notebook(tmp_path):
+    path = tmp_path / "notebook.py"
+    path.write_text(textwrap.dedent('''
+        import marimo
+
+        app = marimo.App()
+
+
+        @app.cell
+        def _():
+            import pandas as pd
+            df_a = pd.DataFrame({"x": [1, 2]})
+            df_b = df_a.assign(y=df_a["x"] * 2)
+            total = int(df_b["y"].sum())
+            return df_a, df_b, pd, total
+    '''))
+
+    assert set(run_notebook(str(path))) == {"df_a", "df_b"}
+    assert run_notebook(str(path), ["df_b"])["df_b"]["y"].tolist() == [2, 4]
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from cfkit.cache import ResponseCache, closed_before, default_cache
+
+
+URL = "https://api.cloudflare.com/client/v4/graphql"
+NOW = datetime(2024, 1, 10, 12, 5)
+
+
+def body(query, **variables):
+    return json.dumps({"query": query, "variables": variables})
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path))
+
+
+def test_closed_before():
+    # Ten minutes are left for late data, so 12:05 still belongs to the 11:00 hour
+    assert closed_before(NOW) == datetime(2024, 1, 10, 11)
+    assert closed_before(datetime(2024, 1, 10, 12, 15)) == datetime(2024, 1, 10, 12)
+
+
+@pytest.mark.parametrize("data, cached", [
+    (body("query ($f: Filter) { x(filter: $f) }", f={"datetime_geq": "2024-01-09T00:00:00Z",
+                                                      "datetime_lt": "2024-01-10T11:00:00Z"}), True),
+    (body("query { x(filter: {datetimeHour_leq: \"2024-01-10T10:00:00Z\"}) }"), True),
+    (body("query ($end: string) { x(filter: {date_leq: $end}) }", end="2024-01-09"), True),
+    # The whole day is included, and it is not over yet
+    (body("query ($end: string) { x(filter: {date_leq: $end}) }", end="2024-01-10"), False),
+    (body("query ($f: Filter) { x(filter: $f) }", f={"datetime_lt": "2024-01-10T12:00:00Z"}), False),
+    (body("query ($f: Filter) { x(filter: $f) }", f={"AND": [{"datetime_lt": "2024-01-09T00:00:00Z"},
+                                                             {"datetime_leq": "yesterday"}]}), False),
+    (body("query { x(limit: 10) }"), False),
+    ("not json", False),
+    (None, False),
+])
+def test_key_only_for_closed_hours(cache, data, cached):
+    assert (cache.key(URL, data, now=NOW) is not None) == cached
+
+
+def test_key_depends_on_query_and_scope(cache):
+    query = "query ($accountTag: string, $end: string) { x(filter: {datetime_lt: $end}) }"
+    key = cache.key(URL, body(query, accountTag="a", end="2024-01-09T00:00:00Z"), now=NOW)
+
+    # Whitespace in the query does not matter, the account does
+    assert cache.key(URL, body("  " + query.replace(" ", "\n  "), accountTag="a", end="2024-01-09T00:00:00Z"),
+                     now=NOW) == key
+    assert cache.key(URL, body(query, accountTag="b", end="2024-01-09T00:00:00Z"), now=NOW) != key
+    assert cache.key("https://api.cloudflare.com/client/v4/accounts", body(query), now=NOW) is None
+
+
+def test_put_and_get(cache):
+    cache.put("ab12", b'{"data": {"viewer": {}}}')
+    cache.put("cd34", b'{"data": null, "errors": [{"message": "timeout"}]}')
+    cache.put("ef56", b"<html>")
+
+    assert cache.get("ab12") == b'{"data": {"viewer": {}}}'
+    assert cache.get("cd34") is None
+    assert cache.get("ef56") is None
+
+    cache.clear()
+    assert cache.get("ab12") is None
+
+
+def test_writer(cache, tmp_path):
+    writer = cache.writer("ab12")
+    writer.write(b'{"data": ')
+    assert cache.get("ab12") is None
+    writer.write(b"{}}")
+    writer.commit()
+
+    discarded = cache.writer("cd34")
+    discarded.write(b'{"data"')
+    discarded.discard()
+
+    assert cache.get("ab12") == b'{"data": {}}'
+    assert cache.get("cd34") is None
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_default_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("CFKIT_CACHE_DIR", str(tmp_path))
+    assert default_cache().directory == str(tmp_path)
+
+    monkeypatch.setenv("CFKIT_CACHE", "off")
+    assert default_cache() is None
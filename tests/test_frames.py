@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from cfkit.frames import (column_values, json_frame, map_frames, pandas_to_polars, polars_to_pandas,
+                          response_rows, rows_frame)
+
+
+ROWS = [
+    {"dimensions": {"bucketName": "photos", "datetime": "2024-01-01T00:00:00Z"},
+     "max": {"objectCount": 10, "payloadSize": 1.5}, "quantiles": {"cpu": {"p50": 2}}},
+    {"dimensions": {"bucketName": "logs", "datetime": "2024-01-01T01:00:00Z"},
+     "max": {"objectCount": 3, "payloadSize": None}, "quantiles": {"cpu": {"p50": 4}}},
+]
+
+
+def test_column_values():
+    assert column_values(ROWS, "dimensions.bucketName") == ["photos", "logs"]
+    assert column_values(ROWS, "quantiles.cpu.p50") == [2, 4]
+    assert column_values([{"count": 1}], "count") == [1]
+
+
+def test_rows_frame():
+    frame = rows_frame(iter(ROWS), {"dimensions.bucketName": "bucket", "max.objectCount": "objects",
+                                    "max.payloadSize": "size"}, account="acc")
+
+    assert list(frame.columns) == ["bucket", "objects", "size", "account"]
+    assert frame["objects"].tolist() == [10, 3]
+    assert frame["size"].isna().tolist() == [False, True]
+    assert frame["account"].tolist() == ["acc", "acc"]
+
+
+def test_empty_rows_frame():
+    frame = rows_frame([], {"dimensions.bucketName": "bucket"}, account="acc")
+
+    assert frame.empty
+    assert list(frame.columns) == ["bucket", "account"]
+
+
+def test_json_frame():
+    response = {"data": {"viewer": {"accounts": [{"storage": ROWS}], "zones": None}}}
+
+    assert response_rows(response, "data.viewer.accounts.0.storage") == ROWS
+    assert response_rows(response, "data.viewer.zones.0.storage") == []
+    assert json_frame(response, "data.viewer.accounts.0.storage", {"dimensions.bucketName": "bucket"})[
+        "bucket"].tolist() == ["photos", "logs"]
+
+
+GROUPS = [
+    {"dimensions": {"timeslot": "2024-01-01T00:00:00Z"},
+     "sum": {"responseStatusMap": [{"key": 200, "requests": 10}, {"key": 404, "requests": 2}],
+             "countryMap": [{"key": "FR", "requests": 12, "threats": 1}]}},
+    {"dimensions": {"timeslot": "2024-01-01T01:00:00Z"},
+     "sum": {"responseStatusMap": [{"key": 200, "requests": 7}], "countryMap": []}},
+]
+
+
+def test_map_frames():
+    frames = map_frames(GROUPS, ["responseStatusMap", "countryMap", "browserMap"])
+
+    status = frames["responseStatusMap"]
+    assert list(status.columns) == ["time", "key", "requests"]
+    assert status["time"].tolist() == ["2024-01-01T00:00:00Z"] * 2 + ["2024-01-01T01:00:00Z"]
+    assert status["requests"].tolist() == [10, 2, 7]
+    assert frames["countryMap"].to_dict("records") == [
+        {"time": "2024-01-01T00:00:00Z", "key": "FR", "requests": 12, "threats": 1}]
+    # Maps without any entry (or not selected) still come back, with a time column only
+    assert list(frames["browserMap"].columns) == ["time"]
+
+
+def test_map_frames_from_columns():
+    columns = pd.DataFrame({
+        "time": [group["dimensions"]["timeslot"] for group in GROUPS],
+        "responseStatusMap": [group["sum"]["responseStatusMap"] for group in GROUPS],
+    })
+
+    frames = map_frames(columns, ["responseStatusMap", "countryMap"])
+
+    assert frames["responseStatusMap"].equals(map_frames(GROUPS, ["responseStatusMap"])["responseStatusMap"])
+    assert frames["countryMap"].empty
+
+
+def test_pandas_to_polars():
+    frame = pd.DataFrame({
+        "time": pd.to_datetime(["2024-01-01T00:00:00Z", None], format="%Y-%m-%dT%H:%M:%SZ").astype("datetime64[s]"),
+        "utc": pd.to_datetime(["2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z"], utc=True),
+        "key": ["a", None],
+        "requests": [1, 2],
+        "bytes": [1.5, np.nan],
+        "label": pd.Series(["x", pd.NA], dtype="string"),
+        "count": pd.array([1, None], dtype="Int64"),
+    })
+
+    result = pandas_to_polars(frame)
+
+    assert result.schema == {
+        "time": pl.Datetime("us"), "utc": pl.Datetime("us", "UTC"), "key": pl.String, "requests": pl.Int64,
+        "bytes": pl.Float64, "label": pl.String, "count": pl.Int64,
+    }
+    assert result["time"].to_list()[1] is None
+    assert result["key"].to_list() == ["a", None]
+    assert result["count"].to_list() == [1, None]
+
+
+def test_round_trip():
+    frame = pd.DataFrame({"key": ["a", "b"], "requests": [1, 2], "share": [25.0, 75.0]})
+
+    assert polars_to_pandas(pandas_to_polars(frame)).equals(frame)
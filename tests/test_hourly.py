@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from cfkit.hourly import HourlyStore
+
+
+START = "2024-01-01T00:00:00Z"
+
+
+def hours(*rows):
+    return pd.DataFrame([{"time": f"2024-01-01T{hour:02}:00:00Z", "storage_class": storage_class,
+                          "requests": requests} for hour, storage_class, requests in rows])
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    now = {"closed": datetime(2024, 1, 1, 3)}
+    monkeypatch.setattr("cfkit.hourly.closed_before", lambda: now["closed"])
+    store = HourlyStore(str(tmp_path / "r2" / "requests.parquet"))
+    store.now = now
+    return store
+
+
+def test_first_run_stores_closed_hours(store):
+    assert store.resume_from(START) == START
+
+    series = store.extend(hours((0, "Standard", 5), (1, None, 3), (3, "Standard", 1)), START)
+
+    # The ongoing hour is returned, but not stored
+    assert series["requests"].tolist() == [5, 3, 1]
+    assert series["storage_class"].tolist() == ["Standard", None, "Standard"]
+    assert store.load()["requests"].to_list() == [5, 3]
+    assert store.resume_from(START) == "2024-01-01T03:00:00Z"
+
+
+def test_next_run_only_adds_new_hours(store):
+    store.extend(hours((0, "Standard", 5), (1, "Standard", 3), (3, "Standard", 1)), START)
+    store.now["closed"] = datetime(2024, 1, 1, 5)
+
+    # Fetched from resume_from: the previously ongoing hour is now final
+    series = store.extend(hours((3, "Standard", 4), (4, "Standard", 2), (5, "Standard", 1)), START)
+
+    assert series["time"].str[11:13].tolist() == ["00", "01", "03", "04", "05"]
+    assert series["requests"].tolist() == [5, 3, 4, 2, 1]
+    assert store.load()["requests"].to_list() == [5, 3, 4, 2]
+
+
+def test_later_start_and_empty_runs(store):
+    store.extend([{"time": "2024-01-01T00:00:00Z", "requests": 5}, {"time": "2024-01-01T01:00:00Z", "requests": 3}],
+                 START)
+
+    # Hours before the requested start are stored, not returned
+    assert store.extend([], "2024-01-01T01:00:00Z")["requests"].tolist() == [3]
+    assert store.resume_from("2024-01-01T05:00:00Z") == "2024-01-01T05:00:00Z"
+
+
+def test_empty_store(store):
+    assert store.load() is None
+    assert store.complete_until() is None
+    assert store.extend([], START).empty
+    # A query that returned nothing still covered its hours
+    assert store.resume_from(START) == "2024-01-01T03:00:00Z"
@@ -0,0 +1,107 @@
+import io
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from cfkit.cache import ResponseCache
+from cfkit.http import HTTPClient
+from cfkit.throttle import Throttle
+
+from conftest import FakeResponse
+
+
+URL = "https://api.cloudflare.com/client/v4/graphql"
+
+
+def test_urlopen_sends_through_the_session(fake_session):
+    client = HTTPClient()
+    client.session = fake_session(FakeResponse({"data": {"viewer": {}}}))
+
+    data = b'{"query": "{ viewer { zones { zoneTag } } }"}'
+    with client.urlopen(URL, data=data, headers={"Authorization": "Bearer token"}) as response:
+        assert response.status == 200
+        assert response.json() == {"data": {"viewer": {}}}
+
+    assert client.session.requests == [
+        {"method": "POST", "url": URL, "data": data, "headers": {"Authorization": "Bearer token"}, "stream": False},
+    ]
+
+
+def test_urlopen_takes_urllib_requests(fake_session):
+    client = HTTPClient()
+    client.session = fake_session(FakeResponse(b"[]"))
+    request = urllib.request.Request(URL.replace("graphql", "accounts"), headers={"Accept": "application/json"})
+
+    assert client.urlopen(request).read() == b"[]"
+    assert client.session.requests[0]["method"] == "GET"
+    assert client.session.requests[0]["headers"] == {"Accept": "application/json"}
+
+
+def test_urlopen_raises_like_urllib(fake_session):
+    client = HTTPClient()
+    client.session = fake_session(FakeResponse({"errors": [{"message": "denied"}]}, status=403))
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        client.urlopen(URL, data=b"{}")
+
+    assert error.value.code == 403
+    assert b"denied" in error.value.read()
+
+
+class FakeUrllib:
+    """Stands in for ``urllib.request.urlopen`` under WASM, answering with ``(status, headers, body)`` in turn."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, request, timeout=None):
+        self.requests.append(request)
+        status, headers, body = self.responses.pop(0)
+        if status >= 400:
+            raise urllib.error.HTTPError(request.full_url, status, "Error", headers, io.BytesIO(body))
+        response = io.BytesIO(body)
+        response.url, response.status, response.reason, response.headers = request.full_url, status, "OK", headers
+        return response
+
+
+def wasm_client(monkeypatch, tmp_path, *responses):
+    monkeypatch.setattr("cfkit.http.IS_WASM", True)
+    monkeypatch.setattr("cfkit.http.urllib.request.urlopen", FakeUrllib(*responses))
+    monkeypatch.setattr("cfkit.throttle.time.sleep", lambda seconds: None)
+    return HTTPClient(cache=ResponseCache(str(tmp_path)), throttle=Throttle())
+
+
+def test_wasm_requests_are_retried(monkeypatch, tmp_path):
+    client = wasm_client(monkeypatch, tmp_path, (429, {"Retry-After": "1"}, b"slow down"),
+                         (200, {}, b'{"result": []}'))
+
+    assert client.urlopen(URL.replace("graphql", "accounts")).json() == {"result": []}
+    assert len(urllib.request.urlopen.requests) == 2
+    stats = client.throttle.stats()["rest"]
+    assert (stats["requests"], stats["retries"]) == (2, 1)
+
+
+def test_wasm_errors_raise_like_urllib(monkeypatch, tmp_path):
+    client = wasm_client(monkeypatch, tmp_path, (400, {}, b"bad query"))
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        client.urlopen(URL, data=b"{}")
+
+    assert error.value.code == 400
+    assert len(urllib.request.urlopen.requests) == 1
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_wasm_closed_hours_are_cached(monkeypatch, tmp_path, stream):
+    client = wasm_client(monkeypatch, tmp_path, (200, {}, b'{"data": {}}'))
+    data = json.dumps({"query": "{ viewer { zones(filter: {datetime_lt: $end}) { zoneTag } } }",
+                       "variables": {"end": "2024-01-01T00:00:00Z"}})
+
+    with client.urlopen(URL, data=data, stream=stream) as response:
+        assert response.read() == b'{"data": {}}'
+    # Served from the cache, urlopen has no responses left
+    assert client.urlopen(URL, data=data).read() == b'{"data": {}}'
+    assert urllib.request.urlopen.requests[0].data == data.encode()
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from cfkit.lookup import LookupCache
+
+
+def test_names_expire_one_by_one(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cfkit.lookup.time.time", lambda: now[0])
+    cache = LookupCache(str(tmp_path / "names.json"), max_age=timedelta(seconds=100))
+    fetched = []
+
+    def fetch_one(key):
+        fetched.append(key)
+        return key.upper()
+
+    assert cache.resolve(["a"], fetch_one, max_workers=1) == {"a": "A"}
+    now[0] += 60
+    assert cache.resolve(["a", "b"], fetch_one, max_workers=1) == {"a": "A", "b": "B"}
+    # "a" is stale now, while "b" (fetched later) is not
+    now[0] += 60
+    assert cache.resolve(["a", "b"], fetch_one, max_workers=1) == {"a": "A", "b": "B"}
+
+    assert fetched == ["a", "b", "a"]
+
+
+def test_bulk_listing(tmp_path):
+    cache = LookupCache(str(tmp_path / "names.json"), bulk_threshold=1)
+
+    names = cache.resolve(["a", "b", "gone"], lambda key: None, fetch_all=lambda: {"a": "A", "b": "B"})
+
+    assert names == {"a": "A", "b": "B"}
+    assert cache.load() == {"a": "A", "b": "B", "gone": None}
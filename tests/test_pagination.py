@@ -0,0 +1,86 @@
+import pytest
+
+from cfkit.pagination import iter_pages, selection_rows
+
+from conftest import graphql_response
+
+
+def rows_of(*keys):
+    return [{"dimensions": {"zone": "a", **key}, "count": idx} for idx, key in enumerate(keys)]
+
+
+def test_selection_rows_raises_on_errors():
+    response = graphql_response(None, "rows", errors=[{"message": "too many"}, {"message": "bad filter"}])
+
+    with pytest.raises(RuntimeError, match="too many"):
+        selection_rows(response, "rows")
+
+
+def test_selection_rows_without_scope():
+    assert selection_rows({"data": {"viewer": {"zones": []}}}, "rows") == []
+
+
+def test_single_page(fake_dataset):
+    fetch = fake_dataset(rows_of(*[{"host": f"h{i}"} for i in range(5)]), ["host"])
+    document = {"query": "...", "variables": {"filter": {"zone": "a"}}}
+
+    pages = list(iter_pages(fetch, document, "rows", "host", page_size=10))
+
+    assert [len(page) for page in pages] == [5]
+    assert fetch.filters == [{"zone": "a"}]
+
+
+def test_rows_sharing_the_last_key_are_fetched_again(fake_dataset):
+    # Page boundaries (every 4 rows) cut through runs of the same host
+    hosts = ["a", "b", "b", "c", "c", "c", "d", "e", "e", "f"]
+    rows = [{"dimensions": {"zone": "a", "host": host, "path": f"/{idx}"}} for idx, host in enumerate(hosts)]
+    fetch = fake_dataset(rows, ["host"], page_size=4)
+    document = {"query": "...", "variables": {"filter": {"zone": "a"}, "limit": 4}}
+
+    pages = list(iter_pages(fetch, document, "rows", "host", page_size=4))
+
+    paths = [row["dimensions"]["path"] for page in pages for row in page]
+    assert sorted(paths) == sorted(row["dimensions"]["path"] for row in rows)
+    assert len(paths) == len(set(paths))
+    assert all(len(page) < 4 for page in pages)
+    # The cursor condition is added to the base filter, starting at the last key seen
+    assert fetch.filters[0] == {"zone": "a"}
+    assert fetch.filters[1] == {"AND": [{"zone": "a"}, {"host_geq": "c"}]}
+
+
+def test_without_base_filter(fake_dataset):
+    fetch = fake_dataset(rows_of(*[{"host": f"h{i}"} for i in range(7)]), ["host"], page_size=3)
+
+    pages = list(iter_pages(fetch, {"query": "...", "variables": {}}, "rows", "host", page_size=3))
+
+    assert sum(len(page) for page in pages) == 7
+    assert fetch.filters[1] == {"host_geq": "h2"}
+
+
+def test_multiple_dimensions(fake_dataset):
+    keys = [{"date": date, "host": host} for date in ("d1", "d2", "d3") for host in ("a", "b", "c")]
+    fetch = fake_dataset(rows_of(*keys), ["date", "host"], page_size=4)
+    document = {"query": "...", "variables": {"filter": {"zone": "a"}}}
+
+    pages = list(iter_pages(fetch, document, "rows", ["date", "host"], page_size=4))
+
+    seen = [(row["dimensions"]["date"], row["dimensions"]["host"]) for page in pages for row in page]
+    assert seen == [(key["date"], key["host"]) for key in keys]
+    assert fetch.filters[1] == {"AND": [{"zone": "a"}, {"OR": [{"date_gt": "d2"}, {"date": "d2", "host_geq": "a"}]}]}
+
+
+def test_page_saturated_by_one_key(fake_dataset):
+    fetch = fake_dataset(rows_of(*[{"host": "a"}] * 5), ["host"], page_size=3)
+
+    with pytest.raises(RuntimeError, match="share"):
+        list(iter_pages(fetch, {"query": "...", "variables": {}}, "rows", "host", page_size=3))
+
+
+def test_first_response(fake_dataset):
+    fetch = fake_dataset(rows_of(*[{"host": f"h{i}"} for i in range(5)]), ["host"], page_size=3)
+    document = {"query": "...", "variables": {}}
+
+    pages = list(iter_pages(fetch, document, "rows", "host", page_size=3, first_response=fetch(document)))
+
+    assert sum(len(page) for page in pages) == 5
+    assert len(fetch.filters) == 3
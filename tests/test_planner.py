@@ -0,0 +1,118 @@
+from cfkit.planner import MERGE_LIMIT, QueryPlan, Selection, graphql_literal
+
+
+FILTER = {"date_geq": "2024-01-01", "date_lt": "2024-01-08"}
+
+
+def storage(alias, fields, order_by=(), limit=10):
+    return Selection(alias, "r2StorageAdaptiveGroups", FILTER, {"dimensions": ["bucketName"], **fields},
+                     order_by, limit)
+
+
+def replies(*scopes):
+    """``fetch(document)`` answering with the given scopes in turn, and the documents it was sent."""
+
+    documents = []
+
+    def fetch(document):
+        documents.append(document["query"])
+        scope = scopes[len(documents) - 1]
+        return {"data": {"viewer": {"accounts": [scope]}}, "errors": scope.pop("errors", None)}
+
+    return fetch, documents
+
+
+def buckets(count):
+    return [
+        {"dimensions": {"bucketName": f"b{i}"}, "max": {"objectCount": i, "payloadSize": 100 - i}}
+        for i in range(count)
+    ]
+
+
+def test_graphql_literal():
+    assert graphql_literal({"a": [1, "x"], "b": {"c": None}}) == '{a: [1, "x"], b: {c: null}}'
+
+
+def test_merged_selections_are_projected():
+    plan = QueryPlan("accounts", {"accountTag": "acc"}, {
+        "objects": [storage("top", {"max": ["objectCount"]}, ["max_objectCount_DESC"], limit=2)],
+        "payload": [storage("top", {"max": ["payloadSize"]}, ["max_payloadSize_ASC"], limit=3)],
+    })
+    fetch, documents = replies({"merged_0": buckets(5)})
+
+    responses = plan.fetch(fetch)
+
+    assert len(documents) == 1
+    assert documents[0].count("r2StorageAdaptiveGroups") == 1
+    assert "max { objectCount payloadSize }" in documents[0]
+    assert f"limit: {MERGE_LIMIT}" in documents[0]
+
+    objects = responses["objects"]["data"]["viewer"]["accounts"][0]["top"]
+    assert objects == [
+        {"dimensions": {"bucketName": "b4"}, "max": {"objectCount": 4}},
+        {"dimensions": {"bucketName": "b3"}, "max": {"objectCount": 3}},
+    ]
+    payload = responses["payload"]["data"]["viewer"]["accounts"][0]["top"]
+    assert [row["max"]["payloadSize"] for row in payload] == [96, 97, 98]
+
+
+def test_different_filters_are_not_merged():
+    other = Selection("top", "r2StorageAdaptiveGroups", {"date": "2024-01-01"}, {"max": ["objectCount"]})
+    plan = QueryPlan("accounts", {"accountTag": "acc"}, {
+        "a": [storage("top", {"max": ["objectCount"]})],
+        "b": [other],
+    })
+    fetch, documents = replies({"a__top": buckets(1), "b__top": buckets(2), "errors": [{"message": "slow"}]})
+
+    responses = plan.fetch(fetch)
+
+    assert "merged_" not in documents[0]
+    assert len(responses["a"]["data"]["viewer"]["accounts"][0]["top"]) == 1
+    assert len(responses["b"]["data"]["viewer"]["accounts"][0]["top"]) == 2
+    assert responses["a"]["errors"] == responses["b"]["errors"] == [{"message": "slow"}]
+
+
+def test_unmerged_plan():
+    plan = QueryPlan("accounts", {"accountTag": "acc"}, {
+        "a": [storage("top", {"max": ["objectCount"]})],
+        "b": [storage("top", {"max": ["payloadSize"]})],
+    }, merge=False)
+
+    document = plan.document()["query"]
+
+    assert "a__top: r2StorageAdaptiveGroups" in document
+    assert "b__top: r2StorageAdaptiveGroups" in document
+
+
+def test_saturated_merge_is_fetched_again():
+    plan = QueryPlan("accounts", {"accountTag": "acc"}, {
+        "a": [storage("top", {"max": ["objectCount"]}, limit=1)],
+        "b": [storage("top", {"max": ["payloadSize"]}, limit=1)],
+    })
+    exact = [{"dimensions": {"bucketName": "exact"}, "max": {"objectCount": 1}}]
+    fetch, documents = replies({"merged_0": buckets(MERGE_LIMIT)}, {"a__top": exact, "b__top": []})
+
+    responses = plan.fetch(fetch)
+
+    assert len(documents) == 2
+    assert "a__top:" in documents[1] and "b__top:" in documents[1]
+    assert responses["a"]["data"]["viewer"]["accounts"][0]["top"] == exact
+    assert responses["b"]["data"]["viewer"]["accounts"][0]["top"] == []
+
+
+def test_split_keeps_queries_whole():
+    queries = {name: [storage(f"s{i}", {"max": ["objectCount"]}) for i in range(2)] for name in "abc"}
+    plan = QueryPlan("accounts", {"accountTag": "acc"}, queries)
+
+    plans = plan.split(max_selections=4)
+
+    assert [list(part.queries) for part in plans] == [["a", "b"], ["c"]]
+    assert all(part.scope_filter == plan.scope_filter for part in plans)
+
+
+def test_split_oversized_query():
+    queries = {"big": [storage(f"s{i}", {}) for i in range(5)], "small": [storage("s", {})]}
+
+    plans = QueryPlan("accounts", {}, queries).split(max_selections=4)
+
+    assert [list(part.queries) for part in plans] == [["big"], ["small"]]
@@ -0,0 +1,118 @@
+import os
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+from cfkit.frames import polars_to_pandas
+from cfkit.rollup import RollupStore
+from cfkit.windows import format_time, parse_time
+
+
+# A Monday, so that its week starts with it
+MONDAY = datetime(2024, 1, 1)
+HOUR = timedelta(hours=1)
+
+
+def country_map(start, end, countries=("US", "PT")):
+    """One row per hour and country, with 1 request for the first country and 2 for the next, ..."""
+
+    rows = {"time": [], "key": [], "requests": []}
+    curr = parse_time(start)
+    while curr < parse_time(end):
+        for idx, country in enumerate(countries):
+            rows["time"].append(format_time(curr))
+            rows["key"].append(country)
+            rows["requests"].append(idx + 1)
+        curr += HOUR
+    return pl.DataFrame(rows)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr("cfkit.rollup.closed_before", lambda: MONDAY + timedelta(days=30))
+    return RollupStore(str(tmp_path))
+
+
+def add(store, start, end):
+    store.add("zone", {"countryMap": country_map(start, end)}, format_time(start), format_time(end))
+
+
+def partitions(store, grain):
+    path = os.path.join(store.directory, "zone", grain)
+    return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+
+def test_hours_roll_up_into_days_and_weeks(store):
+    add(store, MONDAY, MONDAY + timedelta(days=7, hours=2))
+
+    assert len(partitions(store, "hour")) == 7 * 24 + 2
+    assert partitions(store, "day") == [f"2024-01-0{day}" for day in range(1, 8)]
+    assert partitions(store, "week") == ["2024-01-01"]
+
+    week = store.read("zone", "countryMap", format_time(MONDAY), format_time(MONDAY + timedelta(days=7)))
+    assert week.sort_values("key").to_dict("records") == [
+        {"time": "2024-01-01T00:00:00Z", "key": "PT", "requests": 336},
+        {"time": "2024-01-01T00:00:00Z", "key": "US", "requests": 168},
+    ]
+
+
+def test_breakdown_reads_the_fewest_partitions(store):
+    add(store, MONDAY, MONDAY + timedelta(days=8))
+
+    start, end = MONDAY, MONDAY + timedelta(days=7, hours=5)
+    frame = store.read("zone", "countryMap", format_time(start), format_time(end))
+    # One week, then five hours
+    assert sorted(set(frame["time"])) == [format_time(MONDAY)] + [
+        format_time(MONDAY + timedelta(days=7, hours=hour)) for hour in range(5)
+    ]
+
+    totals = store.breakdown("zone", "countryMap", format_time(start), format_time(end))
+    hours = 7 * 24 + 5
+    assert totals.to_dict("records") == [{"key": "PT", "requests": 2 * hours}, {"key": "US", "requests": hours}]
+
+
+def test_partial_first_hour_is_not_stored(store):
+    add(store, MONDAY + timedelta(minutes=30), MONDAY + timedelta(hours=3))
+
+    assert partitions(store, "hour") == ["2024-01-01T01", "2024-01-01T02"]
+    assert store.missing("zone", format_time(MONDAY), format_time(MONDAY + timedelta(hours=5))) == [
+        ("2024-01-01T00:00:00Z", "2024-01-01T01:00:00Z"),
+        ("2024-01-01T03:00:00Z", "2024-01-01T05:00:00Z"),
+    ]
+
+
+def test_open_hours_are_not_stored(store, monkeypatch):
+    monkeypatch.setattr("cfkit.rollup.closed_before", lambda: MONDAY + timedelta(hours=2))
+
+    add(store, MONDAY, MONDAY + timedelta(hours=4))
+
+    assert partitions(store, "hour") == ["2024-01-01T00", "2024-01-01T01"]
+
+
+def test_hours_without_rows_are_stored(store):
+    store.add("zone", {"countryMap": country_map(MONDAY, MONDAY)}, format_time(MONDAY),
+              format_time(MONDAY + timedelta(days=1)))
+
+    assert partitions(store, "day") == ["2024-01-01"]
+    assert store.missing("zone", format_time(MONDAY), format_time(MONDAY + timedelta(days=1))) == []
+    assert len(store.breakdown("zone", "countryMap", format_time(MONDAY), format_time(MONDAY + HOUR))) == 0
+
+
+def test_read_raises_on_missing_hours(store):
+    add(store, MONDAY, MONDAY + timedelta(hours=2))
+
+    with pytest.raises(ValueError, match="2024-01-01T02:00:00Z"):
+        store.read("zone", "countryMap", format_time(MONDAY), format_time(MONDAY + timedelta(hours=3)))
+
+
+def test_pandas_maps(store):
+    # As returned by sweep_map_frames, with a key the API left empty
+    frame = polars_to_pandas(country_map(MONDAY, MONDAY + timedelta(hours=2), countries=("US", None)))
+
+    store.add("zone", {"countryMap": frame}, format_time(MONDAY), format_time(MONDAY + timedelta(hours=2)))
+
+    totals = store.breakdown("zone", "countryMap", format_time(MONDAY), format_time(MONDAY + timedelta(hours=2)))
+    # Rows without a key are stored, but left out of the totals by key
+    assert totals.to_dict("records") == [{"key": "US", "requests": 2}]
+    assert len(store.read("zone", "countryMap", format_time(MONDAY), format_time(MONDAY + timedelta(hours=2)))) == 4
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cfkit.sampling import sample_bounds
+
+
+def test_sample_bounds():
+    frame = pd.DataFrame({"key": ["a", "b", "c", "d"], "count": [400, 1000, 30, 0],
+                          "sample_interval": [100.0, 1.0, np.nan, 10.0]})
+
+    result = sample_bounds(frame, "count")
+
+    assert list(result.columns) == list(frame.columns) + ["count_sampled", "count_low", "count_high"]
+    assert result["count_sampled"].tolist() == [4, 1000, 30, 0]
+    # Unsampled groups (or without an interval) are exact
+    assert result.loc[1:2, "count_low"].tolist() == result.loc[1:2, "count_high"].tolist() == [1000, 30]
+    # Few sampled events: wide bounds around the estimate, never below zero
+    low, high = result.loc[0, ["count_low", "count_high"]]
+    assert 0 < low < 400 < high
+    assert high - low > 400
+    assert result.loc[3, "count_low"] == 0 and result.loc[3, "count_high"] > 0
+
+
+def test_bounds_narrow_with_more_samples():
+    frame = pd.DataFrame({"count": [1000.0, 1000.0], "sample_interval": [100, 2]})
+
+    result = sample_bounds(frame, "count", confidence=0.99)
+
+    widths = (result["count_high"] - result["count_low"]) / result["count"]
+    assert widths[1] < widths[0]
+    # About 1000 +/- 2.58 * sqrt(500) * 2
+    assert result.loc[1, "count_low"] == pytest.approx(1000 - 2.58 * np.sqrt(500) * 2, rel=0.02)
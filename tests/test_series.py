@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from cfkit.series import SeriesStore
+
+
+HOUR = timedelta(hours=1)
+QUARTER = timedelta(minutes=15)
+
+
+def hourly():
+    """Two days of hourly rows for two workers, with a success and an error row per hour."""
+
+    times = pd.date_range("2024-01-01", periods=48, freq="h")
+    return pd.DataFrame([
+        {"time": time, "worker": worker, "status": status, "requests": requests,
+         "errors": 0 if status == "success" else requests, "cpuTimeP50": cpu}
+        for time in times
+        for worker, cpu in [("api", 10.0), ("www", 30.0)]
+        for status, requests in [("success", 9), ("error", 1)]
+    ])
+
+
+@pytest.fixture
+def store():
+    store = SeriesStore()
+    store.add(hourly(), HOUR)
+    return store
+
+
+def test_source_grain(store):
+    assert store.source_grain(HOUR) == HOUR
+    assert store.source_grain(timedelta(days=1)) == HOUR
+    assert store.source_grain(timedelta(minutes=90)) is None
+    assert store.source_grain(QUARTER) is None
+
+
+def test_rolled_up_series(store):
+    daily = store.series(timedelta(days=1), "worker", {"requests": "sum", "errors": "sum"},
+                         quantiles={0.5: "cpuTimeP50"}, count="requests")
+
+    assert list(daily.columns) == ["time", "worker", "requests", "errors", "cpuTimeP50"]
+    assert len(daily) == 4
+    assert daily["requests"].unique().tolist() == [240]
+    assert daily["errors"].unique().tolist() == [24]
+    assert daily.groupby("worker")["cpuTimeP50"].first().to_dict() == pytest.approx({"api": 10, "www": 30},
+                                                                                     rel=0.05)
+
+
+def test_where(store):
+    series = store.series(HOUR, "worker", {"errors": "sum"}, where={"worker": ["www"], "status": ["error"]})
+
+    assert series["worker"].unique().tolist() == ["www"]
+    assert len(series) == 48
+    assert series["errors"].sum() == 48
+
+
+def test_finer_grains_are_fetched_once(store):
+    fetched = []
+
+    def fetch(grain):
+        fetched.append(grain)
+        frame = hourly()
+        return frame.assign(time=frame["time"] + grain)
+
+    store.series(QUARTER, "worker", {"requests": "sum"}, fetch=fetch)
+    thirty = store.series(timedelta(minutes=30), "worker", {"requests": "sum"}, fetch=fetch)
+
+    assert fetched == [QUARTER]
+    assert thirty["time"].iloc[0] == pd.Timestamp("2024-01-01 00:00")
+
+    with pytest.raises(ValueError):
+        SeriesStore().series(HOUR, "worker", {"requests": "sum"})
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cfkit.sketch import DDSketch, percentile_column, rebuild, sketch_quantiles
+
+
+def test_relative_accuracy():
+    values = np.random.default_rng(0).lognormal(mean=2, sigma=1.5, size=20000)
+    sketch = DDSketch(accuracy=0.01)
+    sketch.add(values)
+
+    for q in (0.1, 0.5, 0.9, 0.99, 0.999):
+        expected = np.quantile(values, q, method="inverted_cdf")
+        assert sketch.quantile(q) == pytest.approx(expected, rel=0.01)
+
+
+def test_merge_equals_adding_everything():
+    rng = np.random.default_rng(1)
+    parts = [rng.exponential(scale, size=1000) for scale in (1, 10, 100)]
+
+    merged = DDSketch()
+    for values in parts:
+        sketch = DDSketch()
+        sketch.add(values, weights=2.0)
+        merged.merge(sketch)
+    whole = DDSketch()
+    whole.add(np.concatenate(parts), weights=2.0)
+
+    assert merged.buckets == pytest.approx(whole.buckets)
+    assert merged.count == whole.count == 6000
+    assert [merged.quantile(q) for q in (0.25, 0.5, 0.99)] == [whole.quantile(q) for q in (0.25, 0.5, 0.99)]
+
+
+def test_zeros_and_empty_sketch():
+    sketch = DDSketch()
+    assert math.isnan(sketch.quantile(0.5))
+
+    sketch.add([0, 0, 0, 5])
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(5, rel=0.01)
+
+
+def test_rebuild_keeps_counts_and_quantiles():
+    values, weights = rebuild({0.5: [10.0, 1.0], 0.99: [100.0, 1.0]}, [1000, 50])
+
+    assert weights.sum(axis=1) == pytest.approx([1000, 50])
+    sketch = DDSketch()
+    sketch.add(values[0], weights[0])
+    # Each slice stands for the values around its midpoint, hence a coarser accuracy than the sketch's
+    assert sketch.quantile(0.5) == pytest.approx(10, rel=0.1)
+    assert sketch.quantile(0.99) == pytest.approx(100, rel=0.1)
+
+
+def test_percentile_column():
+    assert [percentile_column(p) for p in (0.5, 0.75, 0.99, 0.999)] == ["p50", "p75", "p99", "p999"]
+
+
+def test_sketch_quantiles_by_group():
+    # Two hours of the same worker with very different traffic, and another worker
+    frame = pd.DataFrame({
+        "worker": ["a", "a", "b"],
+        "p50": [10.0, 20.0, 5.0],
+        "p99": [50.0, 80.0, 5.0],
+        "requests": [9000, 1000, 10],
+    })
+
+    result = sketch_quantiles(frame, "worker", {0.5: "p50", 0.99: "p99"}, "requests", percentiles=(0.5, 0.99))
+
+    assert list(result.columns) == ["worker", "p50", "p99"]
+    a, b = result.to_dict("records")
+    assert a["worker"] == "a" and b["worker"] == "b"
+    # Dominated by the busiest hour, rather than the average of both hours
+    assert 9 <= a["p50"] < 12
+    assert 45 <= a["p99"] <= 80
+    assert b["p50"] == pytest.approx(5, rel=0.02)
@@ -0,0 +1,172 @@
+import io
+import json
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from cfkit.frames import map_frames
+from cfkit.graphql import stream_graphql_pages, stream_graphql_windowed
+from cfkit.stream import iter_selections, stream_frame, stream_frames
+
+
+CHUNK_SIZES = [1, 2, 7, 64, 1 << 16]
+
+
+class Trickle(io.BytesIO):
+    """Response returning at most ``size`` bytes per read, like a slow connection."""
+
+    def __init__(self, body, size):
+        super().__init__(body)
+        self.size = size
+
+    def read(self, size=-1):
+        return super().read(self.size if size < 0 else min(size, self.size))
+
+
+def response(errors=None):
+    hosts = [{"dimensions": {"host": f"höst-{i}.example"}, "sum": {"requests": i}} for i in range(25)]
+    # A string value that looks like the start of a selection must not be taken for one
+    hosts[3]["dimensions"]["host"] = '"paths": [ not a selection ]'
+    paths = [{"dimensions": {"path": f"/ünïcode/{i}"}, "sum": {"requests": 2 * i}} for i in range(10)]
+    document = {
+        "data": {"viewer": {"zones": [{"hosts": hosts, "paths": paths, "empty": []}]}},
+        "errors": errors,
+    }
+    return document, json.dumps(document, indent=1, ensure_ascii=False).encode("utf-8")
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_iter_selections(chunk_size):
+    document, body = response()
+
+    items = list(iter_selections(io.BytesIO(body), ["hosts", "paths", "empty"], batch_size=4,
+                                 chunk_size=chunk_size))
+
+    rest = items.pop()
+    assert rest[0] is None
+    zone = document["data"]["viewer"]["zones"][0]
+    assert rest[1]["data"]["viewer"]["zones"][0] == {"hosts": [], "paths": [], "empty": []}
+    assert all(len(rows) <= 4 for _, rows in items)
+    assert [row for alias, rows in items if alias == "hosts" for row in rows] == zone["hosts"]
+    assert [row for alias, rows in items if alias == "paths" for row in rows] == zone["paths"]
+    assert not any(alias == "empty" for alias, _ in items)
+
+
+def test_other_keys_are_left_alone():
+    _, body = response()
+
+    items = list(iter_selections(io.BytesIO(body), ["paths"], chunk_size=5))
+
+    assert len(items[-1][1]["data"]["viewer"]["zones"][0]["hosts"]) == 25
+
+
+def test_truncated_response():
+    _, body = response()
+
+    with pytest.raises(ValueError):
+        list(iter_selections(io.BytesIO(body[:len(body) // 2]), ["hosts"], chunk_size=16))
+
+
+@pytest.mark.parametrize("chunk_size", [3, 1 << 16])
+def test_stream_frames(chunk_size):
+    document, body = response()
+
+    frames = stream_frames(Trickle(body, chunk_size), {
+        "hosts": {"dimensions.host": "host", "sum.requests": "requests"},
+        "paths": {"dimensions.path": "path", "sum.requests": "requests"},
+    }, batch_size=3, zone="z1")
+
+    zone = document["data"]["viewer"]["zones"][0]
+    assert frames["hosts"]["host"].tolist() == [row["dimensions"]["host"] for row in zone["hosts"]]
+    assert frames["paths"]["requests"].tolist() == [row["sum"]["requests"] for row in zone["paths"]]
+    assert list(frames["paths"].columns) == ["path", "requests", "zone"]
+    assert set(frames["paths"]["zone"]) == {"z1"}
+
+
+def test_stream_frame_empty_selection():
+    _, body = response()
+
+    frame = stream_frame(io.BytesIO(body), "empty", {"dimensions.host": "host"})
+
+    assert len(frame) == 0
+    assert list(frame.columns) == ["host"]
+
+
+def test_stream_frames_raises_on_errors():
+    _, body = response(errors=[{"message": "quota exceeded"}])
+
+    with pytest.raises(RuntimeError, match="quota exceeded"):
+        stream_frame(io.BytesIO(body), "hosts", {"dimensions.host": "host"})
+
+
+@pytest.fixture
+def served(monkeypatch, fake_dataset):
+    """Serves the rows given through ``urlopen``, as streamed responses."""
+
+    def serve(rows, cursor, page_size):
+        dataset = fake_dataset(rows, cursor, page_size=page_size)
+
+        def urlopen(request, stream=False):
+            assert stream
+            return io.BytesIO(json.dumps(dataset(json.loads(request.data))).encode())
+
+        monkeypatch.setattr("cfkit.graphql.urlopen", urlopen)
+        return dataset
+
+    return serve
+
+
+def invocations():
+    return [
+        {"dimensions": {"hour": f"2024-01-01T0{hour}:00:00Z", "worker": worker, "status": status},
+         "sum": {"requests": 10 * hour + len(worker)}}
+        for hour in range(3) for worker in ["api", "cron", "www"] for status in ["success", "error"]
+    ]
+
+
+COLUMNS = {"dimensions.hour": "time", "dimensions.worker": "worker", "dimensions.status": "status",
+           "sum.requests": "requests"}
+
+
+def test_stream_graphql_pages(served):
+    dataset = served(invocations(), ["hour", "worker"], page_size=5)
+    document = {"query": "...", "variables": {"filter": {"worker_gt": "a"}}}
+
+    pages = list(stream_graphql_pages("https://api", "token", document, "rows", COLUMNS, ["hour", "worker"],
+                                      page_size=5, account="acc"))
+
+    frame = pd.concat(pages, ignore_index=True)
+    assert all(0 < len(page) < 5 for page in pages)
+    assert len(frame) == 18
+    assert not frame.duplicated(["time", "worker", "status"]).any()
+    assert set(frame["account"]) == {"acc"}
+    # The next page starts at the last hour and worker of the previous one
+    assert dataset.filters[1] == {"AND": [{"worker_gt": "a"}, {"OR": [
+        {"hour_gt": "2024-01-01T00:00:00Z"}, {"hour": "2024-01-01T00:00:00Z", "worker_geq": "www"}]}]}
+
+
+def test_stream_graphql_pages_needs_cursor_columns(served):
+    with pytest.raises(ValueError, match="worker"):
+        stream_graphql_pages("https://api", "token", {"query": "...", "variables": {}}, "rows",
+                             {"dimensions.hour": "time"}, ["hour", "worker"])
+
+
+def test_stream_graphql_windowed(served):
+    rows = [{**row, "sum": {**row["sum"], "statusMap": [{"key": row["dimensions"]["status"], "requests": 1}]}}
+            for row in invocations()]
+    dataset = served(rows, ["hour", "worker", "status"], page_size=10)
+
+    frame = stream_graphql_windowed(
+        "https://api", "token", {"query": "..."}, "rows", {**COLUMNS, "sum.statusMap": "statusMap"},
+        "2024-01-01T00:00:00Z", "2024-01-01T03:00:00Z",
+        lambda since, until: {"filter": {"hour_geq": since, "hour_lt": until}},
+        size=timedelta(hours=3), limit=10,
+    )
+
+    # Saturated windows are split in halves: 0-3h, then 0-1h and 1-3h, then 1-2h and 2-3h
+    assert len(dataset.filters) == 5
+    assert frame["time"].tolist() == sorted(frame["time"])
+    assert len(frame) == 18
+    statuses = map_frames(frame, ["statusMap"])["statusMap"]
+    assert statuses.groupby("key")["requests"].sum().to_dict() == {"error": 9, "success": 9}
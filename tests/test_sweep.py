@@ -0,0 +1,72 @@
+import pytest
+
+from cfkit.sweep import sweep_map_frames, sweep_zones, zone_batches
+
+
+def hour(timeslot, statuses):
+    return {"dimensions": {"timeslot": timeslot},
+            "sum": {"responseStatusMap": [{"key": key, "requests": requests} for key, requests in statuses.items()]}}
+
+
+ROWS = {
+    "zone-a": [hour("2024-01-01T00:00:00Z", {200: 10, 403: 2}), hour("2024-01-01T01:00:00Z", {200: 5})],
+    "zone-b": [hour("2024-01-01T00:00:00Z", {503: 1})],
+    "zone-c": [],
+}
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """The documents sent, answered with the ``ROWS`` of their zones."""
+
+    sent = []
+
+    def fetch_graphql_many(hostname, token, documents, max_workers):
+        sent.extend(documents)
+        return [
+            {"data": {"viewer": {"zones": [{"zoneTag": tag, "hours": ROWS[tag]}
+                                           for tag in document["variables"]["zoneTags"]]}}}
+            for document in documents
+        ]
+
+    monkeypatch.setattr("cfkit.sweep.fetch_graphql_many", fetch_graphql_many)
+    return sent
+
+
+def test_zone_batches():
+    zones = [f"zone-{i}" for i in range(120)]
+
+    assert [len(batch) for batch in zone_batches(zones, 169)] == [50, 50, 20]
+    assert [len(batch) for batch in zone_batches(zones, 1000)] == [10] * 12
+    # A zone alone may still exceed the budget
+    assert [len(batch) for batch in zone_batches(zones[:2], 20000)] == [1, 1]
+
+
+def test_sweep_zones(sent):
+    rows = sweep_zones("https://api", "token", "query", "hours", ROWS, {"since": "a"}, rows_per_zone=2, limit=3,
+                       budget=4)
+
+    assert rows == ROWS
+    assert [document["variables"] for document in sent] == [
+        {"since": "a", "zoneTags": ["zone-a", "zone-b"], "limit": 3},
+        {"since": "a", "zoneTags": ["zone-c"], "limit": 3},
+    ]
+
+
+def test_sweep_zones_refuses_truncated_zones(sent):
+    # The limit applies to each zone, whatever the budget of the group
+    with pytest.raises(ValueError, match="limit of 2"):
+        sweep_zones("https://api", "token", "query", "hours", ROWS, {}, rows_per_zone=2, limit=2, budget=100)
+    assert sent == []
+
+    with pytest.raises(ValueError, match="zone-a returned 2 rows"):
+        sweep_zones("https://api", "token", "query", "hours", ROWS, {}, rows_per_zone=1, limit=2)
+
+
+def test_sweep_map_frames():
+    frames = sweep_map_frames(ROWS, ["responseStatusMap", "countryMap"])
+
+    status = frames["responseStatusMap"]
+    assert list(status.columns[:3]) == ["zone", "time", "key"]
+    assert status.groupby("zone")["requests"].sum().to_dict() == {"zone-a": 17, "zone-b": 1}
+    assert list(frames["countryMap"].columns) == ["zone", "time"]
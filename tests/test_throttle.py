@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from cfkit import throttle
+from cfkit.throttle import Throttle, TokenBucket, endpoint_class, retry_after
+
+
+class Clock:
+    """Stands in for ``time.monotonic`` and ``time.sleep``: sleeping moves the clock forward."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttle.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(throttle.time, "sleep", clock.sleep)
+    monkeypatch.setattr(throttle.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def test_endpoint_class():
+    assert endpoint_class("https://api.cloudflare.com/client/v4/graphql") == "graphql"
+    assert endpoint_class("https://api-proxy.notebooks.cloudflare.com/client/v4/graphql/") == "graphql"
+    assert endpoint_class("https://api.cloudflare.com/client/v4/accounts/a/ai/run/@cf/meta/llama") == "ai"
+    assert endpoint_class("https://api.cloudflare.com/client/v4/accounts?page=2") == "rest"
+    assert endpoint_class("https://example.com/data.json") is None
+
+
+def test_bucket_burst_then_refill(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    # Out of tokens: callers queue up, half a second apart
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+
+    clock.now += 10
+    # Refilled up to the burst only
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() > 0
+
+
+def test_bucket_pause(clock):
+    bucket = TokenBucket(rate=100.0, burst=10)
+
+    bucket.pause(5)
+
+    assert bucket.acquire() == pytest.approx(5)
+    assert bucket.acquire() == 0
+
+
+def test_retry_after():
+    assert retry_after({"Retry-After": "7"}) == 7
+    assert retry_after({"Retry-After": "-3"}) == 0
+    assert retry_after({}) is None
+    assert retry_after(None) is None
+    assert retry_after({"Retry-After": "soon"}) is None
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert retry_after({"Retry-After": format_datetime(later, usegmt=True)}) == pytest.approx(30, abs=2)
+
+
+def test_should_retry():
+    limiter = Throttle(max_attempts=3)
+
+    assert limiter.should_retry("rest", "POST", 429, 1)
+    assert limiter.should_retry("rest", "GET", 503, 1)
+    # Server errors may have had side effects, except for reads and GraphQL queries
+    assert not limiter.should_retry("rest", "POST", 503, 1)
+    assert limiter.should_retry("graphql", "POST", 502, 2)
+    assert not limiter.should_retry("graphql", "POST", 400, 1)
+    assert not limiter.should_retry("graphql", "POST", 429, 3)
+    assert not limiter.should_retry("other", "GET", 429, 1)
+
+
+def test_delay_follows_retry_after(clock):
+    limiter = Throttle()
+
+    limiter.delay("graphql", 1, {"Retry-After": "10"})
+
+    # Waits as asked (plus jitter), and holds the whole class meanwhile
+    assert clock.sleeps == [pytest.approx(10 + throttle.BACKOFF_BASE)]
+    clock.now -= 5
+    assert limiter.buckets["graphql"].acquire() == pytest.approx(5)
+    assert limiter.stats()["graphql"]["retries"] == 1
+
+
+def test_delay_backs_off_exponentially(clock):
+    limiter = Throttle()
+
+    for attempt in range(1, 10):
+        limiter.delay("rest", attempt)
+
+    assert clock.sleeps == [1, 2, 4, 8, 16, 32, 60, 60, 60]
+
+
+def test_share_and_rate_limit():
+    limiter = Throttle({"graphql": (1.0, 25), "rest": (4.0, 100)}, share=0.5, rate_limit=1.0)
+
+    assert (limiter.buckets["graphql"].rate, limiter.buckets["graphql"].burst) == (0.5, 12)
+    assert (limiter.buckets["rest"].rate, limiter.buckets["rest"].burst) == (1.0, 50)
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from cfkit.windows import fetch_windowed, format_time, parse_time, split_window
+
+
+HOUR = timedelta(hours=1)
+
+
+def hourly(start, end):
+    """One row per hour of ``[start, end)``."""
+
+    rows, curr = [], parse_time(start)
+    while curr < parse_time(end):
+        rows.append({"dimensions": {"datetimeHour": format_time(curr)}})
+        curr += HOUR
+    return rows
+
+
+def test_parse_and_format():
+    assert parse_time("2024-01-31T23:00:00Z") == datetime(2024, 1, 31, 23)
+    assert format_time(datetime(2024, 1, 31, 23)) == "2024-01-31T23:00:00Z"
+
+
+def test_split_window_is_aligned():
+    windows = split_window("2024-01-01T05:00:00Z", "2024-01-03T07:30:00Z", timedelta(days=1))
+
+    assert [(format_time(start), format_time(end)) for start, end in windows] == [
+        ("2024-01-01T05:00:00Z", "2024-01-02T00:00:00Z"),
+        ("2024-01-02T00:00:00Z", "2024-01-03T00:00:00Z"),
+        ("2024-01-03T00:00:00Z", "2024-01-03T07:30:00Z"),
+    ]
+
+
+def test_split_window_rounds_size_to_grain():
+    windows = split_window("2024-01-01T00:00:00Z", "2024-01-01T03:00:00Z", timedelta(minutes=90))
+
+    assert [end - start for start, end in windows] == [HOUR] * 3
+
+
+def test_saturated_windows_are_halved():
+    calls = []
+
+    def fetch_rows(start, end):
+        calls.append((start, end))
+        return hourly(start, end)
+
+    rows = fetch_windowed(fetch_rows, "2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", timedelta(days=1),
+                          limit=5, max_workers=1)
+
+    assert rows == hourly("2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z")
+    # 24 hours, then 12, 6, and finally 3-hour windows under the limit
+    assert ("2024-01-01T00:00:00Z", "2024-01-01T12:00:00Z") in calls
+    assert ("2024-01-01T00:00:00Z", "2024-01-01T03:00:00Z") in calls
+    assert not any(parse_time(end) - parse_time(start) < 3 * HOUR for start, end in calls)
+
+
+def test_halves_stay_on_grain():
+    calls = []
+
+    def fetch_rows(start, end):
+        calls.append((start, end))
+        return hourly(start, end)
+
+    fetch_windowed(fetch_rows, "2024-01-01T00:00:00Z", "2024-01-01T03:00:00Z", timedelta(hours=3),
+                   limit=2, max_workers=1)
+
+    assert all(parse_time(bound).minute == 0 for call in calls for bound in call)
+    assert ("2024-01-01T01:00:00Z", "2024-01-01T03:00:00Z") in calls
+
+
+def test_unsplittable_window():
+    def fetch_rows(start, end):
+        return [{"dimensions": {"datetimeHour": start}}] * 5
+
+    with pytest.raises(RuntimeError, match="cannot be split"):
+        fetch_windowed(fetch_rows, "2024-01-01T00:00:00Z", "2024-01-01T04:00:00Z", timedelta(hours=4),
+                       limit=5, max_workers=2)
@@ -0,0 +1,60 @@
+import io
+import json
+import urllib.parse
+
+import pytest
+
+from cfkit.zones import ZONE_FIELDS, zone_inventory
+
+
+def api_zones(count):
+    return [{"id": f"id{i:03}", "name": f"zone-{i:03}.example", "plan": {"name": "Free"}, "status": "active",
+             "paused": False, "modified_on": "2024-01-01T00:00:00Z", "owner": {"id": "o"}} for i in range(count)]
+
+
+@pytest.fixture
+def listed(monkeypatch, tmp_path):
+    """Serves the zones of the ``zones`` list page by page, recording the pages requested."""
+
+    listed = {"zones": api_zones(120), "pages": []}
+
+    def urlopen(request):
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(request.full_url).query))
+        page, per_page = int(params.get("page", 1)), int(params["per_page"])
+        listed["pages"].append(page)
+        zones = listed["zones"]
+        return io.BytesIO(json.dumps({
+            "result": zones[(page - 1) * per_page:page * per_page],
+            "result_info": {"page": page, "total_pages": -(-len(zones) // per_page)},
+        }).encode())
+
+    monkeypatch.setattr("cfkit.rest.urlopen", urlopen)
+    monkeypatch.setattr("cfkit.lookup.DATA_DIR", str(tmp_path))
+    return listed
+
+
+def test_zone_inventory(listed):
+    zones = zone_inventory("https://api", "token", "acc")
+
+    assert len(zones) == 120
+    assert sorted(listed["pages"]) == [1, 2, 3]
+    assert zones.by_id("id007")["name"] == "zone-007.example"
+    assert zones.by_name(" Zone-007.Example. ")["id"] == "id007"
+    assert zones.resolve("id042")["name"] == zones.resolve("zone-042.example")["name"] == "zone-042.example"
+    assert zones.resolve("") is None and zones.resolve(None) is None
+
+    frame = zones.frame()
+    assert list(frame.columns) == ZONE_FIELDS
+    assert frame["plan_name"].unique().tolist() == ["Free"]
+    assert frame["name"].is_monotonic_increasing
+
+
+def test_zone_inventory_is_kept_on_disk(listed):
+    zone_inventory("https://api", "token", "acc")
+    listed["zones"] = api_zones(3)
+
+    # Read from disk, until refreshed
+    assert len(zone_inventory("https://api", "token", "acc")) == 120
+    assert len(listed["pages"]) == 3
+    assert len(zone_inventory("https://api", "token", "acc", refresh=True)) == 3
+    assert len(zone_inventory("https://api", "token", "other")) == 3